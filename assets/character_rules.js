@@ -0,0 +1,86 @@
+// Derived character-sheet values for main_character_sheet.py, computed in the browser so editing a
+// score, proficiency or hit points never waits on a server round trip. The skill-to-ability table
+// comes from the sheet-rules store so main_character_sheet.py stays the single source of the rules.
+(function () {
+    function toNumber(value) {
+        if (value === null || value === undefined || value === "") {
+            return null;
+        }
+        var number = Number(value);
+        return isNaN(number) ? null : number;
+    }
+
+    function modifier(score) {
+        score = toNumber(score);
+        return score === null ? 0 : Math.floor((score - 10) / 2);
+    }
+
+    function signed(mod) {
+        return mod >= 0 ? "+" + mod : String(mod);
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        character_rules: {
+            abilityModifiers: function () {
+                return Array.prototype.map.call(arguments, function (score) {
+                    return toNumber(score) === null ? "0" : signed(modifier(score));
+                });
+            },
+
+            // 6 scores, 6 proficiency checkboxes, then the proficiency bonus
+            savingModifiers: function () {
+                var values = Array.prototype.slice.call(arguments);
+                var bonus = toNumber(values[12]) || 0;
+                return values.slice(0, 6).map(function (score, i) {
+                    return signed(modifier(score) + (values[6 + i] ? bonus : 0));
+                });
+            },
+
+            // 6 scores, one proficiency checkbox per skill, the proficiency bonus, then the rules store
+            skillModifiers: function () {
+                var values = Array.prototype.slice.call(arguments);
+                var rules = values.pop();
+                var bonus = toNumber(values.pop()) || 0;
+                var mods = values.slice(0, 6).map(modifier);
+                return rules.skill_abilities.map(function (ability, i) {
+                    return signed(mods[ability] + (values[6 + i] ? bonus : 0));
+                });
+            },
+
+            passivePerception: function (perceptionMod) {
+                var mod = parseInt(perceptionMod, 10);
+                return isNaN(mod) ? "10" : String(10 + mod);
+            },
+
+            initiative: function (dexScore) {
+                return String(modifier(dexScore));
+            },
+
+            healthBar: function (currentHp, maxHp, tempHp) {
+                currentHp = toNumber(currentHp);
+                maxHp = toNumber(maxHp);
+                tempHp = toNumber(tempHp);
+                if (currentHp === null || maxHp === null || tempHp === null) {
+                    currentHp = 0;
+                    maxHp = 1;
+                    tempHp = 0;
+                }
+                if (maxHp <= 0) {
+                    maxHp = 1;
+                }
+                var percent = Math.min(100, (currentHp / (maxHp + tempHp)) * 100);
+                var color = percent <= 25 ? "#dc3545" : (percent <= 50 ? "#ffc107" : "#28a745");
+                return [{
+                    width: percent + "%",
+                    height: "100%",
+                    backgroundColor: color,
+                    position: "absolute",
+                    top: "0",
+                    left: "0",
+                    transition: "width 0.3s ease, background-color 0.3s ease",
+                    borderRadius: "8px"
+                }, currentHp + "/" + (maxHp + tempHp)];
+            }
+        }
+    });
+})();
@@ -0,0 +1,40 @@
+// Scroll handling for the windowed chat panel in main_dm_assistant.py: follow new messages while the
+// reader is at the bottom, keep the view steady when older messages are added above, and load the
+// next page of older messages when the top is reached.
+(function () {
+    var NEAR_EDGE = 30;  // px
+
+    function attach(panel) {
+        var atBottom = true;
+        var lastHeight = panel.scrollHeight;
+        var firstChild = panel.firstElementChild;
+
+        panel.addEventListener("scroll", function () {
+            atBottom = panel.scrollHeight - panel.scrollTop - panel.clientHeight < NEAR_EDGE;
+            var loadEarlier = document.getElementById("chat-load-earlier");
+            if (panel.scrollTop < NEAR_EDGE && loadEarlier && loadEarlier.style.display !== "none") {
+                loadEarlier.click();
+            }
+        });
+
+        new MutationObserver(function () {
+            var grown = panel.scrollHeight - lastHeight;
+            var prepended = firstChild && firstChild.isConnected && panel.firstElementChild !== firstChild;
+            if (prepended && grown > 0) {
+                panel.scrollTop += grown;
+            } else if (atBottom) {
+                panel.scrollTop = panel.scrollHeight;
+            }
+            lastHeight = panel.scrollHeight;
+            firstChild = panel.firstElementChild;
+        }).observe(panel, {childList: true, subtree: true, characterData: true});
+    }
+
+    var waiting = setInterval(function () {
+        var panel = document.getElementById("chat-display");
+        if (panel) {
+            clearInterval(waiting);
+            attach(panel);
+        }
+    }, 200);
+})();
@@ -0,0 +1,36 @@
+// Debounced notepad saving for main_dm_assistant.py: the server only hears about the notes once
+// typing pauses (or the textarea loses focus), and never for text it has already been sent.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    notepad: {
+        pending: null,
+        lastSent: null,
+
+        debounceSave: function (value, nBlur, delay) {
+            var noUpdate = window.dash_clientside.no_update;
+            var notepad = window.dash_clientside.notepad;
+            var triggered = window.dash_clientside.callback_context.triggered.map(function (t) {
+                return t.prop_id;
+            });
+            var wait = triggered.indexOf("notepad.n_blur") !== -1 ? 0 : delay;
+            if (notepad.pending) {
+                notepad.pending(noUpdate);  // a newer edit supersedes the one still waiting
+            }
+            return new Promise(function (resolve) {
+                var timer = setTimeout(function () {
+                    notepad.pending = null;
+                    if (value === null || value === undefined || value === notepad.lastSent) {
+                        resolve(noUpdate);
+                        return;
+                    }
+                    notepad.lastSent = value;
+                    resolve(value);
+                }, wait);
+                notepad.pending = function (result) {
+                    clearTimeout(timer);
+                    notepad.pending = null;
+                    resolve(result);
+                };
+            });
+        }
+    }
+});
@@ -0,0 +1,35 @@
+// Portrait uploads for main_character_sheet.py: dcc.Upload hands over the file as a data URL, which
+// is posted to the upload route as raw bytes instead of travelling through a Dash callback. The
+// upload's contents are cleared afterwards so the browser does not keep the data URL around.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    portrait_upload: {
+        upload: function (contents, route) {
+            var noUpdate = window.dash_clientside.no_update;
+            if (!contents) {
+                return [noUpdate, noUpdate, noUpdate];
+            }
+            return fetch(contents)
+                .then(function (response) {
+                    return response.blob();
+                })
+                .then(function (blob) {
+                    return fetch(route, {
+                        method: "POST",
+                        headers: {"Content-Type": blob.type || "application/octet-stream"},
+                        body: blob
+                    });
+                })
+                .then(function (response) {
+                    return response.json().then(function (result) {
+                        if (!response.ok) {
+                            return [noUpdate, null, "Upload failed: " + (result.error || response.status)];
+                        }
+                        return [result.url, null, ""];
+                    });
+                })
+                .catch(function (error) {
+                    return [noUpdate, null, "Upload failed: " + error];
+                });
+        }
+    }
+});
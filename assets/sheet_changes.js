@@ -0,0 +1,68 @@
+// Dirty-field tracking for main_character_sheet.py: keeps the values the sheet was loaded with and
+// publishes only the fields that differ from them, so saving sends the changes rather than the
+// whole sheet. The portrait upload only counts as changed until a save that included it succeeds.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    sheet_changes: {
+        token: null,
+        source: null,
+        baseline: {},
+        revision: 0,
+        latest: {},  // fields published in the current revision
+        sent: {},  // revision -> fields submitted with a save, folded into the baseline once it succeeds
+
+        // One value per key in fields (the last is the uploaded portrait), then the baseline and saved
+        // stores and the save button
+        track: function () {
+            var tracker = window.dash_clientside.sheet_changes;
+            var args = Array.prototype.slice.call(arguments);
+            var keys = args.pop();
+            args.pop();  // save clicks
+            var saved = args.pop();
+            var loaded = args.pop();
+            var triggered = window.dash_clientside.callback_context.triggered.map(function (t) {
+                return t.prop_id;
+            });
+
+            if (triggered.indexOf("save-character.n_clicks") !== -1) {
+                // The save callback reads the current revision; remember what it sends until it answers
+                tracker.sent[tracker.revision] = tracker.latest;
+                return window.dash_clientside.no_update;
+            }
+
+            var values = {};
+            keys.forEach(function (key, i) {
+                values[key] = args[i] === undefined ? null : args[i];
+            });
+
+            if (triggered.indexOf("sheet-baseline.data") !== -1 && loaded) {
+                // The fields were set from the server in the same update, so they are the baseline
+                tracker.token = loaded.token;
+                tracker.source = loaded.name;
+                tracker.baseline = values;
+                tracker.sent = {};
+            } else if (triggered.indexOf("sheet-saved.data") !== -1 && saved && saved.token === tracker.token) {
+                var fields = tracker.sent[saved.revision] || {};
+                Object.keys(fields).forEach(function (key) {
+                    tracker.baseline[key] = fields[key];
+                });
+                // A renamed character is saved under its new name from now on
+                tracker.source = saved.name;
+                Object.keys(tracker.sent).forEach(function (revision) {
+                    if (Number(revision) <= saved.revision) {
+                        delete tracker.sent[revision];
+                    }
+                });
+            }
+
+            var changed = {};
+            keys.forEach(function (key) {
+                if (JSON.stringify(values[key]) !== JSON.stringify(tracker.baseline[key])) {
+                    changed[key] = values[key];
+                }
+            });
+            tracker.revision += 1;
+            tracker.latest = changed;
+            return {token: tracker.token, source: tracker.source, revision: tracker.revision, fields: changed};
+        }
+    }
+});
@@ -0,0 +1,143 @@
+import asyncio
+import queue
+import threading
+
+MAX_CONCURRENT_REQUESTS = 4  # in-flight LLM requests per backend
+_STREAM_END = object()
+
+
+class AsyncChatClient:
+    def __init__(self, client, max_concurrency=MAX_CONCURRENT_REQUESTS):
+        """Asyncio front end for an OllamaInterface or OpenRouterInterface.
+
+        Every request carries its own system prompt, so concurrent sessions never share mutable prompt
+        state, and a semaphore bounds how many requests reach the backend at once. The blocking
+        interface calls run in worker threads driven by an event loop on a background thread;
+        send_input and stream_input are synchronous shims for Dash callbacks.
+        """
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.waiting = 0
+        self.loop = asyncio.new_event_loop()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def _acquire(self):
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self.semaphore.release()
+
+    async def send(self, prompt: str, context: str = "", system_prompt=None, served=None) -> str:
+        """Return the full response for one request."""
+        await self._acquire()
+        try:
+            return await asyncio.to_thread(self.client.send_input, prompt, context, system_prompt, served=served)
+        finally:
+            self._release()
+
+    async def stream(self, prompt: str, context: str = "", system_prompt=None, served=None):
+        """Yield response tokens for one request as they arrive."""
+        await self._acquire()
+        try:
+            tokens = asyncio.Queue()
+            loop = asyncio.get_running_loop()
+
+            def produce():
+                try:
+                    for token in self.client.stream_input(prompt, context, system_prompt, served=served):
+                        loop.call_soon_threadsafe(tokens.put_nowait, token)
+                finally:
+                    loop.call_soon_threadsafe(tokens.put_nowait, _STREAM_END)
+
+            producer = loop.run_in_executor(None, produce)
+            while True:
+                token = await tokens.get()
+                if token is _STREAM_END:
+                    break
+                yield token
+            await producer
+        finally:
+            self._release()
+
+    def send_input(self, prompt: str, context: str = "", system_prompt=None, served=None) -> str:
+        """Blocking shim around send() for synchronous callers."""
+        return asyncio.run_coroutine_threadsafe(self.send(prompt, context, system_prompt, served), self.loop).result()
+
+    def stream_input(self, prompt: str, context: str = "", system_prompt=None, served=None):
+        """Blocking generator shim around stream() for synchronous callers."""
+        tokens = queue.Queue()
+
+        async def pump():
+            try:
+                async for token in self.stream(prompt, context, system_prompt, served):
+                    tokens.put(token)
+            finally:
+                tokens.put(_STREAM_END)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        while True:
+            token = tokens.get()
+            if token is _STREAM_END:
+                break
+            yield token
+        future.result()
+
+    def stats(self):
+        """Return the number of requests running and waiting for a slot."""
+        return {"in_flight": self.in_flight, "waiting": self.waiting, "max_concurrency": self.max_concurrency}
+
+
+def run_load_test(session_counts=(1, 8, 32, 64), messages_per_session=3, max_concurrency=MAX_CONCURRENT_REQUESTS,
+                  backend_latency=0.2):
+    """Print latency and throughput for N concurrent chat sessions against a local stub backend."""
+    import os
+    import statistics
+    import tempfile
+    import time
+    from openrouter_interface import OpenRouterInterface
+    from stub_server import StubServer
+
+    with StubServer(latency=backend_latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        backend = OpenRouterInterface("stub-key", "", base_url=f"{stub.url}/api/v1",
+                                      catalogue_path=os.path.join(tmp, "models.json"))
+        backend.catalogue.wait(5)
+        client = AsyncChatClient(backend, max_concurrency=max_concurrency)
+
+        async def session(index, timings):
+            system_prompt = f"session-{index}"
+            for turn in range(messages_per_session):
+                start = time.perf_counter()
+                reply = await client.send(f"turn {turn}", system_prompt=system_prompt)
+                timings.append(time.perf_counter() - start)
+                if f"'{system_prompt}'" not in reply:
+                    raise AssertionError(f"session {index} received another session's prompt: {reply}")
+
+        async def run(sessions):
+            timings = []
+            start = time.perf_counter()
+            await asyncio.gather(*(session(i, timings) for i in range(sessions)))
+            return time.perf_counter() - start, sorted(timings)
+
+        print(f"backend latency {backend_latency * 1000:.0f} ms, max concurrency {max_concurrency}")
+        print(f"{'sessions':>8} {'requests':>9} {'wall s':>8} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>7}")
+        for sessions in session_counts:
+            wall, timings = asyncio.run_coroutine_threadsafe(run(sessions), client.loop).result()
+            p50 = statistics.median(timings) * 1000
+            p95 = timings[int(len(timings) * 0.95) - 1] * 1000
+            print(f"{sessions:>8} {len(timings):>9} {wall:>8.2f} {p50:>8.0f} {p95:>8.0f} {len(timings) / wall:>7.1f}")
+
+
+if __name__ == "__main__":
+    run_load_test()
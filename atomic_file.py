@@ -0,0 +1,24 @@
+import json
+import os
+import tempfile
+
+
+def write_text_atomic(path, text, encoding="utf-8"):
+    """Write text to a temp file in the same directory and move it over path, so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_json_atomic(path, data, indent=2):
+    """Serialize data as JSON and write it atomically to path."""
+    write_text_atomic(path, json.dumps(data, indent=indent))
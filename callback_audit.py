@@ -0,0 +1,139 @@
+import json
+from dash.development.base_component import Component
+
+
+def _parse_outputs(output):
+    """Split a callback output spec such as '..a.children...b.style..' into (id, property) pairs."""
+    specs = output[2:-2].split("...") if output.startswith("..") else [output]
+    return [tuple(spec.rsplit(".", 1)) for spec in specs]
+
+
+def layout_values(layout):
+    """Map (id, property) to the initial value of every property set in a Dash layout."""
+    values = {}
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (list, tuple)):
+            stack.extend(node)
+        elif isinstance(node, Component):
+            component_id = getattr(node, "id", None)
+            for prop in node._prop_names:
+                value = getattr(node, prop, None)
+                if isinstance(value, (Component, list, tuple)) and prop == "children":
+                    stack.append(value)
+                elif component_id is not None and value is not None:
+                    values[(component_id, prop)] = value
+    return values
+
+
+def requests_per_edit(app, component_id, prop="value", as_server=()):
+    """Count the HTTP requests and request bytes that editing one property sets off, chained callbacks included.
+
+    Clientside callbacks in the namespaces listed in as_server are counted as if they were server
+    callbacks, which is what the same wiring cost before it moved into the browser.
+    """
+    values = layout_values(app.layout)
+    callbacks = [(callback, _parse_outputs(callback["output"])) for callback in app._callback_list]
+    changed = [(component_id, prop)]
+    seen = set()
+    fired = set()
+    requests = 0
+    request_bytes = 0
+    while changed:
+        current = changed.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        for index, (callback, outputs) in enumerate(callbacks):
+            if index in fired or not any((i["id"], i["property"]) == current for i in callback["inputs"]):
+                continue
+            fired.add(index)
+            clientside = callback["clientside_function"]
+            if clientside is None or clientside["namespace"] in as_server:
+                requests += 1
+                body = {"output": callback["output"],
+                        "inputs": [dict(i, value=values.get((i["id"], i["property"]))) for i in callback["inputs"]],
+                        "state": [dict(s, value=values.get((s["id"], s["property"]))) for s in callback["state"]]}
+                request_bytes += len(json.dumps(body, default=str))
+            changed.extend(outputs)
+    return requests, request_bytes
+
+
+def save_benchmark(portrait_kb=200, repeats=20):
+    """Request bytes and latency of character saves through the save callback, via the Flask test client.
+
+    The sheet used to send every field and the portrait's data URL on every save; the first row
+    posts a payload of that shape (the server now ignores the data URL). The rest send only what
+    changed, with a new portrait uploaded as raw bytes to the upload route and saved by URL.
+    """
+    import base64
+    import io
+    import os
+    import tempfile
+    import time
+    import main_character_sheet as sheet
+    from character_repository import CharacterRepository
+    from PIL import Image
+    from image_store import ImageStore, image_url
+
+    # A noisy image so the JPEG stays around portrait_kb
+    side = int((portrait_kb * 1024 / 0.6) ** 0.5)
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(buffer, "JPEG", quality=75)
+    portrait_bytes = buffer.getvalue()
+    portrait = "data:image/jpeg;base64," + base64.b64encode(portrait_bytes).decode()
+    values = {key: default for _, key, default in sheet.SHEET_FIELDS}
+    values.update(name="Benchmark Hero", attacks="- Longsword +5 1d8+3 slashing\n" * 3, journal="Session notes. " * 200)
+    client = sheet.app.server.test_client()
+    with tempfile.TemporaryDirectory() as tmp:
+        sheet.character_repository = CharacterRepository(tmp)
+        sheet.image_store = ImageStore(tmp)
+        sheet.character_repository.save(values["name"], values)
+        print(f"{'save':>32} {'request bytes':>14} {'ms':>7}")
+        start = time.perf_counter()
+        for _ in range(repeats):
+            response = client.post(sheet.UPLOAD_ROUTE, data=portrait_bytes, content_type="image/jpeg")
+            assert response.status_code == 200, response.data
+        upload_ms = (time.perf_counter() - start) / repeats * 1000
+        print(f"{'portrait to upload route':>32} {len(portrait_bytes):>14,} {upload_ms:>7.2f}")
+        portrait_url = image_url(response.get_json()["digest"])
+        for label, fields in [("every field + portrait (before)", dict(values, image_upload=portrait)),
+                              ("one field", {"hp_current": 7}),
+                              ("new portrait", {sheet.PORTRAIT_FIELD: portrait_url}),
+                              ("every field", dict(values, hp_current=3))]:
+            changes = {"token": "benchmark", "source": values["name"], "revision": 1, "fields": fields}
+            body = json.dumps({
+                "output": "..status-msg.children...status-msg.is_open...sheet-saved.data..",
+                "outputs": [{"id": "status-msg", "property": "children"}, {"id": "status-msg", "property": "is_open"},
+                            {"id": "sheet-saved", "property": "data"}],
+                "inputs": [{"id": "save-character", "property": "n_clicks", "value": 1}],
+                "state": [{"id": "character-name", "property": "value", "value": values["name"]},
+                          {"id": "sheet-changes", "property": "data", "value": changes}],
+                "changedPropIds": ["save-character.n_clicks"]})
+            start = time.perf_counter()
+            for _ in range(repeats):
+                response = client.post("/_dash-update-component", data=body, content_type="application/json")
+                assert response.status_code == 200, response.data
+            elapsed_ms = (time.perf_counter() - start) / repeats * 1000
+            print(f"{label:>32} {len(body):>14,} {elapsed_ms:>7.2f}")
+
+
+def run_benchmark():
+    """Requests per edit on the character sheet with its derived values on the server versus in the browser."""
+    from main_character_sheet import app
+
+    edits = [("strength-score", "value"), ("dexterity-score", "value"), ("wisdom-score", "value"),
+             ("saving-strength-prof", "value"), ("skill-perception-prof", "value"),
+             ("proficiency-bonus", "value"), ("hp-current", "value")]
+    print(f"{'edit':>24} {'server requests':>16} {'server bytes':>13} {'browser requests':>17} {'browser bytes':>14}")
+    for component_id, prop in edits:
+        before = requests_per_edit(app, component_id, prop, as_server=("character_rules",))
+        after = requests_per_edit(app, component_id, prop)
+        print(f"{component_id:>24} {before[0]:>16} {before[1]:>13,} {after[0]:>17} {after[1]:>14,}")
+    print()
+    save_benchmark()
+
+
+if __name__ == "__main__":
+    run_benchmark()
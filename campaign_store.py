@@ -0,0 +1,409 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from atomic_file import write_json_atomic
+from character_repository import character_summary, SUMMARY_FIELDS, DEFAULT_LIMIT
+
+DEFAULT_CAMPAIGN_PATH = "campaign.sqlite3"
+ABILITIES = ("strength", "dexterity", "constitution", "intelligence", "wisdom", "charisma")
+SKILLS = ("acrobatics", "animal_handling", "arcana", "athletics", "deception", "history", "insight", "intimidation",
+          "investigation", "medicine", "nature", "perception", "performance", "persuasion", "religion",
+          "sleight_of_hand", "stealth", "survival")
+# Character sheet keys in the order the JSON files list them, as (key, kind). TEXT and INTEGER keys get
+# a typed column each; FLAG keys are packed into one bitmask column.
+SHEET_COLUMNS = (
+    [("name", "TEXT"), ("class_level", "TEXT"), ("background", "TEXT"), ("player_name", "TEXT"), ("race", "TEXT"),
+     ("alignment", "TEXT"), ("xp", "INTEGER"), ("armor_class", "INTEGER"), ("speed", "INTEGER"),
+     ("hp_max", "INTEGER"), ("hp_current", "INTEGER"), ("hp_temp", "INTEGER"), ("hit_dice_total", "TEXT"),
+     ("hit_dice_current", "TEXT"), ("attacks", "TEXT")]
+    + [(coin, "INTEGER") for coin in ("cp", "sp", "ep", "gp", "pp")]
+    + [(key, "TEXT") for key in ("equipment", "personality_traits", "ideals", "bonds", "flaws", "features_traits",
+                                 "proficiencies_languages", "journal")]
+    + [("inspiration", "FLAG"), ("proficiency_bonus", "INTEGER")]
+    + [(f"{ability}_score", "INTEGER") for ability in ABILITIES]
+    + [(f"saving_{ability}_prof", "FLAG") for ability in ABILITIES]
+    + [(f"skill_{skill}_prof", "FLAG") for skill in SKILLS]
+    + [(f"death_{kind}_{i}", "FLAG") for kind in ("success", "failure") for i in range(3)]
+    + [("image_path", "TEXT")]
+)
+TYPED_KEYS = [key for key, kind in SHEET_COLUMNS if kind != "FLAG"]
+FLAG_KEYS = [key for key, kind in SHEET_COLUMNS if kind == "FLAG"]
+KNOWN_KEYS = {key for key, _ in SHEET_COLUMNS}
+ALL_FLAGS = (1 << len(FLAG_KEYS)) - 1
+# Where each key's value comes from: (index into the typed columns, None) or (None, flag bit)
+SHEET_SLOTS = [(TYPED_KEYS.index(key), None) if kind != "FLAG" else (None, 1 << FLAG_KEYS.index(key))
+               for key, kind in SHEET_COLUMNS]
+INTEGER_RANGE = (-2 ** 63, 2 ** 63 - 1)
+MISSING = object()
+
+
+def _fits(value, kind):
+    if kind == "TEXT":
+        return isinstance(value, str)
+    if kind == "INTEGER":
+        return isinstance(value, int) and not isinstance(value, bool) and INTEGER_RANGE[0] <= value <= INTEGER_RANGE[1]
+    return isinstance(value, bool)
+
+
+def encode_sheet(data):
+    """Split a character sheet into its typed column values, (flags, flags_set) bitmasks and an extra JSON text.
+
+    A value whose type does not match its column (a blank number input is None, for example) and any
+    key the schema does not know are kept in extra, so decode_sheet(encode_sheet(data)) == data.
+    """
+    columns = []
+    flags = flags_set = 0
+    extra = {key: value for key, value in data.items() if key not in KNOWN_KEYS}
+    bit = 1
+    for key, kind in SHEET_COLUMNS:
+        value = data.get(key, MISSING)
+        fits = value is not MISSING and _fits(value, kind)
+        if value is not MISSING and not fits:
+            extra[key] = value
+        if kind == "FLAG":
+            if fits:
+                flags_set |= bit
+                if value:
+                    flags |= bit
+            bit <<= 1
+        else:
+            columns.append(value if fits else None)
+    return columns, flags, flags_set, json.dumps(extra, separators=(",", ":")) if extra else None
+
+
+def decode_sheet(columns, flags, flags_set, extra):
+    """Rebuild a character sheet dict from the values encode_sheet produced."""
+    if extra is None and flags_set == ALL_FLAGS and None not in columns:
+        # Every key present with its column's type, as for any sheet saved by the character sheet
+        return dict(zip([key for key, _ in SHEET_COLUMNS],
+                        [columns[index] if bit is None else bool(flags & bit) for index, bit in SHEET_SLOTS]))
+    extra = json.loads(extra) if extra else {}
+    data = {}
+    values = iter(columns)
+    bit = 1
+    for key, kind in SHEET_COLUMNS:
+        if kind == "FLAG":
+            if flags_set & bit:
+                data[key] = bool(flags & bit)
+            elif key in extra:
+                data[key] = extra[key]
+            bit <<= 1
+        else:
+            value = next(values)
+            if value is not None:
+                data[key] = value
+            elif key in extra:
+                data[key] = extra[key]
+    for key, value in extra.items():
+        if key not in KNOWN_KEYS:
+            data[key] = value
+    return data
+
+
+class CampaignStore:
+    def __init__(self, path=DEFAULT_CAMPAIGN_PATH):
+        """Every character of a campaign in one SQLite database, one typed row per character.
+
+        A whole party loads with a single query, and save_many() and update_many() change several
+        characters in one transaction, so the HP and death saves written after a fight land together
+        or not at all. import_json() and export_json() convert from and to the character JSON files.
+        Characters are only part of the party, as opposed to NPCs, once set_party() or join_party says so.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        typed = ", ".join(f"{key} {kind}" for key, kind in SHEET_COLUMNS if kind != "FLAG")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS characters ("
+            "character TEXT PRIMARY KEY, revision INTEGER NOT NULL, updated REAL NOT NULL, "
+            f"in_party INTEGER NOT NULL DEFAULT 0, {typed}, flags INTEGER NOT NULL, flags_set INTEGER NOT NULL, "
+            "extra TEXT)"
+        )
+        if "in_party" not in [row[1] for row in self.conn.execute("PRAGMA table_info(characters)")]:
+            self.conn.execute("ALTER TABLE characters ADD COLUMN in_party INTEGER NOT NULL DEFAULT 0")
+        self.columns = ", ".join(TYPED_KEYS) + ", flags, flags_set, extra"
+
+    @contextmanager
+    def transaction(self):
+        """Run the block in one write transaction, rolled back if it raises.
+
+        BEGIN IMMEDIATE takes the write lock up front, so a read-modify-write inside the block cannot
+        interleave with another process writing the same characters.
+        """
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _row(self, row):
+        return decode_sheet(row[:len(TYPED_KEYS)], *row[len(TYPED_KEYS):])
+
+    def names(self):
+        """Return the character names, sorted."""
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT character FROM characters ORDER BY character")]
+
+    def get(self, name):
+        """Return one character sheet, or {} if there is no such character."""
+        return self.load([name]).get(name, {})
+
+    def revision(self, name):
+        """Return how many times a character has been saved, or None if there is no such character."""
+        with self.lock:
+            row = self.conn.execute("SELECT revision FROM characters WHERE character = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def data_version(self):
+        """A number that changes whenever another connection commits, for callers caching what they read."""
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def summary_rows(self):
+        """Return [(name, {summary field: value})] for every character, read from the typed columns only."""
+        fields = [field for field in SUMMARY_FIELDS if field != "name"]
+        with self.lock:
+            rows = self.conn.execute(f"SELECT character, {', '.join(fields)} FROM characters").fetchall()
+        return [(row[0], {field: value for field, value in zip(fields, row[1:]) if value is not None})
+                for row in rows]
+
+    def load_party(self, names=None):
+        """Return {name: sheet} for the given characters, or for the characters in the party, in one query."""
+        if names is not None:
+            return self.load(names)
+        with self.lock:
+            rows = self.conn.execute(f"SELECT character, {self.columns} FROM characters WHERE in_party "
+                                     "ORDER BY character").fetchall()
+        return {row[0]: self._row(row[1:]) for row in rows}
+
+    def set_party(self, names):
+        """Make exactly the named characters the party, in one transaction."""
+        with self.transaction() as conn:
+            conn.execute("UPDATE characters SET in_party = character IN (SELECT value FROM json_each(?))",
+                         (json.dumps(list(names)),))
+
+    def load(self, names=None):
+        """Return {name: sheet} for the given characters, or every character in the campaign, in one query."""
+        if names is None:
+            query, params = f"SELECT character, {self.columns} FROM characters ORDER BY character", ()
+        else:
+            query = (f"SELECT character, {self.columns} FROM characters "
+                     "WHERE character IN (SELECT value FROM json_each(?)) ORDER BY character")
+            params = (json.dumps(list(names)),)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return {row[0]: self._row(row[1:]) for row in rows}
+
+    def _write(self, conn, characters, now, join_party=False):
+        rows = []
+        for name, data in characters.items():
+            columns, flags, flags_set, extra = encode_sheet(data)
+            rows.append([name, now, int(join_party)] + columns + [flags, flags_set, extra])
+        placeholders = ", ".join("?" * (len(TYPED_KEYS) + 3))
+        # in_party only applies to new characters; set_party() changes it for existing ones
+        conn.executemany(
+            f"INSERT INTO characters (character, revision, updated, in_party, {self.columns}) "
+            f"VALUES (?, 1, ?, ?, {placeholders}) "
+            "ON CONFLICT (character) DO UPDATE SET revision = revision + 1, updated = excluded.updated, "
+            + ", ".join(f"{column} = excluded.{column}" for column in TYPED_KEYS + ["flags", "flags_set", "extra"]),
+            rows
+        )
+
+    def save(self, name, data, join_party=False):
+        """Write one character sheet."""
+        self.save_many({name: data}, join_party)
+
+    def save_many(self, characters, join_party=False):
+        """Write {name: sheet} for several characters in one transaction; new ones join the party if join_party."""
+        with self.transaction() as conn:
+            self._write(conn, characters, time.time(), join_party)
+
+    def update_many(self, changes):
+        """Merge {name: {key: value}} into existing characters in one transaction and return the merged sheets.
+
+        Raises KeyError, leaving every character as it was, if any of them does not exist.
+        """
+        with self.transaction() as conn:
+            rows = conn.execute(f"SELECT character, {self.columns} FROM characters "
+                                "WHERE character IN (SELECT value FROM json_each(?))",
+                                (json.dumps(list(changes)),)).fetchall()
+            sheets = {row[0]: self._row(row[1:]) for row in rows}
+            missing = [name for name in changes if name not in sheets]
+            if missing:
+                raise KeyError(f"no such character: {', '.join(missing)}")
+            for name, fields in changes.items():
+                sheets[name].update(fields)
+            self._write(conn, sheets, time.time())
+        return sheets
+
+    def delete(self, name):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM characters WHERE character = ?", (name,))
+
+    def import_json(self, directory, join_party=False):
+        """Add or replace every character JSON file in directory, in one transaction, and return how many."""
+        characters = {}
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".json") or filename.startswith("."):
+                continue
+            try:
+                with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Skipping character {filename}: {e}")
+                continue
+            if isinstance(data, dict):
+                characters[filename[:-len(".json")]] = data
+        self.save_many(characters, join_party)
+        print(f"Campaign store: imported {len(characters)} character(s) from {directory}.")
+        return len(characters)
+
+    def export_json(self, directory, names=None):
+        """Write characters to directory as the JSON files the character sheet reads, and return how many."""
+        os.makedirs(directory, exist_ok=True)
+        characters = self.load(names)
+        for name, data in characters.items():
+            write_json_atomic(os.path.join(directory, f"{name}.json"), data, indent=4)
+        return len(characters)
+
+    def close(self):
+        self.conn.close()
+
+
+class CampaignRepository:
+    def __init__(self, store):
+        """The CharacterRepository interface over a CampaignStore, so the character sheet edits the campaign itself.
+
+        Sheets are read from the store on every get(), so updates made elsewhere, such as HP written
+        after a fight, show up on the next load. Selector summaries come from the typed columns and are
+        re-read only after a save here or when the store's data_version shows another connection wrote.
+        Characters saved from the sheet for the first time join the party.
+        """
+        self.store = store
+        self.lock = threading.Lock()
+        self.cached = None  # name -> selector summary
+        self.version = None
+
+    def refresh(self, force=False):
+        """Re-read the selector summaries if the store changed, and return (characters, 0)."""
+        with self.lock:
+            version = self.store.data_version()
+            if force or self.cached is None or version != self.version:
+                self.cached = {name: character_summary(name, data) for name, data in self.store.summary_rows()}
+                self.version = version
+            return len(self.cached), 0
+
+    def names(self):
+        self.refresh()
+        return sorted(self.cached)
+
+    def summaries(self, search=None, limit=DEFAULT_LIMIT):
+        """Return up to limit selector summaries whose name, class or race contains search, sorted by name."""
+        self.refresh()
+        needle = (search or "").strip().lower()
+        matches = [summary for summary in self.cached.values() if not needle or needle in summary["label"].lower()]
+        matches.sort(key=lambda summary: summary["name"].lower())
+        return matches[:limit] if limit else matches
+
+    def summary(self, name):
+        self.refresh()
+        return self.cached.get(name)
+
+    def get(self, name):
+        return self.store.get(name)
+
+    def save(self, name, data):
+        self.store.save(name, data, join_party=True)
+        self.invalidate()
+
+    def invalidate(self, name=None):
+        with self.lock:
+            self.cached = None
+
+    def watch(self, interval=1.0):
+        """Nothing to watch: every listing checks the store's data_version."""
+
+
+def run_benchmark(counts=(4, 100, 1000, 5000), party_size=4, repeats=20):
+    """Time loading a party and a whole campaign from JSON files versus the campaign store, and a post-combat update.
+
+    The JSON update writes each changed sheet atomically, as the character sheet does; the store
+    commits every change in one transaction.
+    """
+    import random
+    import tempfile
+
+    def sheet(i, rng):
+        data = {}
+        for key, kind in SHEET_COLUMNS:
+            if kind == "TEXT":
+                data[key] = f"{key} {i}"
+            elif kind == "INTEGER":
+                data[key] = rng.randint(1, 20)
+            else:
+                data[key] = rng.random() < 0.3
+        data.update(name=f"Character {i:05d}", attacks="- Longsword +5 1d8+3 slashing\n" * 3,
+                    journal="Session notes. " * 100)
+        return data
+
+    def timed(fn, n=repeats):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return (time.perf_counter() - start) / n * 1000
+
+    print(f"{'characters':>10} {'json party ms':>14} {'store party ms':>15} {'json all ms':>12} {'store all ms':>13} "
+          f"{'json update ms':>15} {'store update ms':>16} {'json KB':>8} {'store KB':>9}")
+    for count in counts:
+        rng = random.Random(7)
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = os.path.join(tmp, "characters")
+            os.makedirs(directory)
+            characters = {f"Character {i:05d}": sheet(i, rng) for i in range(count)}
+            for name, data in characters.items():
+                with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=4)
+            store = CampaignStore(os.path.join(tmp, "campaign.sqlite3"))
+            store.import_json(directory)
+            party = rng.sample(sorted(characters), min(party_size, count))
+            assert store.load() == characters
+
+            def json_load(names):
+                loaded = {}
+                for name in names:
+                    with open(os.path.join(directory, f"{name}.json"), "r", encoding="utf-8") as f:
+                        loaded[name] = json.load(f)
+                return loaded
+
+            def json_update():
+                for name in party:
+                    data = json_load([name])[name]
+                    data.update(hp_current=rng.randint(0, 20), death_failure_0=True)
+                    write_json_atomic(os.path.join(directory, f"{name}.json"), data, indent=4)
+
+            json_party = timed(lambda: json_load(party))
+            store_party = timed(lambda: store.load_party(party))
+            json_all = timed(lambda: json_load(sorted(f[:-len(".json")] for f in os.listdir(directory))),
+                             max(1, repeats // 5))
+            store_all = timed(lambda: store.load(), max(1, repeats // 5))
+            json_update_ms = timed(json_update, 5)
+            store_update_ms = timed(lambda: store.update_many(
+                {name: {"hp_current": rng.randint(0, 20), "death_failure_0": True} for name in party}), 5)
+            json_kb = sum(entry.stat().st_size for entry in os.scandir(directory)) / 1024
+            store.close()
+            store_kb = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)
+                           if f.startswith("campaign.sqlite3")) / 1024
+        print(f"{count:>10} {json_party:>14.2f} {store_party:>15.2f} {json_all:>12.1f} {store_all:>13.1f} "
+              f"{json_update_ms:>15.2f} {store_update_ms:>16.2f} {json_kb:>8.0f} {store_kb:>9.0f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,210 @@
+import copy
+import json
+import os
+import threading
+import time
+from atomic_file import write_json_atomic
+
+DEFAULT_CHARACTER_DIR = "characters"
+REFRESH_INTERVAL = 2.0  # seconds between directory scans when listings arrive back to back
+DEFAULT_LIMIT = 100
+SUMMARY_FIELDS = ("name", "class_level", "race", "hp_current", "hp_max", "armor_class")
+
+
+def character_summary(name, data):
+    """The fields shown in the character selector, with a label built from them."""
+    summary = {field: data.get(field) for field in SUMMARY_FIELDS}
+    summary["name"] = name
+    details = [str(data[field]) for field in ("class_level", "race") if data.get(field)]
+    if data.get("hp_max") is not None:
+        details.append(f"HP {data.get('hp_current', data['hp_max'])}/{data['hp_max']}")
+    if data.get("armor_class") is not None:
+        details.append(f"AC {data['armor_class']}")
+    summary["label"] = name + (f" · {', '.join(details)}" if details else "")
+    return summary
+
+
+class CharacterRepository:
+    def __init__(self, directory=DEFAULT_CHARACTER_DIR, refresh_interval=REFRESH_INTERVAL):
+        """In-memory cache of the character sheets in directory, keyed by file name without .json.
+
+        Each sheet is parsed once and re-read only when its mtime or size changes. Listings rescan
+        the directory at most every refresh_interval seconds, while get() always checks the one
+        file it returns, so a sheet edited on disk is never served stale. watch() keeps the cache
+        warm from a background thread instead.
+        """
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.entries = {}  # name -> (mtime_ns, size, data, summary)
+        self.last_refresh = 0.0
+        self.lock = threading.RLock()
+        self.watcher = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def _load(self, name, mtime_ns, size):
+        try:
+            with open(self._path(name), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping character {name}: {e}")
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        entry = (mtime_ns, size, data, character_summary(name, data))
+        self.entries[name] = entry
+        return entry
+
+    def refresh(self, force=False):
+        """Bring the cache in line with the directory and return (added or changed, removed) counts."""
+        with self.lock:
+            if not force and time.monotonic() - self.last_refresh < self.refresh_interval:
+                return 0, 0
+            seen = set()
+            changed = 0
+            if os.path.isdir(self.directory):
+                with os.scandir(self.directory) as entries:
+                    for entry in entries:
+                        # Dot files include the temp files of atomic writes in progress
+                        if not entry.name.endswith(".json") or entry.name.startswith(".") or not entry.is_file():
+                            continue
+                        name = entry.name[:-len(".json")]
+                        seen.add(name)
+                        stat = entry.stat()
+                        cached = self.entries.get(name)
+                        if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+                            self._load(name, stat.st_mtime_ns, stat.st_size)
+                            changed += 1
+            removed = [name for name in self.entries if name not in seen]
+            for name in removed:
+                del self.entries[name]
+            self.last_refresh = time.monotonic()
+        return changed, len(removed)
+
+    def names(self):
+        """Return the character names, sorted."""
+        self.refresh()
+        with self.lock:
+            return sorted(self.entries)
+
+    def summaries(self, search=None, limit=DEFAULT_LIMIT):
+        """Return up to limit selector summaries whose name, class or race contains search, sorted by name."""
+        self.refresh()
+        needle = (search or "").strip().lower()
+        with self.lock:
+            matches = [entry[3] for entry in self.entries.values()
+                       if not needle or needle in entry[3]["label"].lower()]
+        matches.sort(key=lambda summary: summary["name"].lower())
+        return matches[:limit] if limit else matches
+
+    def summary(self, name):
+        """Return the selector summary of one character, or None if there is no such character."""
+        entry = self._current(name)
+        return entry[3] if entry else None
+
+    def _current(self, name):
+        """Return the cache entry for name after checking the file's mtime and size."""
+        try:
+            stat = os.stat(self._path(name))
+        except (OSError, ValueError):
+            with self.lock:
+                self.entries.pop(name, None)
+            return None
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or entry[:2] != (stat.st_mtime_ns, stat.st_size):
+                entry = self._load(name, stat.st_mtime_ns, stat.st_size)
+            return entry
+
+    def get(self, name):
+        """Return a copy of a character sheet, or {} if there is no such character."""
+        entry = self._current(name)
+        return copy.deepcopy(entry[2]) if entry else {}
+
+    def save(self, name, data):
+        """Write a character sheet atomically and update the cache without re-reading it."""
+        path = self._path(name)
+        with self.lock:
+            write_json_atomic(path, data, indent=4)
+            stat = os.stat(path)
+            data = copy.deepcopy(data)
+            self.entries[name] = (stat.st_mtime_ns, stat.st_size, data, character_summary(name, data))
+
+    def invalidate(self, name=None):
+        """Drop one character, or everything, from the cache so it is re-read on next use."""
+        with self.lock:
+            if name is None:
+                self.entries.clear()
+                self.last_refresh = 0.0
+            else:
+                self.entries.pop(name, None)
+
+    def watch(self, interval=1.0):
+        """Rescan the directory every interval seconds in a background thread."""
+        def loop():
+            while True:
+                self.refresh(force=True)
+                time.sleep(interval)
+
+        if self.watcher is None:
+            self.watcher = threading.Thread(target=loop, daemon=True)
+            self.watcher.start()
+
+
+def run_benchmark(counts=(100, 1000, 5000), lookups=200):
+    """Time listing and loading characters with listdir and json.load per request versus the repository.
+
+    'load all' is what a selector showing class, race, HP and AC would cost without the cache.
+    """
+    import random
+    import tempfile
+
+    print(f"{'characters':>10} {'listdir ms':>11} {'load all ms':>12} {'cached list ms':>15} {'search ms':>10} "
+          f"{'json.load us':>13} {'cached get us':>14}")
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [f"Character {i:05d}" for i in range(count)]
+            for i, name in enumerate(names):
+                with open(os.path.join(tmp, f"{name}.json"), "w", encoding="utf-8") as f:
+                    json.dump({"name": name, "class_level": f"Fighter {i % 20 + 1}", "race": "Human",
+                               "hp_max": 12, "hp_current": 12, "armor_class": 15,
+                               "equipment": "- Longsword\n- Shield\n" * 20}, f, indent=4)
+            rng = random.Random(7)
+            picks = [rng.choice(names) for _ in range(lookups)]
+
+            start = time.perf_counter()
+            for _ in range(10):
+                listing = [f.replace(".json", "") for f in os.listdir(tmp) if f.endswith(".json")]
+            listdir_ms = (time.perf_counter() - start) / 10 * 1000
+            start = time.perf_counter()
+            for name in picks:
+                with open(os.path.join(tmp, f"{name}.json"), "r") as f:
+                    json.load(f)
+            load_us = (time.perf_counter() - start) / lookups * 1e6
+            start = time.perf_counter()
+            for name in listing:
+                with open(os.path.join(tmp, f"{name}.json"), "r") as f:
+                    character_summary(name, json.load(f))
+            summary_ms = (time.perf_counter() - start) * 1000
+
+            repository = CharacterRepository(tmp)
+            repository.refresh(force=True)
+            start = time.perf_counter()
+            for _ in range(10):
+                repository.summaries(limit=None)
+            list_ms = (time.perf_counter() - start) / 10 * 1000
+            start = time.perf_counter()
+            for _ in range(10):
+                repository.summaries("fighter 7")
+            search_ms = (time.perf_counter() - start) / 10 * 1000
+            start = time.perf_counter()
+            for name in picks:
+                repository.get(name)
+            get_us = (time.perf_counter() - start) / lookups * 1e6
+            assert len(listing) == count
+        print(f"{count:>10} {listdir_ms:>11.2f} {summary_ms:>12.1f} {list_ms:>15.2f} {search_ms:>10.2f} {load_us:>13.1f} {get_us:>14.1f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
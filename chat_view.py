@@ -0,0 +1,91 @@
+from dash import html, Patch
+
+CHAT_WINDOW = 50  # messages rendered when the chat panel is (re)built
+CHAT_PAGE = 50  # older messages added each time the top of the panel is reached
+MESSAGE_STYLE = {'margin': '5px 0', 'borderBottom': '1px solid #444'}
+
+
+def render_message(msg):
+    """Render one chat message, with a cursor while it streams and a marker if it came from the cache."""
+    if msg.get("is_loading", False) and msg.get("message"):
+        return html.Div([
+            html.Span(f"{msg['sender']}: {msg['message']}"),
+            html.Span(" ▌", style={'color': '#888'})
+        ], style=MESSAGE_STYLE)
+    elif msg.get("is_loading", False):
+        message_content = html.Div([
+            html.I(className="fas fa-spinner fa-spin", style={'marginRight': '10px', 'color': '#888'}),
+            html.Span("Thinking...", style={'color': '#888', 'fontStyle': 'italic'})
+        ])
+        return html.Div([
+            html.Span(f"{msg['sender']}: ", style={'marginRight': '5px'}),
+            message_content
+        ], style=MESSAGE_STYLE)
+    elif msg.get("cached", False):
+        return html.Div([
+            html.Span(f"{msg['sender']}: {msg['message']}"),
+            html.Span(" (cached)", style={'color': '#888', 'fontStyle': 'italic'})
+        ], style=MESSAGE_STYLE)
+    return html.Div(f"{msg['sender']}: {msg['message']}", style=MESSAGE_STYLE)
+
+
+def window_start(total, window=CHAT_WINDOW):
+    """Index of the first message shown when the panel is rebuilt for a history of total messages."""
+    return max(0, total - window)
+
+
+def render_window(chat_history, start):
+    """Render the messages from start onwards, or the placeholder for an empty history."""
+    if not chat_history:
+        return "No messages yet."
+    return [render_message(msg) for msg in chat_history[start:]]
+
+
+def prepend_page(chat_history, start, page=CHAT_PAGE):
+    """Return (patch, new start) that adds the page of messages just before start to the top of the panel."""
+    new_start = max(0, start - page)
+    patch = Patch()
+    for msg in reversed(chat_history[new_start:start]):
+        patch.prepend(render_message(msg))
+    return patch, new_start
+
+
+def run_benchmark(counts=(100, 1000, 10000), repeats=5):
+    """Time building and serializing the chat panel update per new message: full list versus windowed append."""
+    import time
+    from dash._utils import to_json
+
+    def fake_history(count):
+        return [{"sender": "DM" if i % 2 == 0 else "DM Assist",
+                 "message": f"Turn {i // 2}: " + "The goblins scatter into the ruins. " * (1 if i % 2 == 0 else 4)}
+                for i in range(count)]
+
+    def timed(fn):
+        best = float("inf")
+        size = 0
+        for _ in range(repeats):
+            start = time.perf_counter()
+            size = len(to_json(fn()))
+            best = min(best, time.perf_counter() - start)
+        return best * 1000, size
+
+    print(f"{'messages':>8} {'full ms':>9} {'full KB':>9} {'window ms':>10} {'window KB':>10} "
+          f"{'append ms':>10} {'append KB':>10}")
+    for count in counts:
+        history = fake_history(count)
+        new_message = history[-1]
+
+        def append():
+            patch = Patch()
+            patch.append(render_message(new_message))
+            return patch
+
+        full_ms, full_size = timed(lambda: [render_message(msg) for msg in history])
+        window_ms, window_size = timed(lambda: render_window(history, window_start(len(history))))
+        append_ms, append_size = timed(append)
+        print(f"{count:>8} {full_ms:>9.2f} {full_size / 1024:>9.1f} {window_ms:>10.2f} {window_size / 1024:>10.1f} "
+              f"{append_ms:>10.3f} {append_size / 1024:>10.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
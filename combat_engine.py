@@ -0,0 +1,240 @@
+import bisect
+import heapq
+import itertools
+
+PHASE_START = 0  # expires when the anchor creature's turn starts
+PHASE_END = 1  # expires when the anchor creature's turn ends
+
+
+class Combatant:
+    def __init__(self, name, initiative, dexterity=0):
+        """A creature in the initiative order; turns_taken counts the turns it has started."""
+        self.name = name
+        self.initiative = initiative
+        self.dexterity = dexterity
+        self.turns_taken = 0
+        self.expiry = []  # heap of (turns_taken at expiry, phase, effect id)
+
+
+class Effect:
+    def __init__(self, effect_id, name, character, duration, anchor, phase, expires_at):
+        """An active effect on a character, timed against its anchor creature's turns or, without one, every turn."""
+        self.effect_id = effect_id
+        self.name = name
+        self.character = character
+        self.duration = duration
+        self.anchor = anchor
+        self.phase = phase
+        self.expires_at = expires_at
+
+
+class CombatEngine:
+    def __init__(self):
+        """Initiative order, round and turn cursor, and effects that expire on a specific creature's turn.
+
+        Each combatant keeps a min-heap of the effects timed against its turns, so advancing the turn
+        only looks at the creature whose turn ends and the one whose turn starts. Effects on characters
+        who are not in the initiative order tick down on every turn, as the tracker always did.
+        """
+        self.order = []  # sorted keys (-initiative, -dexterity, sequence)
+        self.combatants = {}  # key -> Combatant
+        self.by_name = {}  # name -> key
+        self.current = None  # index into order of the creature whose turn it is
+        self.round = 0
+        self.turn_count = 0  # turns advanced in total, the clock for effects without an anchor
+        self.global_expiry = []  # heap of (turn_count at expiry, effect id)
+        self.effects = {}  # effect id -> Effect, in the order they were added
+        self.sequence = itertools.count()
+        self.effect_ids = itertools.count(1)
+
+    def add_combatant(self, name, initiative, dexterity=0):
+        """Add a creature to the initiative order, replacing one with the same name."""
+        if name in self.by_name:
+            self.remove_combatant(name)
+        key = (-initiative, -dexterity, next(self.sequence))
+        index = bisect.bisect_left(self.order, key)
+        self.order.insert(index, key)
+        self.combatants[key] = Combatant(name, initiative, dexterity)
+        self.by_name[name] = key
+        if self.current is not None and index <= self.current:
+            self.current += 1
+        return index
+
+    def remove_combatant(self, name):
+        """Take a creature out of the initiative order; its anchored effects fall back to ticking every turn.
+
+        Removing the creature whose turn it is ends that turn and starts the next creature's.
+        Returns (expired effects, ids of effects whose remaining turns changed), as next_turn does.
+        """
+        expired = []
+        changed = set()
+        key = self.by_name.pop(name)
+        index = bisect.bisect_left(self.order, key)
+        combatant = self.combatants[key]
+        ending = index == self.current
+        if ending:
+            self._expire_anchored(combatant, PHASE_END, expired)
+        del self.order[index]
+        del self.combatants[key]
+        for expires_at, phase, effect_id in combatant.expiry:
+            effect = self.effects.get(effect_id)
+            if effect is not None and effect.anchor is combatant:
+                remaining = max(1, expires_at - combatant.turns_taken)
+                effect.anchor = None
+                effect.expires_at = self.turn_count + remaining
+                heapq.heappush(self.global_expiry, (effect.expires_at, effect_id))
+        if self.current is not None:
+            if not self.order:
+                self.current = None
+            elif index < self.current:
+                self.current -= 1
+            elif ending:
+                if self.current == len(self.order):
+                    # The creature whose turn it was came last, so the turn passes to the top of the next round
+                    self.current = 0
+                    self.round += 1
+                changed = self._start_turn(expired)
+        return expired, changed
+
+    def active(self):
+        """Return the combatant whose turn it is, or None outside combat."""
+        return self.combatants[self.order[self.current]] if self.current is not None else None
+
+    def add_effect(self, name, character, duration, anchor=None, phase=PHASE_END):
+        """Add an effect lasting duration of the anchor's turns (default: the character, if in initiative).
+
+        It expires at the start or end (phase) of the anchor's duration-th turn after the current one.
+        Returns the effect id.
+        """
+        effect_id = next(self.effect_ids)
+        anchor_name = anchor if anchor is not None else character
+        key = self.by_name.get(anchor_name)
+        if key is not None:
+            combatant = self.combatants[key]
+            expires_at = combatant.turns_taken + duration
+            heapq.heappush(combatant.expiry, (expires_at, phase, effect_id))
+        else:
+            combatant = None
+            expires_at = self.turn_count + duration
+            heapq.heappush(self.global_expiry, (expires_at, effect_id))
+        self.effects[effect_id] = Effect(effect_id, name, character, duration, combatant, phase, expires_at)
+        return effect_id
+
+    def remove_effect(self, effect_id):
+        """End an effect early; its heap entry is skipped when it comes up."""
+        return self.effects.pop(effect_id, None)
+
+    def remaining(self, effect):
+        """Turns left on an effect, counted in its anchor's turns."""
+        if effect.anchor is None:
+            return effect.expires_at - self.turn_count
+        return effect.expires_at - effect.anchor.turns_taken
+
+    def _expire_anchored(self, combatant, phase, expired):
+        heap = combatant.expiry
+        while heap and heap[0][:2] <= (combatant.turns_taken, phase):
+            _, _, effect_id = heapq.heappop(heap)
+            effect = self.effects.get(effect_id)
+            # Entries of removed effects are dropped here rather than searched for on removal
+            if effect is not None and effect.anchor is combatant:
+                expired.append(self.effects.pop(effect_id))
+
+    def next_turn(self):
+        """End the current creature's turn and start the next one's.
+
+        Returns (expired effects, ids of effects whose remaining turns changed).
+        """
+        expired = []
+        if self.order:
+            if self.current is None:
+                self.current = 0
+                self.round = 1
+            else:
+                self._expire_anchored(self.active(), PHASE_END, expired)
+                self.current += 1
+                if self.current == len(self.order):
+                    self.current = 0
+                    self.round += 1
+        return expired, self._start_turn(expired)
+
+    def _start_turn(self, expired):
+        """Start the active creature's turn (if any) and tick the unanchored clock.
+
+        Appends the effects that expire to expired and returns the ids of effects whose remaining turns changed.
+        """
+        changed = set()
+        starting = self.active()
+        if starting is not None:
+            starting.turns_taken += 1
+            self._expire_anchored(starting, PHASE_START, expired)
+        self.turn_count += 1
+        while self.global_expiry and self.global_expiry[0][0] <= self.turn_count:
+            _, effect_id = heapq.heappop(self.global_expiry)
+            effect = self.effects.get(effect_id)
+            if effect is not None and effect.anchor is None:
+                expired.append(self.effects.pop(effect_id))
+        # Only effects on the unanchored clock and those timed against the creature starting its turn count down
+        changed.update(effect_id for _, effect_id in self.global_expiry if effect_id in self.effects)
+        if starting is not None:
+            changed.update(effect_id for _, _, effect_id in starting.expiry if effect_id in self.effects)
+        return changed
+
+    def end_combat(self):
+        """Clear the initiative order; remaining anchored effects keep ticking every turn."""
+        self.current = None
+        for name in list(self.by_name):
+            self.remove_combatant(name)
+        self.current = None
+        self.round = 0
+
+    def initiative_order(self):
+        """Return [(name, initiative, is_current)] in turn order."""
+        return [(self.combatants[key].name, self.combatants[key].initiative, index == self.current)
+                for index, key in enumerate(self.order)]
+
+
+def run_benchmark(combatant_counts=(10, 100, 500), effects_per_combatant=10, turns=2000):
+    """Time next_turn against rebuilding and decrementing the whole effect list every turn."""
+    import random
+    import time
+
+    print(f"{'combatants':>10} {'effects':>8} {'engine us/turn':>15} {'rebuild us/turn':>16}")
+    for count in combatant_counts:
+        rng = random.Random(7)
+        engine = CombatEngine()
+        names = [f"creature {i}" for i in range(count)]
+        for name in names:
+            engine.add_combatant(name, rng.randint(1, 25), rng.randint(-1, 5))
+        naive = []
+
+        def add_effects(n):
+            for _ in range(n):
+                name = rng.choice(names)
+                duration = rng.randint(1, 10)
+                engine.add_effect("blessed", name, duration, phase=rng.choice((PHASE_START, PHASE_END)))
+                naive.append({"character": name, "name": "blessed", "turns": duration * count})
+
+        add_effects(count * effects_per_combatant)
+        start = time.perf_counter()
+        for _ in range(turns):
+            expired, _ = engine.next_turn()
+            add_effects(len(expired))
+        engine_time = (time.perf_counter() - start) / turns
+
+        start = time.perf_counter()
+        for _ in range(turns):
+            updated = []
+            for effect in naive:
+                if effect["turns"] - 1 > 0:
+                    updated.append({"character": effect["character"], "name": effect["name"],
+                                    "turns": effect["turns"] - 1})
+            # Top the list back up so both sides track the same number of effects
+            for _ in range(len(naive) - len(updated)):
+                updated.append({"character": rng.choice(names), "name": "blessed", "turns": rng.randint(1, 10) * count})
+            naive = updated
+        naive_time = (time.perf_counter() - start) / turns
+        print(f"{count:>10} {len(engine.effects):>8} {engine_time * 1e6:>15.1f} {naive_time * 1e6:>16.1f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,256 @@
+import os
+import threading
+from collections import deque
+from atomic_file import write_text_atomic
+
+CHARS_PER_TOKEN = 4  # Rough estimate that holds well enough for English prose across tokenizers
+DEFAULT_TOKEN_BUDGET = 3000
+MODEL_TOKEN_BUDGETS = {
+    "gemma3:1b": 2000,
+    "gemma3:4b": 6000,
+}
+NOTES_BUDGET_SHARE = 0.5  # Notes may use at most this share of the budget, the rest goes to chat history
+SUMMARY_BUDGET_SHARE = 0.25  # Rolling summary may use at most this share of the budget
+RETRIEVAL_BUDGET_SHARE = 0.25  # Retrieved chunks of older history may use at most this share of the budget
+RETRIEVAL_TOP_K = 4
+MAX_RECENT_TURNS = 12
+MAX_SUMMARY_LINES = 200
+SUMMARY_SNIPPET_CHARS = 160
+
+
+def estimate_tokens(text):
+    """Estimate the token count of a string without loading a tokenizer."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text, max_tokens, keep_end=False):
+    """Trim text to roughly max_tokens, keeping the start (or the end when keep_end is set)."""
+    max_chars = max(0, max_tokens) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if max_chars == 0:
+        return ""
+    return text[-max_chars:] if keep_end else text[:max_chars]
+
+
+def parse_transcript(text):
+    """Split transcript text written as 'User: ...' / 'DM Assist: ...' lines into (user, response) turns."""
+    turns = []
+    user_lines, response_lines, current = [], [], None
+    for line in text.splitlines():
+        if line.startswith("User: "):
+            if current is not None:
+                turns.append(("\n".join(user_lines), "\n".join(response_lines)))
+            user_lines, response_lines = [line[len("User: "):]], []
+            current = user_lines
+        elif line.startswith("DM Assist: ") and current is user_lines:
+            response_lines.append(line[len("DM Assist: "):])
+            current = response_lines
+        elif current is not None:
+            current.append(line)
+    if current is not None:
+        turns.append(("\n".join(user_lines), "\n".join(response_lines)))
+    return turns
+
+
+def format_turn(user_msg, response):
+    """Format a turn the same way it is written to the transcript file."""
+    return "User: " + user_msg + "\n" + "DM Assist: " + response + "\n"
+
+
+def summarize_turn(user_msg, response):
+    """Reduce a turn to a one-line extract for the rolling summary."""
+    question = " ".join(user_msg.split())[:SUMMARY_SNIPPET_CHARS]
+    answer = " ".join(response.split())
+    end = answer.find(". ")
+    if end != -1:
+        answer = answer[:end + 1]
+    return f"- Asked: {question} | Answered: {answer[:SUMMARY_SNIPPET_CHARS]}"
+
+
+class WatchedFile:
+    def __init__(self, path):
+        """Cache the contents of a file, re-reading it only when its mtime or size changes."""
+        self.path = path
+        self.signature = None
+        self.content = ""
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def changed(self):
+        """Return True if the file on disk differs from the cached copy."""
+        return self._stat_signature() != self.signature
+
+    def read(self):
+        """Return the file contents, touching disk only if the file changed since the last read."""
+        signature = self._stat_signature()
+        if signature != self.signature:
+            if signature is None:
+                self.content = ""
+            else:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.content = f.read()
+            self.signature = signature
+        return self.content
+
+    def mark_current(self, content=None):
+        """Record the file as up to date after this process wrote it, so the next read skips disk."""
+        if content is not None:
+            self.content = content
+        self.signature = self._stat_signature()
+
+
+class ContextBuilder:
+    def __init__(self, notes_path, transcripts, max_recent_turns=MAX_RECENT_TURNS,
+                 model_budgets=None, default_budget=DEFAULT_TOKEN_BUDGET, retriever=None,
+                 retrieval_top_k=RETRIEVAL_TOP_K):
+        """Assemble bounded LLM context from the notes file, recent chat turns and a rolling summary of older turns.
+
+        transcripts is a transcript_store.TranscriptStore; turns come from its active session. If a
+        retriever (see retrieval_index.RetrievalIndex) is given, chunks of older notes and transcripts
+        relevant to the current question are added as well.
+        """
+        self.notes = WatchedFile(notes_path)
+        self.transcripts = transcripts
+        self.transcript = WatchedFile(transcripts.active_path)
+        self.max_recent_turns = max_recent_turns
+        self.model_budgets = dict(MODEL_TOKEN_BUDGETS if model_budgets is None else model_budgets)
+        self.default_budget = default_budget
+        self.retriever = retriever
+        self.retrieval_top_k = retrieval_top_k
+        self.recent_turns = deque()
+        self.summary_lines = deque(maxlen=MAX_SUMMARY_LINES)
+        self.last_report = {}
+        self.lock = threading.Lock()
+
+    def budget_for(self, model_id):
+        """Return the token budget configured for a model id."""
+        return self.model_budgets.get(model_id, self.default_budget)
+
+    def _push_turn(self, user_msg, response):
+        self.recent_turns.append((user_msg, response))
+        while len(self.recent_turns) > self.max_recent_turns:
+            self.summary_lines.append(summarize_turn(*self.recent_turns.popleft()))
+
+    def _sync_transcript(self):
+        """Reload the turn ring from the active segment if something other than record_turn changed it."""
+        if self.transcript.path != self.transcripts.active_path:
+            self.transcript = WatchedFile(self.transcripts.active_path)
+        if not self.transcript.changed():
+            return
+        self.recent_turns.clear()
+        self.summary_lines.clear()
+        for user_msg, response in parse_transcript(self.transcript.read()):
+            self._push_turn(user_msg, response)
+
+    def record_turn(self, user_msg, response):
+        """Append a finished turn to the transcript store and the in-memory ring."""
+        with self.lock:
+            self._sync_transcript()
+            self.transcripts.append(format_turn(user_msg, response))
+            self.transcript.mark_current()
+            self._push_turn(user_msg, response)
+
+    def save_notes(self, text):
+        """Atomically write the notes file and update the cached copy; return False if nothing changed."""
+        with self.lock:
+            if text == self.notes.read():
+                return False
+            write_text_atomic(self.notes.path, text)
+            self.notes.mark_current(text)
+            return True
+
+    def reset(self):
+        """Forget all turns, e.g. after the transcript store has been rotated to a new session."""
+        with self.lock:
+            self.recent_turns.clear()
+            self.summary_lines.clear()
+            self.transcript = WatchedFile(self.transcripts.active_path)
+            self.transcript.mark_current("")
+
+    def _retrieve(self, query, budget, already_included):
+        """Return retrieved chunks relevant to the query that fit the budget and are not already in context."""
+        if self.retriever is None or not query or budget <= 0:
+            return [], 0
+        chunks = []
+        used = 0
+        for score, source, text in self.retriever.search(query, self.retrieval_top_k):
+            if any(text in section for section in already_included):
+                continue
+            chunk_tokens = estimate_tokens(text + "\n")
+            if used + chunk_tokens > budget:
+                continue
+            chunks.append(text)
+            used += chunk_tokens
+        return chunks, used
+
+    def build(self, model_id=None, query=None):
+        """Return (context, report) where report lists the tokens each section contributed.
+
+        The query, usually the user's message, selects relevant older history when a retriever is configured.
+        """
+        with self.lock:
+            self._sync_transcript()
+            budget = self.budget_for(model_id)
+
+            notes = truncate_to_tokens(self.notes.read(), int(budget * NOTES_BUDGET_SHARE))
+            remaining = budget - estimate_tokens(notes)
+            # Reserve room for retrieved history before recent turns take the rest
+            retrieval_budget = int(budget * RETRIEVAL_BUDGET_SHARE) if self.retriever is not None and query else 0
+            remaining -= retrieval_budget
+
+            recent = []
+            recent_tokens = 0
+            for user_msg, response in reversed(self.recent_turns):
+                turn = format_turn(user_msg, response)
+                turn_tokens = estimate_tokens(turn)
+                if recent_tokens + turn_tokens > remaining:
+                    break
+                recent.append(turn)
+                recent_tokens += turn_tokens
+            recent.reverse()
+            remaining -= recent_tokens
+
+            summary = []
+            summary_tokens = 0
+            summary_budget = min(remaining, int(budget * SUMMARY_BUDGET_SHARE))
+            # Turns that fell out of the window because of the budget are summarized too
+            skipped = list(self.recent_turns)[:len(self.recent_turns) - len(recent)]
+            older = list(self.summary_lines) + [summarize_turn(*turn) for turn in skipped]
+            for line in reversed(older):
+                line_tokens = estimate_tokens(line + "\n")
+                if summary_tokens + line_tokens > summary_budget:
+                    break
+                summary.append(line)
+                summary_tokens += line_tokens
+            summary.reverse()
+
+            retrieved, retrieved_tokens = self._retrieve(query, retrieval_budget, [notes] + recent)
+
+            sections = [notes]
+            if retrieved:
+                sections.append("Relevant earlier notes and conversation:\n" + "\n".join(retrieved) + "\n")
+            if summary:
+                sections.append("Summary of earlier conversation:\n" + "\n".join(summary) + "\n")
+            sections.append("".join(recent))
+            context = "\n".join(sections)
+
+            self.last_report = {
+                "model": model_id,
+                "budget": budget,
+                "notes": estimate_tokens(notes),
+                "summary": summary_tokens,
+                "retrieved": retrieved_tokens,
+                "recent_turns": recent_tokens,
+                "turns_included": len(recent),
+                "turns_summarized": len(summary),
+                "total": estimate_tokens(context),
+            }
+            return context, self.last_report
@@ -0,0 +1,396 @@
+import math
+import re
+from functools import lru_cache
+import numpy as np
+
+MAX_DICE = 200
+MAX_SIDES = 1000
+MAX_OUTCOMES = 20000  # dice x values one die can show (explosions included), the length of a term's distribution
+MAX_KEEP_STEPS = 20000  # face values x dice placements the keep-highest/lowest programme may loop over
+EXPLODE_TAIL = 1e-12  # exploding dice distributions stop once the remaining probability is below this
+MAX_EXPLOSIONS = 100  # per die when rolling
+TERM_PATTERN = re.compile(r"\s*([+-])?\s*(?:(\d*)[dD](\d+|%)((?:(?:kh|kl|dh|dl|k|r)\d+|!)*)|(\d+))\s*", re.IGNORECASE)
+MODIFIER_PATTERN = re.compile(r"(kh|kl|dh|dl|k|r)(\d+)|(!)", re.IGNORECASE)
+DAMAGE_PATTERN = re.compile(r"^\s*(\d*d\d+(?:\s*[+-]\s*(?:\d*d)?\d+)*)\s*(.*)$", re.IGNORECASE)
+ATTACK_PATTERN = re.compile(r"^\s*-?\s*(.*?)\s*([+-]\d+)\s+(\d*d\d+(?:\s*[+-]\s*\d+)*)\s*(.*)$", re.IGNORECASE)
+
+
+class Distribution:
+    def __init__(self, offset, probs):
+        """Exact probability distribution over the integers offset .. offset + len(probs) - 1."""
+        self.offset = offset
+        self.probs = probs
+
+    @classmethod
+    def constant(cls, value):
+        return cls(value, np.ones(1))
+
+    def __add__(self, other):
+        if isinstance(other, int):
+            return Distribution(self.offset + other, self.probs)
+        return Distribution(self.offset + other.offset, np.convolve(self.probs, other.probs))
+
+    def __neg__(self):
+        return Distribution(-(self.offset + len(self.probs) - 1), self.probs[::-1])
+
+    def values(self):
+        return np.arange(self.offset, self.offset + len(self.probs))
+
+    def mean(self):
+        return float(np.dot(self.values(), self.probs))
+
+    def std(self):
+        mean = self.mean()
+        return float(math.sqrt(max(0.0, np.dot((self.values() - mean) ** 2, self.probs))))
+
+    def min(self):
+        return self.offset
+
+    def max(self):
+        return self.offset + len(self.probs) - 1
+
+    def prob_at_least(self, value):
+        """P(result >= value)."""
+        index = value - self.offset
+        if index <= 0:
+            return 1.0
+        return float(self.probs[index:].sum())
+
+    def as_dict(self):
+        """Return {value: probability} for the outcomes with non-zero probability."""
+        return {int(value): float(p) for value, p in zip(self.values(), self.probs) if p > 0}
+
+
+@lru_cache(maxsize=256)
+def die_distribution(sides, reroll=0, explode=False):
+    """Distribution of one die, rerolled once if it shows reroll or lower, and exploding on its maximum.
+
+    Only the die as first rolled is rerolled; the dice an explosion adds are taken as they fall,
+    as DiceTerm.roll does.
+    """
+    plain = np.full(sides, 1.0 / sides)
+    probs = plain.copy()
+    if reroll:
+        low = min(reroll, sides)
+        probs[:low] = 0.0
+        probs += plain * (low / sides)
+    if not explode:
+        return Distribution(1, probs)
+    # value k * sides + r for k explosions: probs[max] * plain[max]^(k-1) * plain[r]; stop once the tail is negligible
+    p_max = 1.0 / sides
+    depth = 1
+    while probs[-1] * p_max ** (depth - 1) > EXPLODE_TAIL and depth < MAX_EXPLOSIONS:
+        depth += 1
+    exploded = np.zeros(sides * depth)
+    exploded[:sides - 1] = probs[:-1]
+    for k in range(1, depth):
+        exploded[k * sides:k * sides + sides - 1] = probs[-1] * p_max ** (k - 1) * plain[:-1]
+    exploded[-1] = probs[-1] * p_max ** (depth - 1)  # the remaining mass, below EXPLODE_TAIL
+    return Distribution(1, exploded)
+
+
+@lru_cache(maxsize=256)
+def keep_distribution(count, sides, keep, highest, reroll=0, explode=False):
+    """Distribution of the sum of the keep highest (or lowest) of count dice.
+
+    Dynamic programme over face values from the kept end: choosing how many dice show each value
+    with multinomial weights, tracking dice placed and the kept sum, so no roll is enumerated.
+    """
+    die = die_distribution(sides, reroll, explode)
+    faces = [(int(value), float(p)) for value, p in zip(die.values(), die.probs) if p > 0]
+    if highest:
+        faces.reverse()
+    max_sum = keep * max(value for value, _ in faces)
+    # state[placed][kept_sum]
+    state = np.zeros((count + 1, max_sum + 1))
+    state[0, 0] = 1.0
+    for value, p in faces:
+        new_state = np.zeros_like(state)
+        for placed in range(count + 1):
+            row = state[placed]
+            if not row.any():
+                continue
+            kept_so_far = min(placed, keep)
+            for c in range(count - placed + 1):
+                added = value * min(c, keep - kept_so_far)
+                weight = math.comb(count - placed, c) * p ** c
+                if added:
+                    new_state[placed + c, added:] += weight * row[:max_sum + 1 - added]
+                else:
+                    new_state[placed + c] += weight * row
+        state = new_state
+    probs = state[count]
+    nonzero = np.nonzero(probs)[0]
+    return Distribution(int(nonzero[0]), probs[nonzero[0]:nonzero[-1] + 1].copy())
+
+
+class DiceTerm:
+    def __init__(self, count, sides, keep=None, highest=True, reroll=0, explode=False):
+        """count dice of sides faces, optionally keeping the highest or lowest keep of them."""
+        if not 1 <= count <= MAX_DICE or not 1 <= sides <= MAX_SIDES:
+            raise ValueError(f"dice must be 1-{MAX_DICE} dice of 1-{MAX_SIDES} sides")
+        if explode and sides == 1:
+            raise ValueError("a d1 cannot explode")
+        self.count = count
+        self.sides = sides
+        self.keep = None if keep is None or keep >= count else max(0, keep)
+        self.highest = highest
+        self.reroll = min(reroll, sides - 1)
+        self.explode = explode
+        # Bound the work distribution() does, since expressions come straight from the chat input
+        faces = len(die_distribution(sides, self.reroll, explode).probs)
+        if count * faces > MAX_OUTCOMES:
+            raise ValueError(f"{count}d{sides}{'!' if explode else ''} has too many outcomes to compute exactly; "
+                             "use fewer dice or sides")
+        if self.keep:
+            if faces * (count + 1) * (count + 2) // 2 > MAX_KEEP_STEPS:
+                raise ValueError(f"keeping {self.keep} of {count}d{sides} is too much work to compute exactly; "
+                                 "use fewer dice or sides")
+
+    def distribution(self):
+        if self.keep is not None:
+            if self.keep == 0:
+                return Distribution.constant(0)
+            return keep_distribution(self.count, self.sides, self.keep, self.highest, self.reroll, self.explode)
+        return _sum_distribution(self.count, self.sides, self.reroll, self.explode)
+
+    def roll(self, n, rng):
+        """Return an (n, count) array of die results for n independent rolls of this term."""
+        dice = rng.integers(1, self.sides + 1, size=(n, self.count))
+        if self.reroll:
+            low = dice <= self.reroll
+            dice[low] = rng.integers(1, self.sides + 1, size=int(low.sum()))
+        if self.explode:
+            exploding = dice % self.sides == 0
+            for _ in range(MAX_EXPLOSIONS):
+                if not exploding.any():
+                    break
+                extra = np.zeros_like(dice)
+                extra[exploding] = rng.integers(1, self.sides + 1, size=int(exploding.sum()))
+                dice += extra
+                exploding = exploding & (extra == self.sides)
+        return dice
+
+    def kept(self, dice):
+        """Reduce rolled dice to the kept sum per roll."""
+        if self.keep is None:
+            return dice.sum(axis=1)
+        if self.keep == 0:
+            return np.zeros(len(dice), dtype=dice.dtype)
+        ordered = np.sort(dice, axis=1)
+        return (ordered[:, -self.keep:] if self.highest else ordered[:, :self.keep]).sum(axis=1)
+
+
+@lru_cache(maxsize=256)
+def _sum_distribution(count, sides, reroll, explode):
+    """Distribution of the sum of count dice, by repeated squaring of the single-die convolution."""
+    result = Distribution.constant(0)
+    power = die_distribution(sides, reroll, explode)
+    while count:
+        if count & 1:
+            result = result + power
+        count >>= 1
+        if count:
+            power = power + power
+    return result
+
+
+class DiceExpression:
+    def __init__(self, text):
+        """Parse dice notation such as '4d6kh3', '2d20kl1+5', '3d6!', '2d6r2+3' or '1d8+4'.
+
+        Modifiers: khN/kN keep highest, klN keep lowest, dhN/dlN drop highest/lowest, rN reroll once
+        on N or lower, ! explode on the maximum.
+        """
+        self.text = text.strip()
+        self.terms = []  # (sign, DiceTerm or int)
+        position = 0
+        while position < len(text):
+            match = TERM_PATTERN.match(text, position)
+            if match is None or match.end() == position:
+                raise ValueError(f"could not parse dice expression '{text}' at '{text[position:]}'")
+            sign = -1 if match.group(1) == "-" else 1
+            if self.terms and match.group(1) is None:
+                raise ValueError(f"expected + or - before '{match.group(0).strip()}' in '{text}'")
+            if match.group(5) is not None:
+                self.terms.append((sign, int(match.group(5))))
+            else:
+                self.terms.append((sign, self._dice_term(match)))
+            position = match.end()
+        if not self.terms:
+            raise ValueError("empty dice expression")
+
+    @staticmethod
+    def _dice_term(match):
+        count = int(match.group(2) or 1)
+        sides = 100 if match.group(3) == "%" else int(match.group(3))
+        keep, highest, reroll, explode = None, True, 0, False
+        for modifier in MODIFIER_PATTERN.finditer(match.group(4) or ""):
+            if modifier.group(3):
+                explode = True
+                continue
+            kind, number = modifier.group(1).lower(), int(modifier.group(2))
+            if kind in ("kh", "k"):
+                keep, highest = number, True
+            elif kind == "kl":
+                keep, highest = number, False
+            elif kind == "dh":
+                keep, highest = count - number, False
+            elif kind == "dl":
+                keep, highest = count - number, True
+            elif kind == "r":
+                reroll = number
+        return DiceTerm(count, sides, keep, highest, reroll, explode)
+
+    def distribution(self, crit=False):
+        """Exact distribution of the total; with crit set, every dice term is rolled twice."""
+        total = Distribution.constant(0)
+        for sign, term in self.terms:
+            if isinstance(term, int):
+                total = total + sign * term
+                continue
+            part = term.distribution()
+            if crit:
+                part = part + part
+            total = total + (part if sign > 0 else -part)
+        return total
+
+    def roll_many(self, n, rng=None, crit=None):
+        """Roll the expression n times at once and return an array of totals.
+
+        crit is an optional boolean array of length n; where it is set the dice terms are rolled twice.
+        """
+        rng = rng or np.random.default_rng()
+        totals = np.zeros(n, dtype=np.int64)
+        for sign, term in self.terms:
+            if isinstance(term, int):
+                totals += sign * term
+                continue
+            totals += sign * term.kept(term.roll(n, rng))
+            if crit is not None and crit.any():
+                totals[crit] += sign * term.kept(term.roll(int(crit.sum()), rng))
+        return totals
+
+    def roll(self, rng=None, crit=False):
+        """Roll once; return (total, a breakdown such as '[6, 5, 3, (2)] + 2' with dropped dice in brackets).
+
+        With crit set, every dice term is rolled twice, as in distribution(crit=True).
+        """
+        rng = rng or np.random.default_rng()
+        total = 0
+        parts = []
+        for sign, term in self.terms:
+            prefix = ("- " if sign < 0 else "+ ") if parts else ("-" if sign < 0 else "")
+            if isinstance(term, int):
+                total += sign * term
+                parts.append(f"{prefix}{term}")
+                continue
+            dice = term.roll(2 if crit else 1, rng)
+            total += sign * int(term.kept(dice).sum())
+            keep = term.count if term.keep is None else term.keep
+            groups = []
+            for row in dice.tolist():
+                shown = sorted(row, reverse=term.highest)
+                groups.append("[" + ", ".join(str(d) if i < keep else f"({d})" for i, d in enumerate(shown)) + "]")
+            parts.append(prefix + "".join(groups))
+        return total, " ".join(parts)
+
+
+@lru_cache(maxsize=512)
+def parse(text):
+    """Parse and cache a dice expression."""
+    return DiceExpression(text)
+
+
+def hit_chance(attack_bonus, armor_class, advantage=0):
+    """Return (P(hit), P(critical hit)) for a d20 attack; a 1 always misses and a 20 always hits and crits.
+
+    advantage is 1 for advantage, -1 for disadvantage and 0 for a straight roll.
+    """
+    need = min(20, max(2, armor_class - attack_bonus))
+    p_single_hit = (21 - need) / 20
+    p_single_crit = 1 / 20
+    if advantage > 0:
+        return 1 - (1 - p_single_hit) ** 2, 1 - (1 - p_single_crit) ** 2
+    if advantage < 0:
+        return p_single_hit ** 2, p_single_crit ** 2
+    return p_single_hit, p_single_crit
+
+
+def attack_summary(attack_bonus, damage, armor_class, advantage=0):
+    """Return hit chance, crit chance and expected damage per attack against an armour class.
+
+    damage is a dice string or an already parsed DiceExpression.
+    """
+    expression = parse(damage) if isinstance(damage, str) else damage
+    p_hit, p_crit = hit_chance(attack_bonus, armor_class, advantage)
+    normal = max(0.0, expression.distribution().mean())
+    critical = max(0.0, expression.distribution(crit=True).mean())
+    return {
+        "hit": p_hit,
+        "crit": p_crit,
+        "average_damage": normal,
+        "expected_damage": (p_hit - p_crit) * normal + p_crit * critical,
+    }
+
+
+def parse_damage(text):
+    """Split a damage string such as '1d6 + 2 piercing' into (DiceExpression, damage type)."""
+    match = DAMAGE_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"could not find dice in damage '{text}'")
+    return parse(match.group(1).replace(" ", "")), match.group(2).strip()
+
+
+def parse_attack(line):
+    """Split an attacks line such as '- Elven Longbow +6 1d8+4 piercing' into (name, bonus, damage, type)."""
+    match = ATTACK_PATTERN.match(line)
+    if match is None:
+        return None
+    name, bonus, damage, damage_type = match.groups()
+    return name, int(bonus), damage.replace(" ", ""), damage_type
+
+
+def run_benchmark(expressions=("1d20", "4d6kh3", "2d20kl1+5", "8d6", "3d6!", "2d6r2+3", "20d10kh10"),
+                  rolls=1_000_000):
+    """Time exact distributions and vectorized bulk rolls, and check the rolled mean against the exact one."""
+    import random
+    import time
+
+    rng = np.random.default_rng(7)
+    print(f"{'expression':>12} {'exact ms':>9} {'cached us':>10} {'mean':>8} {'rolled mean':>12} "
+          f"{'numpy rolls/s':>14} {'randint rolls/s':>16}")
+    for text in expressions:
+        expression = DiceExpression(text)
+        parse.cache_clear()
+        die_distribution.cache_clear()
+        keep_distribution.cache_clear()
+        _sum_distribution.cache_clear()
+        start = time.perf_counter()
+        mean = parse(text).distribution().mean()
+        exact_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        parse(text).distribution()
+        cached_us = (time.perf_counter() - start) * 1e6
+
+        start = time.perf_counter()
+        totals = expression.roll_many(rolls, rng)
+        numpy_rate = rolls / (time.perf_counter() - start)
+
+        loop_rolls = 20000
+        start = time.perf_counter()
+        for _ in range(loop_rolls):
+            total = 0
+            for sign, term in expression.terms:
+                if isinstance(term, int):
+                    total += sign * term
+                    continue
+                faces = [random.randint(1, term.sides) for _ in range(term.count)]
+                total += sign * sum(faces)
+        loop_rate = loop_rolls / (time.perf_counter() - start)
+        print(f"{text:>12} {exact_ms:>9.2f} {cached_us:>10.1f} {mean:>8.3f} {totals.mean():>12.3f} "
+              f"{numpy_rate:>14,.0f} {loop_rate:>16,.0f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
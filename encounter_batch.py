@@ -0,0 +1,175 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from encounter_json import GENERATED_DIR, EncounterPipeline, save_encounter
+from monster_library import MonsterLibrary
+
+MAX_BATCH_SIZE = 50
+MAX_BATCH_WORKERS = 4  # generation requests in flight at once for one batch
+NAME_ATTEMPTS = 2  # generations per creature before a duplicate name gets a numeric suffix
+BATCH_PROMPT = ("{request}\n\nThis is creature {index} of {count} in a batch. Describe one individual with "
+                "quantity 1 and a unique creature_name.{avoid}")
+AVOID_NAMES = " Do not use any of these names: {names}."
+AVOID_LIMIT = 30  # names listed in the prompt, to keep it short
+
+
+def name_key(name):
+    """Normalize a creature name for duplicate detection."""
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+class EncounterBatch:
+    def __init__(self, request, count, send, pipeline=None, max_workers=MAX_BATCH_WORKERS,
+                 directory=GENERATED_DIR, library=None):
+        """Generate count distinct creatures for one request with a bounded pool of workers.
+
+        send(prompt) returns a monster_generator_json reply. Each reply goes through the encounter
+        pipeline, names are kept unique across the batch and the files already in directory, and
+        every file is written atomically. Existing names come from library, a MonsterLibrary over
+        directory, which only re-reads files changed since its last scan; without one, a throwaway
+        in-memory index is built.
+        """
+        self.request = request
+        self.count = max(1, min(int(count), MAX_BATCH_SIZE))
+        self.send = send
+        self.pipeline = pipeline or EncounterPipeline()
+        self.max_workers = max_workers
+        self.directory = directory
+        if library is None:
+            library = MonsterLibrary(directory, ":memory:")
+        self.taken = {name_key(name) for name in library.creature_names()}
+        self.names = []  # display names saved by this batch, used to steer later prompts
+        self.saved = []
+        self.errors = []
+        self.renamed = 0
+        self.started_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def _prompt(self, index):
+        with self.lock:
+            recent = self.names[-AVOID_LIMIT:]
+        avoid = AVOID_NAMES.format(names=", ".join(recent)) if recent else ""
+        return BATCH_PROMPT.format(request=self.request, index=index + 1, count=self.count, avoid=avoid)
+
+    def _claim(self, data, force):
+        """Reserve the creature's name, adding a numeric suffix when force is set; return False on a duplicate."""
+        name = data["creature_name"].strip()
+        with self.lock:
+            key = name_key(name)
+            if key in self.taken:
+                if not force:
+                    return False
+                suffix = 2
+                while name_key(f"{name} {suffix}") in self.taken:
+                    suffix += 1
+                name = f"{name} {suffix}"
+                key = name_key(name)
+                self.renamed += 1
+            self.taken.add(key)
+            self.names.append(name)
+        data["creature_name"] = name
+        return True
+
+    def _generate(self, index):
+        errors = []
+        for attempt in range(NAME_ATTEMPTS):
+            reply = self.send(self._prompt(index))
+            data, errors = self.pipeline.process(reply, reask=lambda message: self.send(f"{message}\n\n{reply}"))
+            if errors:
+                continue
+            if self._claim(data, force=attempt == NAME_ATTEMPTS - 1):
+                path = save_encounter(data, self.directory)
+                with self.lock:
+                    self.saved.append(path)
+                return
+            errors = [f"duplicate name '{data['creature_name']}'"]
+        with self.lock:
+            self.errors.append(f"creature {index + 1}: " + "; ".join(errors))
+
+    def _safe_generate(self, index):
+        try:
+            self._generate(index)
+        except Exception as e:
+            with self.lock:
+                self.errors.append(f"creature {index + 1}: {e}")
+
+    def run(self):
+        """Generate the whole batch, blocking until every creature is saved or has failed."""
+        self.started_at = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(self._safe_generate, range(self.count)))
+        self.finished_at = time.monotonic()
+        progress = self.progress()
+        print(f"Batch '{self.request}': {progress['saved']}/{self.count} saved, {progress['failed']} failed, "
+              f"{progress['per_minute']} creatures/min")
+        return self.saved
+
+    def start(self):
+        """Run the batch on a background thread."""
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def progress(self):
+        """Return counts of saved and failed creatures, elapsed time and throughput in creatures per minute."""
+        with self.lock:
+            saved, failed = len(self.saved), len(self.errors)
+            errors = list(self.errors)
+            paths = list(self.saved)
+        if self.started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return {
+            "count": self.count,
+            "saved": saved,
+            "failed": failed,
+            "renamed": self.renamed,
+            "done": self.finished_at is not None,
+            "elapsed": round(elapsed, 1),
+            "per_minute": round(saved * 60 / elapsed, 1) if elapsed and saved else 0.0,
+            "paths": paths,
+            "errors": errors,
+        }
+
+
+def run_benchmark(count=20, latency=0.3, worker_counts=(1, 2, 4, 8)):
+    """Print creatures per minute for a batch against a fake backend with a fixed reply latency."""
+    import itertools
+    import shutil
+    import tempfile
+
+    names = itertools.cycle(["Grukk", "Snaga", "Ugluk", "Bolg", "Azog", "Lurtz", "Gorbag"])
+    names_lock = threading.Lock()
+
+    def send(prompt):
+        time.sleep(latency)
+        with names_lock:
+            name = next(names)
+        return "```json\n" + json.dumps({
+            "creature_type": "orc", "creature_name": name, "quantity": 1, "challenge_rating": "1/2",
+            "target_player_level": 2,
+            "stats": {"hit_points": 15, "armor_class": 13, "attack_bonus": 5, "damage": "1d12 + 3 slashing"},
+            "loot": [{"name": "Greataxe", "value": 30}],
+        }) + "\n```"
+
+    print(f"{count} creatures, backend latency {latency * 1000:.0f} ms")
+    print(f"{'workers':>7} {'saved':>6} {'renamed':>8} {'wall s':>7} {'per min':>8}")
+    for workers in worker_counts:
+        directory = tempfile.mkdtemp()
+        try:
+            batch = EncounterBatch("orcs for the war camp", count, send, max_workers=workers, directory=directory)
+            batch.run()
+            progress = batch.progress()
+            if len(os.listdir(directory)) != progress["saved"]:
+                raise AssertionError("a duplicate name overwrote another creature's file")
+            print(f"{workers:>7} {progress['saved']:>6} {progress['renamed']:>8} {progress['elapsed']:>7} "
+                  f"{progress['per_minute']:>8}")
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,266 @@
+import json
+import os
+import re
+import threading
+from atomic_file import write_json_atomic
+
+FENCE_PATTERN = re.compile(r"```[ \t]*(?:json)?[ \t]*\n?(.*?)(?:```|\Z)", re.DOTALL | re.IGNORECASE)
+SCALAR_DELIMITERS = set(",:]}") | set(" \t\r\n")
+GENERATED_DIR = "generated_characters"
+REASK_PROMPT = ("Your previous encounter JSON could not be used because: {errors}. "
+                "Return only the corrected JSON object with every required field, no extra text and no markdown.")
+
+
+def extract_json_text(text):
+    """Return the JSON object text from an LLM reply, preferring a ```json fenced block, or None if there is none.
+
+    An unterminated fence (a truncated reply) still counts, so the repair step can close the object.
+    """
+    for match in FENCE_PATTERN.finditer(text):
+        block = match.group(1).strip()
+        if block.startswith("{"):
+            return block
+    start = text.find("{")
+    if start == -1:
+        return None
+    return text[start:].strip()
+
+
+def _closers(stack):
+    return "".join("}" if kind == "{" else "]" for kind, _ in reversed(stack))
+
+
+def repair_json(text):
+    """Parse JSON text in one pass, dropping trailing commas and closing a truncated object at the last complete value.
+
+    Returns (data, repaired) where repaired is True if the text was not valid JSON as given.
+    """
+    try:
+        return json.loads(text), False
+    except ValueError:
+        pass
+
+    out = []
+    length = 0
+    stack = []  # [kind, state]; objects move key -> colon -> value -> after, arrays value -> after
+    checkpoints = [(0, "")]  # (output length, closers) where the output can be cut and closed
+    complete = False
+    i, n = 0, len(text)
+
+    def emit(chunk):
+        nonlocal length
+        out.append(chunk)
+        length += len(chunk)
+
+    def value_done():
+        nonlocal complete
+        if stack:
+            stack[-1][1] = "after"
+            checkpoints.append((length, _closers(stack)))
+        else:
+            complete = True
+
+    while i < n and not complete:
+        c = text[i]
+        if c == '"':
+            j, escaped = i + 1, False
+            while j < n:
+                if escaped:
+                    escaped = False
+                elif text[j] == "\\":
+                    escaped = True
+                elif text[j] == '"':
+                    break
+                j += 1
+            if j >= n:
+                # Truncated inside a string: a value can be closed where it stopped, a key cannot be used
+                if stack and stack[-1][1] == "value":
+                    emit(text[i:n].rstrip("\\") + '"')
+                    value_done()
+                break
+            emit(text[i:j + 1])
+            if stack and stack[-1][0] == "{" and stack[-1][1] == "key":
+                stack[-1][1] = "colon"
+            else:
+                value_done()
+            i = j + 1
+        elif c in "{[":
+            emit(c)
+            stack.append([c, "key" if c == "{" else "value"])
+            checkpoints.append((length, _closers(stack)))
+            i += 1
+        elif c in "}]":
+            while out and (out[-1].isspace() or out[-1] == ","):
+                length -= len(out.pop())
+            if not stack:
+                break
+            emit("}" if stack[-1][0] == "{" else "]")
+            stack.pop()
+            value_done()
+            i += 1
+        elif c == ",":
+            emit(c)
+            if stack:
+                stack[-1][1] = "key" if stack[-1][0] == "{" else "value"
+            i += 1
+        elif c == ":":
+            emit(c)
+            if stack:
+                stack[-1][1] = "value"
+            i += 1
+        elif c.isspace():
+            emit(c)
+            i += 1
+        else:
+            j = i
+            while j < n and text[j] not in SCALAR_DELIMITERS:
+                j += 1
+            if j >= n:
+                break  # A scalar cut off at the end may be incomplete (e.g. "tru" or "12.")
+            emit(text[i:j])
+            value_done()
+            i = j
+
+    repaired = "".join(out)
+    if not complete:
+        cut, closers = checkpoints[-1]
+        repaired = repaired[:cut].rstrip().rstrip(",") + closers
+    return json.loads(repaired), True
+
+
+def _coerce_int(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and re.fullmatch(r"\s*[+-]?\d+\s*", value):
+        return int(value)
+    return None
+
+
+def validate_encounter(data):
+    """Check and normalize an encounter dict in place; return a list of problems (empty when valid)."""
+    if not isinstance(data, dict):
+        return ["the reply is not a JSON object"]
+    errors = []
+    for field in ("creature_type", "creature_name"):
+        if not isinstance(data.get(field), str) or not data.get(field).strip():
+            errors.append(f"'{field}' must be a non-empty string")
+    for field in ("quantity", "target_player_level"):
+        value = _coerce_int(data.get(field))
+        if value is None or value < 1:
+            errors.append(f"'{field}' must be a positive integer")
+        else:
+            data[field] = value
+    rating = data.get("challenge_rating")
+    if isinstance(rating, bool) or not (isinstance(rating, (int, float)) or
+                                        (isinstance(rating, str) and re.fullmatch(r"\d+(/\d+)?", rating.strip()))):
+        errors.append("'challenge_rating' must be a number or a fraction such as '1/4'")
+
+    stats = data.get("stats")
+    if not isinstance(stats, dict):
+        errors.append("'stats' must be an object")
+    else:
+        for field in ("hit_points", "armor_class", "attack_bonus"):
+            value = _coerce_int(stats.get(field))
+            if value is None:
+                errors.append(f"'stats.{field}' must be an integer")
+            else:
+                stats[field] = value
+        if not isinstance(stats.get("damage"), str) or not stats.get("damage").strip():
+            errors.append("'stats.damage' must be a damage string such as '1d6 + 2 piercing'")
+
+    loot = data.get("loot")
+    if not isinstance(loot, list):
+        errors.append("'loot' must be an array")
+    else:
+        for index, item in enumerate(loot):
+            if not isinstance(item, dict) or not isinstance(item.get("name"), str):
+                errors.append(f"'loot[{index}]' must be an object with a 'name'")
+            elif "value" not in item and not isinstance(item.get("rarity"), str):
+                errors.append(f"'loot[{index}]' needs a 'value' or a 'rarity'")
+    return errors
+
+
+def _legacy_parse_ok(text):
+    """Whether the old strip-the-fences-and-json.loads approach would have parsed this reply."""
+    try:
+        json.loads(text.strip('```json').strip('```'))
+        return True
+    except ValueError:
+        return False
+
+
+def encounter_filename(data):
+    """Build the '{race}_{level}_{name}.json' filename used in generated_characters."""
+    race = re.sub(r"[^a-z0-9_]", "", data["creature_type"].lower().replace(" ", "_"))
+    name = re.sub(r"[^a-z0-9_]", "", data["creature_name"].lower().replace(" ", "_"))
+    return f"{race}_{data['target_player_level']}_{name}.json"
+
+
+def save_encounter(data, directory=GENERATED_DIR):
+    """Atomically write a validated encounter to the generated characters directory and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, encounter_filename(data))
+    write_json_atomic(path, data)
+    return path
+
+
+class EncounterPipeline:
+    def __init__(self):
+        """Extract, repair and validate monster_generator_json replies, re-asking the LLM at most once."""
+        self.clean = 0
+        self.repaired = 0
+        self.reasked = 0
+        self.failed = 0
+        self.llm_calls_saved = 0
+        self.lock = threading.Lock()
+
+    def _count(self, field, saved=False):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+            if saved:
+                self.llm_calls_saved += 1
+
+    def parse(self, response):
+        """Return (data, errors, repaired) for one reply without contacting the LLM."""
+        text = extract_json_text(response)
+        if text is None:
+            return None, ["the reply contains no JSON object"], False
+        try:
+            data, repaired = repair_json(text)
+        except ValueError as e:
+            return None, [f"the JSON could not be parsed ({e})"], True
+        return data, validate_encounter(data), repaired
+
+    def process(self, response, reask=None):
+        """Return (data, errors) for a reply; on failure call reask(message) once for a corrected reply.
+
+        A reply that the old strip-and-load approach could not have used, but that is recovered here
+        without a re-ask, counts as a saved LLM call.
+        """
+        data, errors, repaired = self.parse(response)
+        if not errors:
+            saved = repaired or not _legacy_parse_ok(response)
+            self._count("repaired" if saved else "clean", saved=saved)
+            return data, []
+        if reask is not None:
+            self._count("reasked")
+            data, errors, _ = self.parse(reask(REASK_PROMPT.format(errors="; ".join(errors))))
+            if not errors:
+                return data, []
+        self._count("failed")
+        return None, errors
+
+    def stats(self):
+        """Return counts of clean, repaired, re-asked and failed replies and the LLM calls saved."""
+        with self.lock:
+            return {
+                "clean": self.clean,
+                "repaired": self.repaired,
+                "reasked": self.reasked,
+                "failed": self.failed,
+                "llm_calls_saved": self.llm_calls_saved,
+            }
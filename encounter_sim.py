@@ -0,0 +1,284 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from dice import parse, parse_damage, parse_attack, attack_summary
+
+PARTY_DIR = "characters"
+DEFAULT_FIGHTS = 20000
+MAX_ROUNDS = 50  # fights still running after this many rounds count as neither a win nor a loss
+
+
+def load_party(directory=PARTY_DIR):
+    """Load every character sheet in directory, skipping files that are not valid JSON."""
+    party = []
+    if not os.path.isdir(directory):
+        return party
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                party.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Skipping character {name}: {e}")
+    return party
+
+
+def _int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def party_combatants(characters, target_ac):
+    """Turn character sheets into combatants that each use their best attack against target_ac.
+
+    Characters with no attack that parses still take part as targets but deal no damage.
+    """
+    combatants = []
+    for character in characters:
+        hp = _int(character.get("hp_current")) or _int(character.get("hp_max"))
+        if hp <= 0:
+            continue
+        best = None
+        for line in (character.get("attacks") or "").splitlines():
+            attack = parse_attack(line)
+            if attack is None:
+                continue
+            _, bonus, damage, _ = attack
+            try:
+                expected = attack_summary(bonus, damage, target_ac)["expected_damage"]
+            except ValueError:
+                continue
+            if best is None or expected > best[0]:
+                best = (expected, bonus, damage)
+        combatants.append({
+            "name": character.get("name", "character"),
+            "hp": hp,
+            "ac": _int(character.get("armor_class"), 10),
+            "attack_bonus": best[1] if best else 0,
+            "damage": best[2] if best else None,
+        })
+    return combatants
+
+
+def encounter_combatants(encounter):
+    """Turn a generated encounter into one combatant per creature in its quantity."""
+    stats = encounter["stats"]
+    damage = parse_damage(stats["damage"])[0].text
+    creature = {
+        "name": encounter.get("creature_name", "creature"),
+        "hp": _int(stats["hit_points"], 1),
+        "ac": _int(stats["armor_class"], 10),
+        "attack_bonus": _int(stats["attack_bonus"]),
+        "damage": damage,
+    }
+    return [dict(creature) for _ in range(max(1, _int(encounter.get("quantity"), 1)))]
+
+
+def _attack(attackers, attacker_hp, targets, target_hp, targets_left, acting, rng):
+    """Each living attacker in the fights selected by acting hits the weakest living target once.
+
+    Works on whole arrays of fights at once; target_hp and targets_left are updated in place.
+    """
+    target_ac = np.array([target["ac"] for target in targets])
+    for index, attacker in enumerate(attackers):
+        if attacker["damage"] is None:
+            continue
+        fights = np.nonzero(acting & (attacker_hp[:, index] > 0) & (targets_left > 0))[0]
+        if not len(fights):
+            continue
+        hp = target_hp[fights]
+        target = np.where(hp > 0, hp, np.iinfo(hp.dtype).max).argmin(axis=1)
+        d20 = rng.integers(1, 21, size=len(fights))
+        crit = d20 == 20
+        hit = crit | ((d20 != 1) & (d20 + attacker["attack_bonus"] >= target_ac[target]))
+        damage = parse(attacker["damage"]).roll_many(len(fights), rng, crit=crit)
+        remaining = hp[np.arange(len(fights)), target] - np.where(hit, np.maximum(damage, 0), 0)
+        target_hp[fights, target] = remaining
+        targets_left[fights] -= remaining <= 0
+
+
+def simulate_fights(party, monsters, fights, seed=None):
+    """Run fights side-initiative battles at once and return summed results, to be merged across workers.
+
+    Each round both sides roll a d20 for who acts first (the party wins ties), then every living
+    creature attacks the living enemy with the fewest hit points. Creatures at 0 HP are out.
+    Finished fights are tallied and dropped from the arrays at the end of each round, so later
+    rounds only pay for the fights still going.
+    """
+    rng = np.random.default_rng(seed)
+    party_start = np.array([member["hp"] for member in party], dtype=np.int64)
+    party_hp = np.tile(party_start, (fights, 1))
+    monster_hp = np.tile(np.array([monster["hp"] for monster in monsters], dtype=np.int64), (fights, 1))
+    party_left = np.full(fights, len(party), dtype=np.int64)
+    monsters_left = np.full(fights, len(monsters), dtype=np.int64)
+    totals = {"fights": fights, "won": 0, "finished": 0, "rounds": 0, "hp_lost": 0, "downed": 0, "monsters_killed": 0}
+
+    def tally(selected, round_number=None):
+        if round_number is not None:
+            totals["won"] += int((party_left[selected] > 0).sum())
+            totals["finished"] += int(selected.sum())
+            totals["rounds"] += round_number * int(selected.sum())
+        totals["hp_lost"] += int((party_start - np.maximum(party_hp[selected], 0)).sum())
+        totals["downed"] += int(len(party) * selected.sum() - party_left[selected].sum())
+        totals["monsters_killed"] += int(len(monsters) * selected.sum() - monsters_left[selected].sum())
+
+    for round_number in range(1, MAX_ROUNDS + 1):
+        if not len(party_hp):
+            break
+        party_first = rng.integers(1, 21, size=len(party_hp)) >= rng.integers(1, 21, size=len(party_hp))
+        _attack(party, party_hp, monsters, monster_hp, monsters_left, party_first, rng)
+        _attack(monsters, monster_hp, party, party_hp, party_left, monsters_left > 0, rng)
+        _attack(party, party_hp, monsters, monster_hp, monsters_left, ~party_first, rng)
+        finished = (party_left == 0) | (monsters_left == 0)
+        if finished.any():
+            tally(finished, round_number)
+            running = ~finished
+            party_hp, monster_hp = party_hp[running], monster_hp[running]
+            party_left, monsters_left = party_left[running], monsters_left[running]
+    tally(np.ones(len(party_hp), dtype=bool))  # fights that hit MAX_ROUNDS
+    return totals
+
+
+def _simulate_chunk(args):
+    return simulate_fights(*args)
+
+
+def simulate(party, monsters, fights=DEFAULT_FIGHTS, workers=1, seed=None):
+    """Estimate how a party of combatants fares against monsters over many simulated fights.
+
+    With workers > 1 the fights are split across a process pool, each with an independent seed.
+    Returns win probability, expected rounds of finished fights, and the expected party HP lost
+    and characters dropped to 0 HP.
+    """
+    if not party or not monsters:
+        raise ValueError("both the party and the encounter need at least one creature")
+    if workers > 1:
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        chunks = [(party, monsters, fights // workers + (i < fights % workers), seeds[i]) for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_simulate_chunk, chunks))
+    else:
+        parts = [simulate_fights(party, monsters, fights, seed)]
+    totals = {key: sum(part[key] for part in parts) for key in parts[0]}
+    party_hp = sum(member["hp"] for member in party)
+    return {
+        "fights": totals["fights"],
+        "win": totals["won"] / totals["fights"],
+        "rounds": totals["rounds"] / totals["finished"] if totals["finished"] else float(MAX_ROUNDS),
+        "hp_lost": totals["hp_lost"] / totals["fights"],
+        "hp_lost_fraction": totals["hp_lost"] / totals["fights"] / party_hp,
+        "downed": totals["downed"] / totals["fights"],
+        "monsters_killed": totals["monsters_killed"] / totals["fights"],
+    }
+
+
+def difficulty(result):
+    """Label a simulation result: deadly below 75% wins, hard below 95% or losing half the party's HP,
+    medium when losing a quarter, otherwise easy."""
+    if result["win"] < 0.75:
+        return "deadly"
+    if result["win"] < 0.95 or result["hp_lost_fraction"] >= 0.5:
+        return "hard"
+    if result["hp_lost_fraction"] >= 0.25:
+        return "medium"
+    return "easy"
+
+
+def simulate_encounter(encounter, characters, fights=DEFAULT_FIGHTS, workers=1, seed=None):
+    """Simulate a generated encounter against character sheets; returns the result with its difficulty."""
+    monsters = encounter_combatants(encounter)
+    party = party_combatants(characters, monsters[0]["ac"])
+    result = simulate(party, monsters, fights, workers, seed)
+    result["difficulty"] = difficulty(result)
+    return result
+
+
+def describe(result, encounter=None):
+    """One-line summary of a simulation result for the chat panel."""
+    claimed = f", claimed CR {encounter['challenge_rating']}" if encounter and "challenge_rating" in encounter else ""
+    return (f"Simulated {result['fights']:,} fights vs the party: {result['difficulty']}{claimed} · "
+            f"{result['win']:.0%} party wins, {result['rounds']:.1f} rounds, "
+            f"{result['hp_lost']:.1f} HP lost ({result['hp_lost_fraction']:.0%}), "
+            f"{result['downed']:.2f} characters down")
+
+
+def run_benchmark(fight_counts=(1000, 20000, 100000), party_size=4, monster_count=6):
+    """Time vectorized fights (one process and a pool) against simulating one fight at a time in Python."""
+    import random
+    import time
+
+    party = [{"name": f"hero {i}", "hp": 28, "ac": 15, "attack_bonus": 5, "damage": "1d8+3"}
+             for i in range(party_size)]
+    monsters = [{"name": f"goblin {i}", "hp": 15, "ac": 12, "attack_bonus": 4, "damage": "1d6+2"}
+                for i in range(monster_count)]
+
+    def python_fight(rng):
+        party_hp = [member["hp"] for member in party]
+        monster_hp = [monster["hp"] for monster in monsters]
+
+        def side(attackers, attacker_hp, targets, target_hp):
+            for index, attacker in enumerate(attackers):
+                living = [i for i, hp in enumerate(target_hp) if hp > 0]
+                if attacker_hp[index] <= 0 or not living:
+                    continue
+                target = min(living, key=lambda i: target_hp[i])
+                d20 = rng.randint(1, 20)
+                if d20 == 20 or (d20 != 1 and d20 + attacker["attack_bonus"] >= targets[target]["ac"]):
+                    damage = 0
+                    for sign, term in parse(attacker["damage"]).terms:
+                        if isinstance(term, int):
+                            damage += sign * term
+                        else:
+                            rolled = term.count * (2 if d20 == 20 else 1)
+                            damage += sign * sum(rng.randint(1, term.sides) for _ in range(rolled))
+                    target_hp[target] -= max(damage, 0)
+
+        for round_number in range(1, MAX_ROUNDS + 1):
+            party_first = rng.randint(1, 20) >= rng.randint(1, 20)
+            if party_first:
+                side(party, party_hp, monsters, monster_hp)
+            side(monsters, monster_hp, party, party_hp)
+            if not party_first:
+                side(party, party_hp, monsters, monster_hp)
+            if not any(hp > 0 for hp in party_hp) or not any(hp > 0 for hp in monster_hp):
+                return any(hp > 0 for hp in party_hp), round_number
+        return False, MAX_ROUNDS
+
+    workers = os.cpu_count() or 1
+    print(f"{party_size} heroes vs {monster_count} goblins, {workers} cores")
+    print(f"{'fights':>8} {'numpy ms':>9} {f'pool x{workers} ms':>13} {'python ms':>10} {'win':>6} {'rounds':>7}")
+    for fights in fight_counts:
+        start = time.perf_counter()
+        result = simulate(party, monsters, fights, seed=7)
+        numpy_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        simulate(party, monsters, fights, workers=workers, seed=7)
+        pool_ms = (time.perf_counter() - start) * 1000
+        python_fights = min(fights, 2000)
+        rng = random.Random(7)
+        start = time.perf_counter()
+        for _ in range(python_fights):
+            python_fight(rng)
+        python_ms = (time.perf_counter() - start) * 1000 * fights / python_fights
+        print(f"{fights:>8} {numpy_ms:>9.1f} {pool_ms:>13.1f} {python_ms:>10.1f} {result['win']:>6.1%} "
+              f"{result['rounds']:>7.2f}")
+
+    characters = load_party()
+    generated = "generated_characters"
+    if characters and os.path.isdir(generated):
+        for name in sorted(os.listdir(generated))[:5]:
+            if name.endswith(".json"):
+                with open(os.path.join(generated, name), "r", encoding="utf-8") as f:
+                    encounter = json.load(f)
+                try:
+                    print(f"{name}: {describe(simulate_encounter(encounter, characters, seed=7), encounter)}")
+                except (KeyError, ValueError) as e:
+                    print(f"{name}: not simulated ({e})")
+
+
+if __name__ == "__main__":
+    run_benchmark()
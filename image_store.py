@@ -0,0 +1,260 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+
+DEFAULT_IMAGE_DIR = os.path.join("characters", "images")
+URL_PREFIX = "/characters/images/"
+THUMBNAIL_SIZES = (128, 512)  # longest side in pixels
+THUMBNAIL_FORMATS = {"webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+                     "jpeg": ("JPEG", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True})}
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+DIGEST_PATTERN = re.compile(r"^([0-9a-f]{64})(?:/(\d+))?$")
+SIGNATURES = [(b"\xff\xd8\xff", "jpeg", "image/jpeg"), (b"\x89PNG\r\n\x1a\n", "png", "image/png"),
+              (b"GIF87a", "gif", "image/gif"), (b"GIF89a", "gif", "image/gif")]
+
+
+def sniff_image_type(head):
+    """Return (extension, mime type) for the first bytes of a supported image, or None."""
+    for signature, ext, mime in SIGNATURES:
+        if head.startswith(signature):
+            return ext, mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp", "image/webp"
+    return None
+
+
+class ImageStore:
+    def __init__(self, directory=DEFAULT_IMAGE_DIR, sizes=THUMBNAIL_SIZES, workers=1):
+        """Content-addressed image store: each image is kept once under the SHA-256 of its bytes.
+
+        Uploads are streamed to a temp file while being hashed, so they are never held in memory,
+        and an image already stored is not written again. Resized WebP and JPEG thumbnails are made
+        by a background worker; a thumbnail requested before the worker reaches it is made on the spot.
+        """
+        self.directory = os.path.abspath(directory)  # send_file resolves relative paths against the app root
+        self.originals = os.path.join(self.directory, "originals")
+        self.thumbnails = os.path.join(self.directory, "thumbnails")
+        self.sizes = tuple(sizes)
+        os.makedirs(self.originals, exist_ok=True)
+        os.makedirs(self.thumbnails, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self.pending = {}  # digest -> future of its thumbnail job
+        self.imported = {}  # legacy path -> (mtime_ns, size, digest)
+        self.lock = threading.Lock()
+
+    def _original(self, digest):
+        """Return (path, mime type) of a stored original, or None."""
+        for ext, mime in [(ext, mime) for _, ext, mime in SIGNATURES] + [("webp", "image/webp")]:
+            path = os.path.join(self.originals, f"{digest}.{ext}")
+            if os.path.exists(path):
+                return path, mime
+        return None
+
+    def has(self, digest):
+        return self._original(digest) is not None
+
+    def owns(self, url):
+        """True if url is the address of an original image in this store, as saved in a character's image_path."""
+        if not isinstance(url, str) or not url.startswith(URL_PREFIX):
+            return False
+        match = DIGEST_PATTERN.match(url[len(URL_PREFIX):])
+        return match is not None and match.group(2) is None and self.has(match.group(1))
+
+    def store_stream(self, stream, max_bytes=MAX_UPLOAD_BYTES):
+        """Copy an image from a file-like stream into the store and return its digest.
+
+        Raises ValueError for data that is not a supported image or is larger than max_bytes.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        image_type = None
+        fd, tmp_path = tempfile.mkstemp(dir=self.originals, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if image_type is None:
+                        image_type = sniff_image_type(chunk[:16])
+                        if image_type is None:
+                            raise ValueError("not a JPEG, PNG, GIF or WebP image")
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"image is larger than {max_bytes // (1024 * 1024)} MB")
+                    digest.update(chunk)
+                    f.write(chunk)
+            if image_type is None:
+                raise ValueError("empty upload")
+            try:
+                with Image.open(tmp_path) as image:
+                    image.verify()
+            except Exception as e:
+                raise ValueError(f"the image could not be read: {e}")
+            digest = digest.hexdigest()
+            final_path = os.path.join(self.originals, f"{digest}.{image_type[0]}")
+            if os.path.exists(final_path):
+                os.remove(tmp_path)  # the same image is already stored
+            else:
+                os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.schedule_thumbnails(digest)
+        return digest
+
+    def import_file(self, path):
+        """Add an existing image file to the store, once per version of the file, and return its digest."""
+        stat = os.stat(path)
+        cached = self.imported.get(path)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = self.store_stream(f)
+        self.imported[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def schedule_thumbnails(self, digest):
+        """Queue thumbnail generation for every size and format unless they already exist."""
+        with self.lock:
+            future = self.pending.get(digest)
+            if future is not None and not future.done():
+                return future
+            if all(os.path.exists(self._thumbnail_path(digest, size, fmt))
+                   for size in self.sizes for fmt in THUMBNAIL_FORMATS):
+                return None
+            future = self.executor.submit(self._make_thumbnails, digest)
+            self.pending[digest] = future
+            return future
+
+    def _thumbnail_path(self, digest, size, fmt):
+        return os.path.join(self.thumbnails, f"{digest}-{size}.{fmt}")
+
+    def _make_thumbnails(self, digest):
+        try:
+            for size in self.sizes:
+                for fmt in THUMBNAIL_FORMATS:
+                    self._make_thumbnail(digest, size, fmt)
+        finally:
+            with self.lock:
+                self.pending.pop(digest, None)
+
+    def _make_thumbnail(self, digest, size, fmt):
+        path = self._thumbnail_path(digest, size, fmt)
+        if os.path.exists(path):
+            return path
+        original = self._original(digest)
+        if original is None:
+            raise FileNotFoundError(digest)
+        pil_format, _, options = THUMBNAIL_FORMATS[fmt]
+        with Image.open(original[0]) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            # JPEG has no alpha channel; WebP keeps transparency
+            keep_alpha = fmt == "webp" and ("A" in image.getbands() or "transparency" in image.info)
+            if image.mode != ("RGBA" if keep_alpha else "RGB"):
+                image = image.convert("RGBA" if keep_alpha else "RGB")
+            fd, tmp_path = tempfile.mkstemp(dir=self.thumbnails, prefix=".thumb-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    image.save(f, pil_format, **options)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return path
+
+    def thumbnail(self, digest, size, fmt="webp"):
+        """Return the path of a thumbnail, waiting for or doing the work if it is not ready yet."""
+        if size not in self.sizes or fmt not in THUMBNAIL_FORMATS:
+            raise ValueError(f"no {fmt} thumbnail of size {size}")
+        path = self._thumbnail_path(digest, size, fmt)
+        if os.path.exists(path):
+            return path
+        with self.lock:
+            future = self.pending.get(digest)
+        if future is not None:
+            future.result()
+            if os.path.exists(path):
+                return path
+        return self._make_thumbnail(digest, size, fmt)
+
+    def resolve(self, name, accept_webp=True):
+        """Map a name under URL_PREFIX ('<digest>' or '<digest>/<size>') to (path, mime type, etag), or None."""
+        match = DIGEST_PATTERN.match(name)
+        if match is None:
+            return None
+        digest, size = match.group(1), match.group(2)
+        if size is None:
+            original = self._original(digest)
+            return (original[0], original[1], digest) if original else None
+        if not self.has(digest):
+            return None
+        fmt = "webp" if accept_webp else "jpeg"
+        return self.thumbnail(digest, int(size), fmt), THUMBNAIL_FORMATS[fmt][1], f"{digest}-{size}-{fmt}"
+
+    def display_url(self, image_path, size, legacy_dir=None):
+        """Thumbnail URL for a character's image_path, importing a legacy '/characters/images/<file>' first."""
+        if not image_path or not image_path.startswith(URL_PREFIX):
+            return image_path
+        name = image_path[len(URL_PREFIX):]
+        match = DIGEST_PATTERN.match(name)
+        if match:
+            digest = match.group(1)
+        else:
+            legacy_path = os.path.join(legacy_dir or self.directory, os.path.basename(name))
+            try:
+                digest = self.import_file(legacy_path)
+            except (OSError, ValueError):
+                return image_path  # served as it is
+        return f"{URL_PREFIX}{digest}/{size}"
+
+
+def image_url(digest):
+    return f"{URL_PREFIX}{digest}"
+
+
+def run_benchmark(path=os.path.join(DEFAULT_IMAGE_DIR, "Freyaelin Elensar.jpeg"), repeats=5):
+    """Time storing a portrait (first upload and duplicate) and its thumbnails, and compare the bytes served."""
+    import io
+    import time
+
+    if not os.path.exists(path):
+        image = Image.new("RGB", (1200, 1600), (90, 60, 40))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=92)
+        data = buffer.getvalue()
+    else:
+        with open(path, "rb") as f:
+            data = f.read()
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ImageStore(tmp)
+        start = time.perf_counter()
+        digest = store.store_stream(io.BytesIO(data))
+        first_ms = (time.perf_counter() - start) * 1000
+        with store.lock:
+            future = store.pending.get(digest)
+        if future is not None:
+            future.result()
+        thumbnails_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        for _ in range(repeats):
+            store.store_stream(io.BytesIO(data))
+        duplicate_ms = (time.perf_counter() - start) / repeats * 1000
+        stored = len(os.listdir(store.originals))
+        print(f"original {len(data) / 1024:.0f} KB: first upload {first_ms:.1f} ms, duplicate {duplicate_ms:.1f} ms "
+              f"({stored} file stored), thumbnails ready {thumbnails_ms:.0f} ms after upload")
+        for size in store.sizes:
+            sizes = {fmt: os.path.getsize(store.thumbnail(digest, size, fmt)) / 1024 for fmt in THUMBNAIL_FORMATS}
+            print(f"  {size:>4}px: " + ", ".join(f"{fmt} {kb:.1f} KB" for fmt, kb in sizes.items()))
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,23 +1,67 @@
 import os
-import json
-import base64
+import uuid
 import dash
 import dash_bootstrap_components as dbc
 from dash import html
 from dash import dcc
-from dash.dependencies import Input, Output, State
-from flask import send_from_directory
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from flask import send_from_directory, send_file, request, jsonify, abort
+from character_repository import CharacterRepository
+from campaign_store import CampaignStore, CampaignRepository
+from image_store import ImageStore, image_url, MAX_UPLOAD_BYTES
 
 CHARACTER_DIR = "characters"
 IMAGE_DIR = os.path.join(CHARACTER_DIR, 'images')
 os.makedirs(CHARACTER_DIR, exist_ok=True)
 os.makedirs(IMAGE_DIR, exist_ok=True)
+WATCH_CHARACTERS = False  # Rescan the character folder in the background rather than when the selector is used
+SELECTOR_LIMIT = 100  # Characters listed in the selector at once; typing filters the rest
+PORTRAIT_DISPLAY_SIZE = 512  # Thumbnail size shown on the sheet; originals are kept as uploaded
+IMAGE_MAX_AGE = 365 * 24 * 3600  # Content-addressed images never change, so browsers may cache them for good
+UPLOAD_ROUTE = "/characters/upload"
+# campaign_store database to keep the sheets in instead of CHARACTER_DIR, None for off. Use the same path as
+# CAMPAIGN_PATH in main_dm_assistant.py so encounters are simulated against the sheets as edited here.
+CAMPAIGN_PATH = None
+
+if CAMPAIGN_PATH:
+    campaign_store = CampaignStore(CAMPAIGN_PATH)
+    if not campaign_store.names():
+        campaign_store.import_json(CHARACTER_DIR, join_party=True)  # first use: start from the existing sheets
+    character_repository = CampaignRepository(campaign_store)
+else:
+    character_repository = CharacterRepository(CHARACTER_DIR)
+if WATCH_CHARACTERS:
+    character_repository.watch()
+image_store = ImageStore(IMAGE_DIR)
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.DARKLY])
 
 @app.server.route('/characters/images/<path:filename>')
 def serve_image(filename):
-    return send_from_directory(IMAGE_DIR, filename)
+    try:
+        resolved = image_store.resolve(filename, accept_webp="image/webp" in request.headers.get("Accept", ""))
+    except (ValueError, OSError):
+        abort(404)
+    if resolved is None:
+        # Portraits saved before the image store are still served by file name
+        return send_from_directory(IMAGE_DIR, filename)
+    path, mimetype, etag = resolved
+    response = send_file(path, mimetype=mimetype, etag=etag, max_age=IMAGE_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add("Accept")
+    return response
+
+# Portraits are posted here as raw bytes by assets/portrait_upload.js and streamed into the image store
+@app.server.route(UPLOAD_ROUTE, methods=['POST'])
+def upload_image():
+    if request.content_length and request.content_length > MAX_UPLOAD_BYTES:
+        return jsonify(error=f"image is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"), 413
+    try:
+        digest = image_store.store_stream(request.stream)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(digest=digest, url=image_url(digest))
 
 attributes = ["Strength", "Dexterity", "Constitution", "Intelligence", "Wisdom", "Charisma"]
 skills = [
@@ -33,18 +77,29 @@ skill_to_attr = {
     "Performance": "Charisma", "Persuasion": "Charisma", "Religion": "Intelligence",
     "Sleight of Hand": "Dexterity", "Stealth": "Dexterity", "Survival": "Wisdom"
 }
-
-# Helper to get character list
-def get_character_list():
-    return [f.replace(".json", "") for f in os.listdir(CHARACTER_DIR) if f.endswith(".json")]
-
-# Helper to load character data
-def load_character(name):
-    path = os.path.join(CHARACTER_DIR, f"{name}.json")
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            return json.load(f)
-    return {}
+# Tables the browser needs to derive skill modifiers (assets/character_rules.js)
+SHEET_RULES = {"skill_abilities": [attributes.index(skill_to_attr[skill]) for skill in skills]}
+# Editable sheet inputs as (component id, key in the character JSON, value for a new character)
+SHEET_FIELDS = [
+    ("character-name", "name", ""), ("class-level", "class_level", ""), ("background", "background", ""),
+    ("player-name", "player_name", ""), ("race", "race", ""), ("alignment", "alignment", ""),
+    ("xp", "xp", 0), ("armor-class", "armor_class", 10), ("speed", "speed", 30),
+    ("hp-max", "hp_max", 10), ("hp-current", "hp_current", 10), ("hp-temp", "hp_temp", 0),
+    ("hit-dice-total", "hit_dice_total", "1d8"), ("hit-dice-current", "hit_dice_current", "1d8"),
+    ("attacks", "attacks", ""), ("cp", "cp", 0), ("sp", "sp", 0), ("ep", "ep", 0), ("gp", "gp", 0), ("pp", "pp", 0),
+    ("equipment", "equipment", ""), ("personality-traits", "personality_traits", ""), ("ideals", "ideals", ""),
+    ("bonds", "bonds", ""), ("flaws", "flaws", ""), ("features-traits", "features_traits", ""),
+    ("proficiencies-languages", "proficiencies_languages", ""), ("character-journal", "journal", ""),
+    ("inspiration", "inspiration", False), ("proficiency-bonus", "proficiency_bonus", 2),
+] + (
+    [(f"{attr.lower()}-score", f"{attr.lower()}_score", 10) for attr in attributes] +
+    [(f"saving-{attr.lower()}-prof", f"saving_{attr.lower()}_prof", False) for attr in attributes] +
+    [(f"skill-{skill.lower().replace(' ', '-')}-prof", f"skill_{skill.lower().replace(' ', '_')}_prof", False)
+     for skill in skills] +
+    [(f"death-success-{i}", f"death_success_{i}", False) for i in range(3)] +
+    [(f"death-failure-{i}", f"death_failure_{i}", False) for i in range(3)]
+)
+PORTRAIT_FIELD = "image_path"  # set from the portrait-upload store rather than an input
 
 # Create ability input with modifier display
 def ability_input(attribute):
@@ -253,7 +308,7 @@ app.layout = dbc.Container(
                     dbc.Row([
                         dbc.Col(dcc.Dropdown(
                             id="character-select",
-                            options=[{"label": c, "value": c} for c in get_character_list()],
+                            options=[],
                             placeholder="Select a character",
                             style={"color": "#000"}
                         ), md=4),
@@ -330,6 +385,13 @@ app.layout = dbc.Container(
                     # Status message
                     dbc.Alert(id="status-msg", is_open=False, duration=2000, className="mt-3"),
                     dcc.Store(id="image-path-store", data=None),
+                    dcc.Store(id="portrait-upload", data=None),
+                    dcc.Store(id="portrait-upload-route", data=UPLOAD_ROUTE),
+                    dcc.Store(id="sheet-rules", data=SHEET_RULES),
+                    dcc.Store(id="sheet-fields", data=[key for _, key, _ in SHEET_FIELDS] + [PORTRAIT_FIELD]),
+                    dcc.Store(id="sheet-baseline", data=None),
+                    dcc.Store(id="sheet-saved", data=None),
+                    dcc.Store(id="sheet-changes", data=None),
                 ], md=9),
                 
                 # Right column with image and journal
@@ -375,8 +437,10 @@ app.layout = dbc.Container(
                                     'width': '100%',
                                     'marginBottom': '20px'
                                 },
+                                accept="image/*",
                                 multiple=False
                             ),
+                            html.Div(id="portrait-upload-status", style={"color": "#dc3545", "fontSize": "12px"}),
                         ], style={"flex": "0 0 auto"}),
                         
                         # Journal section
@@ -425,70 +489,74 @@ def clear_character_select(n_clicks):
         return None
     return dash.no_update
 
-# Update ability modifiers
+# List characters matching what is typed into the selector, refreshed after a save
 @app.callback(
+    Output("character-select", "options"),
+    [Input("character-select", "search_value"),
+     Input("status-msg", "children")],
+    State("character-select", "value")
+)
+def update_character_options(search_value, status, selected):
+    summaries = character_repository.summaries(search_value, limit=SELECTOR_LIMIT)
+    if selected and all(summary["name"] != selected for summary in summaries):
+        # Keep the selected character in the options so the dropdown still shows it
+        selected_summary = character_repository.summary(selected)
+        if selected_summary is not None:
+            summaries.append(selected_summary)
+    return [{"label": summary["label"], "value": summary["name"]} for summary in summaries]
+
+# Derived values (modifiers, saves, skills, passive perception, initiative and the health bar) are
+# computed in the browser by assets/character_rules.js, so editing the sheet sends no requests
+
+# Update ability modifiers
+app.clientside_callback(
+    ClientsideFunction(namespace="character_rules", function_name="abilityModifiers"),
     [Output(f"{attr.lower()}-mod", "children") for attr in attributes],
     [Input(f"{attr.lower()}-score", "value") for attr in attributes]
 )
-def update_modifiers(*scores):
-    return [(f"+{(score - 10) // 2}" if (score - 10) // 2 >= 0 else str((score - 10) // 2)) if score is not None else "0" for score in scores]
 
 # Update saving throw modifiers
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="character_rules", function_name="savingModifiers"),
     [Output(f"saving-{attr.lower()}-mod", "children") for attr in attributes],
     [Input(f"{attr.lower()}-score", "value") for attr in attributes] +
     [Input(f"saving-{attr.lower()}-prof", "value") for attr in attributes] +
     [Input("proficiency-bonus", "value")]
 )
-def update_saving_modifiers(*values):
-    scores = values[:6]
-    prof_checks = values[6:12]
-    prof_bonus = values[12] if values[12] is not None else 0
-    mods = [(score - 10) // 2 if score is not None else 0 for score in scores]
-    saving_mods = [mod + (prof_bonus if prof_check else 0) for mod, prof_check in zip(mods, prof_checks)]
-    return [(f"+{mod}" if mod >= 0 else str(mod)) for mod in saving_mods]
 
 # Update skill modifiers
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="character_rules", function_name="skillModifiers"),
     [Output(f"skill-{skill.lower().replace(' ', '-')}-mod", "children") for skill in skills],
     [Input(f"{attr.lower()}-score", "value") for attr in attributes] +
     [Input(f"skill-{skill.lower().replace(' ', '-')}-prof", "value") for skill in skills] +
-    [Input("proficiency-bonus", "value")]
+    [Input("proficiency-bonus", "value")],
+    State("sheet-rules", "data")
 )
-def update_skill_modifiers(*values):
-    ability_scores = values[:6]
-    prof_checks = values[6:6+len(skills)]
-    prof_bonus = values[-1] if values[-1] is not None else 0
-    ability_mods = {attr: (score - 10) // 2 if score is not None else 0 for attr, score in zip(attributes, ability_scores)}
-    skill_mods = [ability_mods[skill_to_attr[skill]] + (prof_bonus if prof_check else 0) for skill, prof_check in zip(skills, prof_checks)]
-    return [(f"+{mod}" if mod >= 0 else str(mod)) for mod in skill_mods]
 
 # Update passive perception
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="character_rules", function_name="passivePerception"),
     Output("passive-perception", "children"),
     Input("skill-perception-mod", "children")
 )
-def update_passive_perception(perception_mod):
-    return str(10 + int(perception_mod)) if perception_mod else "10"
 
 # Update initiative
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="character_rules", function_name="initiative"),
     Output("initiative", "children"),
     Input("dexterity-score", "value")
 )
-def update_initiative(dex_score):
-    mod = (dex_score - 10) // 2 if dex_score is not None else 0
-    return str(mod)
 
 # Modify the toggle_upload_visibility callback
 @app.callback(
     [Output("upload-text", "style"),
      Output("character-image", "style"),
      Output("character-image", "src")],
-    [Input("upload-image", "contents"),
+    [Input("portrait-upload", "data"),
      Input("image-path-store", "data")]
 )
-def toggle_upload_visibility(contents, image_path):
+def toggle_upload_visibility(uploaded, image_path):
     text_style = {
         'width': '100%',
         'height': '60px',
@@ -514,10 +582,12 @@ def toggle_upload_visibility(contents, image_path):
         "overflow": "hidden"
     }
     
-    if contents is not None:
+    # Show whichever changed last: a new upload, or the portrait of the character just loaded
+    triggered = [t["prop_id"] for t in dash.callback_context.triggered]
+    if uploaded is not None and "portrait-upload.data" in triggered:
         text_style["display"] = "none"
         image_style["display"] = "block"
-        return text_style, image_style, contents
+        return text_style, image_style, f"{uploaded}/{PORTRAIT_DISPLAY_SIZE}"
     elif image_path is not None:
         text_style["display"] = "none"
         image_style["display"] = "block"
@@ -529,128 +599,70 @@ def toggle_upload_visibility(contents, image_path):
 
 # Load character data
 @app.callback(
-    [
-        Output("character-name", "value"), Output("class-level", "value"), Output("background", "value"),
-        Output("player-name", "value"), Output("race", "value"), Output("alignment", "value"),
-        Output("xp", "value"), Output("armor-class", "value"), Output("speed", "value"),
-        Output("hp-max", "value"), Output("hp-current", "value"), Output("hp-temp", "value"),
-        Output("hit-dice-total", "value"), Output("hit-dice-current", "value"), Output("attacks", "value"),
-        Output("cp", "value"), Output("sp", "value"), Output("ep", "value"), Output("gp", "value"),
-        Output("pp", "value"), Output("equipment", "value"), Output("personality-traits", "value"),
-        Output("ideals", "value"), Output("bonds", "value"), Output("flaws", "value"),
-        Output("features-traits", "value"), Output("proficiencies-languages", "value"),
-        Output("character-journal", "value"), Output("inspiration", "value"),
-        Output("proficiency-bonus", "value"), Output("image-path-store", "data")
-    ] +
-    [Output(f"{attr.lower()}-score", "value") for attr in attributes] +
-    [Output(f"saving-{attr.lower()}-prof", "value") for attr in attributes] +
-    [Output(f"skill-{skill.lower().replace(' ', '-')}-prof", "value") for skill in skills] +
-    [Output(f"death-success-{i}", "value") for i in range(3)] +
-    [Output(f"death-failure-{i}", "value") for i in range(3)],
+    [Output(component_id, "value") for component_id, _, _ in SHEET_FIELDS] +
+    [Output("image-path-store", "data"), Output("sheet-baseline", "data")],
     [Input("character-select", "value")]
 )
 def load_character_data(name):
-    if not name:
-        return (
-            [""] * 7 + [10, 30, 10, 10, 0, "1d8", "1d8", "", 0, 0, 0, 0, 0, "", "", "", "", "", "", "", "", False, 2, None] +
-            [10] * 6 + [False] * (6 + len(skills) + 6)
-        )
-    char_data = load_character(name)
-    image_path = char_data.get("image_path", None)
-    return (
-        [
-            char_data.get("name", ""), char_data.get("class_level", ""), char_data.get("background", ""),
-            char_data.get("player_name", ""), char_data.get("race", ""), char_data.get("alignment", ""),
-            char_data.get("xp", 0), char_data.get("armor_class", 10), char_data.get("speed", 30),
-            char_data.get("hp_max", 10), char_data.get("hp_current", 10), char_data.get("hp_temp", 0),
-            char_data.get("hit_dice_total", "1d8"), char_data.get("hit_dice_current", "1d8"),
-            char_data.get("attacks", ""), char_data.get("cp", 0), char_data.get("sp", 0), char_data.get("ep", 0),
-            char_data.get("gp", 0), char_data.get("pp", 0), char_data.get("equipment", ""),
-            char_data.get("personality_traits", ""), char_data.get("ideals", ""), char_data.get("bonds", ""),
-            char_data.get("flaws", ""), char_data.get("features_traits", ""),
-            char_data.get("proficiencies_languages", ""), char_data.get("journal", ""),
-            char_data.get("inspiration", False), char_data.get("proficiency_bonus", 2), image_path
-        ] +
-        [char_data.get(f"{attr.lower()}_score", 10) for attr in attributes] +
-        [char_data.get(f"saving_{attr.lower()}_prof", False) for attr in attributes] +
-        [char_data.get(f"skill_{skill.lower().replace(' ', '_')}_prof", False) for skill in skills] +
-        [char_data.get(f"death_success_{i}", False) for i in range(3)] +
-        [char_data.get(f"death_failure_{i}", False) for i in range(3)]
-    )
+    char_data = character_repository.get(name) if name else {}
+    # A fresh token tells the browser to treat the values just loaded as unchanged
+    baseline = {"token": uuid.uuid4().hex, "name": name}
+    portrait = image_store.display_url(char_data.get("image_path"), PORTRAIT_DISPLAY_SIZE, legacy_dir=IMAGE_DIR)
+    return [char_data.get(key, default) for _, key, default in SHEET_FIELDS] + [portrait, baseline]
+
+# Track which fields differ from the loaded character, in the browser (assets/sheet_changes.js)
+app.clientside_callback(
+    ClientsideFunction(namespace="sheet_changes", function_name="track"),
+    Output("sheet-changes", "data"),
+    [Input(component_id, "value") for component_id, _, _ in SHEET_FIELDS] +
+    [Input("portrait-upload", "data"), Input("sheet-baseline", "data"), Input("sheet-saved", "data"),
+     Input("save-character", "n_clicks")],
+    State("sheet-fields", "data")
+)
+
+# Send a dropped portrait straight to the upload route, so its data URL never goes through a callback
+app.clientside_callback(
+    ClientsideFunction(namespace="portrait_upload", function_name="upload"),
+    [Output("portrait-upload", "data"), Output("upload-image", "contents"), Output("portrait-upload-status", "children")],
+    Input("upload-image", "contents"),
+    State("portrait-upload-route", "data"),
+    prevent_initial_call=True
+)
 
-# Save character data
+# Save character data: only the fields changed since loading are sent, and merged into the stored sheet
 @app.callback(
-    [Output("status-msg", "children"), Output("status-msg", "is_open")],
+    [Output("status-msg", "children"), Output("status-msg", "is_open"), Output("sheet-saved", "data")],
     [Input("save-character", "n_clicks")],
-    [
-        State("character-name", "value"), State("class-level", "value"), State("background", "value"),
-        State("player-name", "value"), State("race", "value"), State("alignment", "value"),
-        State("xp", "value"), State("armor-class", "value"), State("speed", "value"),
-        State("hp-max", "value"), State("hp-current", "value"), State("hp-temp", "value"),
-        State("hit-dice-total", "value"), State("hit-dice-current", "value"), State("attacks", "value"),
-        State("cp", "value"), State("sp", "value"), State("ep", "value"), State("gp", "value"),
-        State("pp", "value"), State("equipment", "value"), State("personality-traits", "value"),
-        State("ideals", "value"), State("bonds", "value"), State("flaws", "value"),
-        State("features-traits", "value"), State("proficiencies-languages", "value"),
-        State("character-journal", "value"), State("inspiration", "value"),
-        State("proficiency-bonus", "value"), State("upload-image", "contents"),
-        State("image-path-store", "data")
-    ] +
-    [State(f"{attr.lower()}-score", "value") for attr in attributes] +
-    [State(f"saving-{attr.lower()}-prof", "value") for attr in attributes] +
-    [State(f"skill-{skill.lower().replace(' ', '-')}-prof", "value") for skill in skills] +
-    [State(f"death-success-{i}", "value") for i in range(3)] +
-    [State(f"death-failure-{i}", "value") for i in range(3)]
+    [State("character-name", "value"), State("sheet-changes", "data")]
 )
-def save_character(n_clicks, name, class_level, background, player_name, race, alignment, xp,
-                   armor_class, speed, hp_max, hp_current, hp_temp, hit_dice_total, hit_dice_current,
-                   attacks, cp, sp, ep, gp, pp, equipment, personality_traits, ideals, bonds, flaws,
-                   features_traits, proficiencies_languages, journal, inspiration, proficiency_bonus,
-                   contents, image_path_store, *states):
+def save_character(n_clicks, name, changes):
     if not n_clicks or not name:
-        return "", False
-    ability_scores = states[:6]
-    saving_profs = states[6:12]
-    skill_profs = states[12:12+len(skills)]
-    death_successes = states[12+len(skills):15+len(skills)]
-    death_failures = states[15+len(skills):18+len(skills)]
-    char_data = {
-        "name": name, "class_level": class_level, "background": background, "player_name": player_name,
-        "race": race, "alignment": alignment, "xp": xp, "armor_class": armor_class, "speed": speed,
-        "hp_max": hp_max, "hp_current": hp_current, "hp_temp": hp_temp, "hit_dice_total": hit_dice_total,
-        "hit_dice_current": hit_dice_current, "attacks": attacks, "cp": cp, "sp": sp, "ep": ep,
-        "gp": gp, "pp": pp, "equipment": equipment, "personality_traits": personality_traits,
-        "ideals": ideals, "bonds": bonds, "flaws": flaws, "features_traits": features_traits,
-        "proficiencies_languages": proficiencies_languages, "journal": journal,
-        "inspiration": inspiration, "proficiency_bonus": proficiency_bonus,
-    }
-    for attr, score in zip(attributes, ability_scores):
-        char_data[f"{attr.lower()}_score"] = score
-    for attr, prof in zip(attributes, saving_profs):
-        char_data[f"saving_{attr.lower()}_prof"] = prof
-    for skill, prof in zip(skills, skill_profs):
-        char_data[f"skill_{skill.lower().replace(' ', '_')}_prof"] = prof
-    for i, success in enumerate(death_successes):
-        char_data[f"death_success_{i}"] = success
-    for i, failure in enumerate(death_failures):
-        char_data[f"death_failure_{i}"] = failure
-    if contents:
-        content_type, content_string = contents.split(',')
-        if 'image/' in content_type:
-            ext = content_type.split('/')[-1].split(';')[0]
-            filename = f"{name}.{ext}"
-            filepath = os.path.join(IMAGE_DIR, filename)
-            with open(filepath, "wb") as f:
-                f.write(base64.b64decode(content_string))
-            char_data["image_path"] = f"/characters/images/{filename}"
-    else:
-        char_data["image_path"] = image_path_store
-    with open(os.path.join(CHARACTER_DIR, f"{name}.json"), "w") as f:
-        json.dump(char_data, f, indent=4)
-    return f"Character '{name}' saved successfully!", True
+        return "", False, dash.no_update
+    changes = changes or {}
+    allowed = {key for _, key, _ in SHEET_FIELDS} | {PORTRAIT_FIELD}
+    fields = {key: value for key, value in (changes.get("fields") or {}).items() if key in allowed}
+    if PORTRAIT_FIELD in fields and not image_store.owns(fields[PORTRAIT_FIELD]):
+        fields.pop(PORTRAIT_FIELD)  # only portraits uploaded to the image store are accepted
+    source = changes.get("source")
+    exists = character_repository.summary(name) is not None
+    if exists and name != source:
+        # The changes are relative to the loaded sheet, so merging them into another character would mix the two
+        return (f"A character named '{name}' already exists. Load it to edit it, or choose another name.",
+                True, dash.no_update)
+    if not fields and exists:
+        return f"No changes to save for '{name}'.", True, dash.no_update
+    # Start from the stored sheet; a renamed or new character starts from the one it was loaded from, or defaults
+    char_data = ((character_repository.get(source) if source else {}) or
+                 {key: default for _, key, default in SHEET_FIELDS})
+    char_data.update(fields)
+    char_data["name"] = name
+    character_repository.save(name, char_data)
+    saved = {"token": changes.get("token"), "revision": changes.get("revision"), "name": name}
+    return f"Character '{name}' saved successfully!", True, saved
 
 # Add new callback for health bar
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="character_rules", function_name="healthBar"),
     [
         Output("health-bar", "style"),
         Output("health-text", "children")
@@ -661,43 +673,6 @@ def save_character(n_clicks, name, class_level, background, player_name, race, a
         Input("hp-temp", "value")
     ]
 )
-def update_health_bar(current_hp, max_hp, temp_hp):
-    if current_hp is None or max_hp is None or temp_hp is None:
-        current_hp = 0
-        max_hp = 1
-        temp_hp = 0
-    
-    # Ensure we don't divide by zero
-    if max_hp <= 0:
-        max_hp = 1
-    
-    # Calculate health percentage
-    health_percent = min(100, (current_hp / (max_hp + temp_hp)) * 100)
-    
-    # Determine color based on health percentage
-    if health_percent <= 25:
-        color = "#dc3545"  # Red
-    elif health_percent <= 50:
-        color = "#ffc107"  # Yellow
-    else:
-        color = "#28a745"  # Green
-    
-    # Update bar style
-    bar_style = {
-        "width": f"{health_percent}%",
-        "height": "100%",
-        "backgroundColor": color,
-        "position": "absolute",
-        "top": "0",
-        "left": "0",
-        "transition": "width 0.3s ease, background-color 0.3s ease",
-        "borderRadius": "8px"
-    }
-    
-    # Create health text
-    health_text = f"{current_hp}/{max_hp + temp_hp}"
-    
-    return bar_style, health_text
 
 # Run the app
 if __name__ == "__main__":
@@ -1,19 +1,56 @@
 import os
 import random
 import dash
-import json
-import re
-from dash import dcc, html, Input, Output, State, callback_context
+import threading
+import time
+import uuid
+from dash import dcc, html, Input, Output, State, Patch, callback_context, ClientsideFunction
 import dash_bootstrap_components as dbc
 from ollama_interface import OllamaInterface
+from ollama_scheduler import OllamaScheduler, PRIORITY_BULK
 from openrouter_interface import OpenRouterInterface
+from context_builder import ContextBuilder
+from retrieval_index import RetrievalIndex
+from transcript_store import TranscriptStore
+from response_cache import ResponseCache, CachedChatClient
+from async_client import AsyncChatClient
+from session_store import SessionStore
+from chat_view import render_message, render_window, window_start, prepend_page
+from combat_engine import PHASE_START, PHASE_END
+from encounter_json import EncounterPipeline, save_encounter
+from encounter_batch import EncounterBatch, MAX_BATCH_SIZE
+from monster_library import MonsterLibrary
+from dice import parse as parse_dice, attack_summary, ATTACK_PATTERN
+from encounter_sim import load_party, simulate_encounter, describe
+from campaign_store import CampaignStore
 
 
 # Interface Configuration
 USE_OLLAMA = False
+MAX_CONCURRENT_REQUESTS = 4  # LLM requests in flight at once across all browser sessions
 OLLAMA_MODEL = "gemma3:1b"  # Model to use with Ollama
+OLLAMA_KEEP_ALIVE = "30m"  # How long Ollama keeps the model loaded between requests
+OLLAMA_MAX_CONCURRENT = 1  # Generations run at once on the local Ollama server, the rest queue by priority
 OPENROUTER_API_KEY = "API_KEY"
+OPENROUTER_MIN_MODEL_SIZE = None  # Minimum model size in billions of parameters for routing, None for any
+OPENROUTER_HEDGE = False  # Race the two best models on non-streaming requests and keep the first answer
 DEFAULT_PROMPT = 'dungeon_master'
+ENCOUNTER_PROMPT = 'monster_generator_json'  # Replies to this prompt are validated and saved to generated_characters
+NOTEPAD_SAVE_DELAY = 1500  # ms of typing pause before the notepad is sent to the server and saved
+BATCH_MAX_WORKERS = 4  # Generation requests in flight at once for a bulk encounter batch
+BATCH_KEEP_SECONDS = 3600  # How long a finished batch's progress is kept for its session
+MONSTER_LIBRARY_PATH = "monster_library.sqlite3"  # Index over generated_characters for the library search panel
+PARTY_DIR = "characters"  # Character sheets that generated encounters are simulated against
+# campaign_store database to load the party from in one query instead of PARTY_DIR, None for off. Use the same
+# path as CAMPAIGN_PATH in main_character_sheet.py, which then keeps its sheets there.
+CAMPAIGN_PATH = None
+ENCOUNTER_SIM_FIGHTS = 20000  # Simulated fights per saved encounter, 0 to skip the difficulty check
+TRANSCRIPT_DIR = "transcripts"  # One transcript segment per chat session, plus index.json
+COMPRESS_CLOSED_TRANSCRIPTS = False  # Gzip session segments once they are closed
+USE_RESPONSE_CACHE = False
+RESPONSE_CACHE_PATH = "response_cache.sqlite3"
+CACHE_INCLUDE_CONTEXT = False  # Also key cached answers on the notes/history context they were given
+CACHEABLE_PROMPTS = {'dungeon_master'}  # Generator prompts should produce a fresh result every time
 SYSTEM_PROMPTS = {
     'dungeon_master': ("You are a Dungeon Master Assistant AI, dedicated solely to discussing and assisting with "
                        "Dungeons & Dragons (D&D). You will provide assistance and rule help, campaign ideas, character "
@@ -58,15 +95,43 @@ SYSTEM_PROMPTS = {
 
 # Initialize the appropriate interface
 if USE_OLLAMA:
-    chat_client = OllamaInterface(OLLAMA_MODEL, SYSTEM_PROMPTS[DEFAULT_PROMPT])
+    backend_client = OllamaScheduler(OllamaInterface(OLLAMA_MODEL, SYSTEM_PROMPTS[DEFAULT_PROMPT],
+                                                     keep_alive=OLLAMA_KEEP_ALIVE),
+                                     max_concurrent=OLLAMA_MAX_CONCURRENT)
+    # Keep the model resident while a browser has the assistant open (see update_router_stats)
+    backend_client.start_keep_alive_pings()
 else:
-    chat_client = OpenRouterInterface(OPENROUTER_API_KEY, SYSTEM_PROMPTS[DEFAULT_PROMPT])
+    backend_client = OpenRouterInterface(OPENROUTER_API_KEY, SYSTEM_PROMPTS[DEFAULT_PROMPT],
+                                         min_model_size=OPENROUTER_MIN_MODEL_SIZE, hedge=OPENROUTER_HEDGE)
+# Shared by all sessions; system prompts are passed per request so nothing mutable is shared between them
+chat_client = AsyncChatClient(backend_client, max_concurrency=MAX_CONCURRENT_REQUESTS)
 
-if os.path.exists("notes.txt"):
-    with open("notes.txt", "r", encoding="utf-8") as f:
-        initial_notes = f.read()
+if USE_RESPONSE_CACHE:
+    cached_client = CachedChatClient(chat_client, ResponseCache(RESPONSE_CACHE_PATH), include_context=CACHE_INCLUDE_CONTEXT)
 else:
-    initial_notes = ""
+    cached_client = None
+
+transcript_store = TranscriptStore(TRANSCRIPT_DIR, compress_closed=COMPRESS_CLOSED_TRANSCRIPTS)
+retrieval_index = RetrievalIndex(["notes.txt"], segments=transcript_store)
+encounter_pipeline = EncounterPipeline()
+monster_library = MonsterLibrary(path=MONSTER_LIBRARY_PATH)
+threading.Thread(target=monster_library.refresh, kwargs={'force': True}, daemon=True).start()
+campaign_store = CampaignStore(CAMPAIGN_PATH) if CAMPAIGN_PATH else None
+context_builder = ContextBuilder("notes.txt", transcript_store, retriever=retrieval_index)
+threading.Thread(target=retrieval_index.refresh, daemon=True).start()
+
+# Chat history and combat state of each browser session; the page only holds its session id and versions
+session_store = SessionStore()
+
+# Latest bulk encounter batch of each browser session, keyed by session id: (batch id, EncounterBatch)
+BATCHES = {}
+
+# Responses being streamed by background threads, keyed by stream id
+ACTIVE_STREAMS = {}
+STREAM_LOCK = threading.Lock()
+STREAM_POLL_INTERVAL = 250  # ms between chat panel refreshes while a response streams in
+STREAM_ORPHAN_SECONDS = 60  # finished streams no page has collected are dropped after this long
+
     
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.DARKLY, 
                         'dark.css'])
@@ -81,231 +146,418 @@ GLOBAL_STYLE = {
 
 ROUNDED_STYLE = {'borderRadius': '8px'}
 
-app.layout = html.Div([
-    dcc.Store(id="effects-store", data=[]),
-    dcc.Store(id="chat-store", data=[]),
-    dcc.Store(id="prompt-store", data=DEFAULT_PROMPT),
-    dcc.Interval(id="notepad-interval", interval=30000, n_intervals=0),
-    html.Div(
-        style={'display': 'flex', 'height': '100vh', 'gap': '10px'},
-        children=[
-            html.Div(
-                style={
-                    'width': '65%', 
-                    'padding': '20px', 
-                    'backgroundColor': '#2c2c2c',
-                    'borderRight': '1px solid #444',
-                    **ROUNDED_STYLE,
-                    'display': 'flex',
-                    'flexDirection': 'column',
-                    'height': '100%'
-                },
-                children=[
-                    html.Div([
-                        html.H2("D&D Companion", style={'color': '#FFFFFF', 'margin': '0', 'textAlign': 'center'}),
+LOAD_EARLIER_STYLE = {
+    'backgroundColor': 'transparent',
+    'color': '#888',
+    'border': 'none',
+    'fontSize': '12px',
+    'marginBottom': '5px'
+}
+
+LIBRARY_INPUT_STYLE = {
+    'backgroundColor': '#333',
+    'color': '#FFFFFF',
+    'border': '1px solid #444',
+    'marginRight': '4px',
+    **ROUNDED_STYLE
+}
+
+def serve_layout():
+    """Build the page for a new browser session, with its own session id and the current notes."""
+    return html.Div([
+        dcc.Store(id="session-id", data=uuid.uuid4().hex),
+        dcc.Store(id="chat-version", data=0),
+        dcc.Store(id="effects-version", data=0),
+        dcc.Store(id="prompt-store", data=DEFAULT_PROMPT),
+        dcc.Store(id="notes-draft", data=None),
+        dcc.Store(id="notepad-save-delay", data=NOTEPAD_SAVE_DELAY),
+        dcc.Interval(id="stream-interval", interval=STREAM_POLL_INTERVAL, n_intervals=0, disabled=True),
+        dcc.Interval(id="router-interval", interval=5000, n_intervals=0),
+        dcc.Store(id="batch-store", data=None),
+        dcc.Interval(id="batch-interval", interval=1000, n_intervals=0, disabled=True),
+        html.Div(
+            style={'display': 'flex', 'height': '100vh', 'gap': '10px'},
+            children=[
+                html.Div(
+                    style={
+                        'width': '65%', 
+                        'padding': '20px', 
+                        'backgroundColor': '#2c2c2c',
+                        'borderRight': '1px solid #444',
+                        **ROUNDED_STYLE,
+                        'display': 'flex',
+                        'flexDirection': 'column',
+                        'height': '100%'
+                    },
+                    children=[
                         html.Div([
-                            html.Span(id="dice-result", style={'marginRight': '10px', 'fontWeight': 'bold'}),
-                            html.Button(
-                                html.Img(
-                                    src='/assets/roll.png',  
-                                    style={'width': '100%', 'height': '100%', 'objectFit': 'contain'}
+                            html.H2("D&D Companion", style={'color': '#FFFFFF', 'margin': '0', 'textAlign': 'center'}),
+                            html.Div([
+                                html.Span(id="dice-result", style={'marginRight': '10px', 'fontWeight': 'bold'}),
+                                html.Button(
+                                    html.Img(
+                                        src='/assets/roll.png',  
+                                        style={'width': '100%', 'height': '100%', 'objectFit': 'contain'}
+                                    ),
+                                    id="roll-button",
+                                    n_clicks=0,
+                                    style={
+                                        'backgroundColor': 'transparent',
+                                        'border': 'none',
+                                        'width': '5vw',
+                                        'height': '5vw',
+                                        'minWidth': '40px',
+                                        'minHeight': '40px',
+                                        'display': 'flex',
+                                        'alignItems': 'center',
+                                        'justifyContent': 'center',
+                                        **ROUNDED_STYLE
+                                    }
                                 ),
-                                id="roll-button",
-                                n_clicks=0,
+
+                                dcc.Dropdown(
+                                    id='dice-type',
+                                    options=[
+                                        {'label': 'd4', 'value': 'd4'},
+                                        {'label': 'd6', 'value': 'd6'},
+                                        {'label': 'd8', 'value': 'd8'},
+                                        {'label': 'd10', 'value': 'd10'},
+                                        {'label': 'd12', 'value': 'd12'},
+                                        {'label': 'd20', 'value': 'd20'},
+                                    ],
+                                    value='d20',
+                                    clearable=False,
+                                    style={'width': '100px', 'marginLeft': '10px', 'color': 'black'}
+                                ),
+                                dcc.Input(
+                                    id='dice-expression',
+                                    type='text',
+                                    placeholder='4d6kh3 or +6 1d8+4',
+                                    debounce=True,
+                                    style={'width': '150px', 'marginLeft': '10px', **ROUNDED_STYLE}
+                                ),
+                                dcc.Input(
+                                    id='dice-ac',
+                                    type='number',
+                                    placeholder='AC',
+                                    min=0,
+                                    style={'width': '60px', 'marginLeft': '5px', **ROUNDED_STYLE}
+                                ),
+                            ], style={'display': 'flex', 'alignItems': 'center', 'marginLeft': 'auto'})
+                        ], style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'space-between'}),
+                        html.Div(id="dice-stats", style={'color': '#aaa', 'fontSize': '0.9em', 'textAlign': 'right'}),
+                        html.H4("Active Effects", style={'color': '#FFFFFF'}),
+                        html.Div([
+                            html.Div(
+                                id="initiative-display",
+                                children="Not in combat.",
+                                style={
+                                    'width': '30%',
+                                    'border': '1px solid #444',
+                                    'padding': '10px',
+                                    'minHeight': '100px',
+                                    'maxHeight': '250px',
+                                    'overflowY': 'auto',
+                                    'backgroundColor': '#1a1a1a',
+                                    **ROUNDED_STYLE
+                                }
+                            ),
+                            html.Div(
+                                id="effects-display",
+                                children="No active effects.",
+                                style={
+                                    'flex': '1',
+                                    'marginLeft': '10px',
+                                    'border': '1px solid #444',
+                                    'padding': '10px',
+                                    'minHeight': '100px',
+                                    'maxHeight': '250px',
+                                    'overflowY': 'auto',
+                                    'backgroundColor': '#1a1a1a',
+                                    **ROUNDED_STYLE
+                                }
+                            )
+                        ], style={'display': 'flex'}),
+                        html.Br(),
+                        html.Div([
+                            dcc.Input(
+                                id="effect-character", type="text",
+                                placeholder="Character Name", 
                                 style={
-                                    'backgroundColor': 'transparent',
+                                    'width': '35%', 
+                                    'backgroundColor': '#333', 
+                                    'color': '#FFFFFF', 
+                                    'border': '1px solid #444',
+                                    **ROUNDED_STYLE
+                                }
+                            ),
+                            dcc.Input(
+                                id="effect-name", type="text",
+                                placeholder="Effect Name", 
+                                style={
+                                    'width': '30%', 
+                                    'marginLeft': '10px',
+                                    'backgroundColor': '#333', 
+                                    'color': '#FFFFFF', 
+                                    'border': '1px solid #444',
+                                    **ROUNDED_STYLE
+                                }
+                            ),
+                            dcc.Input(
+                                id="effect-duration", type="number",
+                                placeholder="Turns", min=1,
+                                style={
+                                    'width': '10%',  
+                                    'marginLeft': '10px', 
+                                    'backgroundColor': '#333', 
+                                    'color': '#FFFFFF', 
+                                    'border': '1px solid #444',
+                                    **ROUNDED_STYLE
+                                }
+                            ),
+                            html.Button(
+                                "Add Effect", id="add-effect", n_clicks=0,
+                                style={
+                                    'marginLeft': '10px',
+                                    'width': '15%',  
+                                    'backgroundColor': '#0d6efd',
+                                    'color': '#FFFFFF', 
+                                    'border': 'none',
+                                    **ROUNDED_STYLE
+                                }
+                            ),
+                            html.Button(
+                                "Next Turn", id="next-turn", n_clicks=0,
+                                style={
+                                    'marginLeft': '10px',
+                                    'width': '15%',  
+                                    'backgroundColor': '#28a745',
+                                    'color': '#FFFFFF', 
+                                    'border': 'none',
+                                    **ROUNDED_STYLE
+                                }
+                            )
+                        ], style={'display': 'flex', 'alignItems': 'center'}),
+                        html.Div([
+                            dcc.Input(
+                                id="effect-initiative", type="number",
+                                placeholder="Initiative", 
+                                style={
+                                    'width': '15%', 
+                                    'backgroundColor': '#333', 
+                                    'color': '#FFFFFF', 
+                                    'border': '1px solid #444',
+                                    **ROUNDED_STYLE
+                                }
+                            ),
+                            html.Button(
+                                "Add to Initiative", id="add-combatant", n_clicks=0,
+                                style={
+                                    'marginLeft': '10px',
+                                    'width': '20%',  
+                                    'backgroundColor': '#0d6efd',
+                                    'color': '#FFFFFF', 
                                     'border': 'none',
-                                    'width': '5vw',
-                                    'height': '5vw',
-                                    'minWidth': '40px',
-                                    'minHeight': '40px',
-                                    'display': 'flex',
-                                    'alignItems': 'center',
-                                    'justifyContent': 'center',
                                     **ROUNDED_STYLE
                                 }
                             ),
-
                             dcc.Dropdown(
-                                id='dice-type',
+                                id='effect-phase',
                                 options=[
-                                    {'label': 'd4', 'value': 'd4'},
-                                    {'label': 'd6', 'value': 'd6'},
-                                    {'label': 'd8', 'value': 'd8'},
-                                    {'label': 'd10', 'value': 'd10'},
-                                    {'label': 'd12', 'value': 'd12'},
-                                    {'label': 'd20', 'value': 'd20'},
+                                    {'label': 'Effect ends at end of turn', 'value': PHASE_END},
+                                    {'label': 'Effect ends at start of turn', 'value': PHASE_START},
                                 ],
-                                value='d20',
+                                value=PHASE_END,
                                 clearable=False,
-                                style={'width': '100px', 'marginLeft': '10px', 'color': 'black'}
+                                style={'width': '260px', 'marginLeft': '10px', 'color': 'black'}
                             ),
-                        ], style={'display': 'flex', 'alignItems': 'center', 'marginLeft': 'auto'})
-                    ], style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'space-between'}),
-                    html.H4("Active Effects", style={'color': '#FFFFFF'}),
-                    html.Div(
-                        id="effects-display",
-                        style={
-                            'border': '1px solid #444',
-                            'padding': '10px',
-                            'minHeight': '100px',
-                            'backgroundColor': '#1a1a1a',
-                            **ROUNDED_STYLE
-                        }
-                    ),
-                    html.Br(),
-                    html.Div([
-                        dcc.Input(
-                            id="effect-character", type="text",
-                            placeholder="Character Name", 
-                            style={
-                                'width': '35%', 
-                                'backgroundColor': '#333', 
-                                'color': '#FFFFFF', 
-                                'border': '1px solid #444',
-                                **ROUNDED_STYLE
-                            }
-                        ),
-                        dcc.Input(
-                            id="effect-name", type="text",
-                            placeholder="Effect Name", 
-                            style={
-                                'width': '30%', 
-                                'marginLeft': '10px',
-                                'backgroundColor': '#333', 
-                                'color': '#FFFFFF', 
-                                'border': '1px solid #444',
-                                **ROUNDED_STYLE
-                            }
-                        ),
-                        dcc.Input(
-                            id="effect-duration", type="number",
-                            placeholder="Turns", min=1,
-                            style={
-                                'width': '10%',  
-                                'marginLeft': '10px', 
-                                'backgroundColor': '#333', 
-                                'color': '#FFFFFF', 
-                                'border': '1px solid #444',
-                                **ROUNDED_STYLE
-                            }
-                        ),
-                        html.Button(
-                            "Add Effect", id="add-effect", n_clicks=0,
-                            style={
-                                'marginLeft': '10px',
-                                'width': '15%',  
-                                'backgroundColor': '#0d6efd',
-                                'color': '#FFFFFF', 
-                                'border': 'none',
-                                **ROUNDED_STYLE
-                            }
-                        ),
+                            html.Button(
+                                "End Combat", id="end-combat", n_clicks=0,
+                                style={
+                                    'marginLeft': 'auto',
+                                    'width': '15%',  
+                                    'backgroundColor': '#dc3545',
+                                    'color': '#FFFFFF', 
+                                    'border': 'none',
+                                    **ROUNDED_STYLE
+                                }
+                            )
+                        ], style={'display': 'flex', 'alignItems': 'center', 'marginTop': '10px'}),
+                        html.Br(),
+                        html.Div([
+                            html.Div([
+                                html.H4("Notepad", style={'color': '#FFFFFF'}),
+                                html.Span(id="notepad-status", style={'color': '#888', 'fontSize': '12px'})
+                            ], style={'display': 'flex', 'alignItems': 'baseline', 'justifyContent': 'space-between'}),
+                            dcc.Textarea(
+                                id="notepad", 
+                                placeholder="Write your notes here...", 
+                                value=context_builder.notes.read(),
+                                style={
+                                    'width': '100%', 
+                                    'height': '100%',  
+                                    'backgroundColor': '#333', 
+                                    'color': '#fff', 
+                                    'border': '1px solid #444',
+                                    **ROUNDED_STYLE
+                                }
+                            )
+                        ], style={'flex': '1', 'marginBottom': '40px'})
+                    ]
+                ),
+                html.Div(
+                    style={
+                        'width': '35%', 
+                        'padding': '20px',
+                        'backgroundColor': '#2c2c2c',
+                        'borderLeft': '1px solid #444',
+                        'display': 'flex', 
+                        'flexDirection': 'column',
+                        **ROUNDED_STYLE
+                    },
+                    children=[
+                        html.H4("D&D Assistant", style={'color': '#FFFFFF', 'textAlign': 'center'}),
+                        html.Div([
+                            dcc.Dropdown(
+                                id='prompt-selector',
+                                options=[{'label': key, 'value': key} for key in SYSTEM_PROMPTS.keys()],
+                                value=DEFAULT_PROMPT,
+                                clearable=False,
+                                style={'width': '100%', 'marginBottom': '10px', 'color': 'black', **ROUNDED_STYLE}
+                            ),
+                        ], style={'display': 'flex', 'marginBottom': '10px'}),
                         html.Button(
-                            "Next Turn", id="next-turn", n_clicks=0,
-                            style={
-                                'marginLeft': '10px',
-                                'width': '15%',  
-                                'backgroundColor': '#28a745',
-                                'color': '#FFFFFF', 
-                                'border': 'none',
-                                **ROUNDED_STYLE
-                            }
-                        )
-                    ], style={'display': 'flex', 'alignItems': 'center'}),
-                    html.Br(),
-                    html.Div([
-                        html.H4("Notepad", style={'color': '#FFFFFF'}),
-                        dcc.Textarea(
-                            id="notepad", 
-                            placeholder="Write your notes here...", 
-                            value=initial_notes,
-                            style={
-                                'width': '100%', 
-                                'height': '100%',  
-                                'backgroundColor': '#333', 
-                                'color': '#fff', 
-                                'border': '1px solid #444',
-                                **ROUNDED_STYLE
-                            }
-                        )
-                    ], style={'flex': '1', 'marginBottom': '40px'})
-                ]
-            ),
-            html.Div(
-                style={
-                    'width': '35%', 
-                    'padding': '20px',
-                    'backgroundColor': '#2c2c2c',
-                    'borderLeft': '1px solid #444',
-                    'display': 'flex', 
-                    'flexDirection': 'column',
-                    **ROUNDED_STYLE
-                },
-                children=[
-                    html.H4("D&D Assistant", style={'color': '#FFFFFF', 'textAlign': 'center'}),
-                    html.Div([
-                        dcc.Dropdown(
-                            id='prompt-selector',
-                            options=[{'label': key, 'value': key} for key in SYSTEM_PROMPTS.keys()],
-                            value=DEFAULT_PROMPT,
-                            clearable=False,
-                            style={'width': '100%', 'marginBottom': '10px', 'color': 'black', **ROUNDED_STYLE}
+                            "Load earlier messages", id="chat-load-earlier", n_clicks=0,
+                            style={'display': 'none'}
                         ),
-                    ], style={'display': 'flex', 'marginBottom': '10px'}),
-                    html.Div(
-                        id="chat-display",
-                        style={
-                            'flex': '1', 
-                            'border': '1px solid #444',
-                            'padding': '10px', 
-                            'overflowY': 'scroll',
-                            'marginBottom': '10px',
-                            'backgroundColor': '#1a1a1a',
-                            **ROUNDED_STYLE
-                        }
-                    ),
-                    html.Div([
-                        dcc.Input(
-                            id="chat-input", type="text",
-                            placeholder="Ask a D&D question...", 
+                        html.Div(
+                            id="chat-display",
+                            children="No messages yet.",
                             style={
-                                'width': '70%', 
-                                'backgroundColor': '#333', 
-                                'color': '#FFFFFF', 
+                                'flex': '1', 
                                 'border': '1px solid #444',
-                                **ROUNDED_STYLE
-                            },
-                            n_submit=0
-                        ),
-                        html.Button(
-                            "Send", id="send-button", n_clicks=0,
-                            style={
-                                'width': '14%', 
-                                'marginLeft': '2%',
-                                'backgroundColor': '#0d6efd',
-                                'color': '#FFFFFF', 
-                                'border': 'none',
+                                'padding': '10px', 
+                                'overflowY': 'scroll',
+                                'marginBottom': '10px',
+                                'backgroundColor': '#1a1a1a',
                                 **ROUNDED_STYLE
                             }
                         ),
-                        html.Button(
-                            "Clear", id="clear-transcript-button", n_clicks=0,
-                            style={
-                                'width': '14%', 
-                                'marginLeft': '2%', 
-                                'backgroundColor': '#FFA500',
-                                'color': '#FFFFFF', 
-                                'border': 'none',
-                                **ROUNDED_STYLE
-                            }
-                        )
-                    ], style={'display': 'flex'})
-                ]
-            )
-        ]
-    )
-], style=GLOBAL_STYLE)
+                        html.Div([
+                            dcc.Input(
+                                id="chat-input", type="text",
+                                placeholder="Ask a D&D question...", 
+                                style={
+                                    'width': '70%', 
+                                    'backgroundColor': '#333', 
+                                    'color': '#FFFFFF', 
+                                    'border': '1px solid #444',
+                                    **ROUNDED_STYLE
+                                },
+                                n_submit=0
+                            ),
+                            html.Button(
+                                "Send", id="send-button", n_clicks=0,
+                                style={
+                                    'width': '14%', 
+                                    'marginLeft': '2%',
+                                    'backgroundColor': '#0d6efd',
+                                    'color': '#FFFFFF', 
+                                    'border': 'none',
+                                    **ROUNDED_STYLE
+                                }
+                            ),
+                            html.Button(
+                                "Clear", id="clear-transcript-button", n_clicks=0,
+                                style={
+                                    'width': '14%', 
+                                    'marginLeft': '2%', 
+                                    'backgroundColor': '#FFA500',
+                                    'color': '#FFFFFF', 
+                                    'border': 'none',
+                                    **ROUNDED_STYLE
+                                }
+                            )
+                        ], style={'display': 'flex'}),
+                        html.Details([
+                            html.Summary("Batch encounter generation", style={'cursor': 'pointer', 'color': '#888'}),
+                            html.Div([
+                                dcc.Input(
+                                    id="batch-request", type="text",
+                                    placeholder="e.g. orcs for the war camp to battle 4 players at level 3",
+                                    style={
+                                        'width': '62%',
+                                        'backgroundColor': '#333',
+                                        'color': '#FFFFFF',
+                                        'border': '1px solid #444',
+                                        **ROUNDED_STYLE
+                                    }
+                                ),
+                                dcc.Input(
+                                    id="batch-count", type="number", min=1, max=MAX_BATCH_SIZE, value=10,
+                                    style={
+                                        'width': '14%',
+                                        'marginLeft': '2%',
+                                        'backgroundColor': '#333',
+                                        'color': '#FFFFFF',
+                                        'border': '1px solid #444',
+                                        **ROUNDED_STYLE
+                                    }
+                                ),
+                                html.Button(
+                                    "Generate", id="batch-button", n_clicks=0,
+                                    style={
+                                        'width': '20%',
+                                        'marginLeft': '2%',
+                                        'backgroundColor': '#28a745',
+                                        'color': '#FFFFFF',
+                                        'border': 'none',
+                                        **ROUNDED_STYLE
+                                    }
+                                )
+                            ], style={'display': 'flex', 'marginTop': '5px'}),
+                            html.Div(id="batch-progress", style={'fontSize': '12px', 'marginTop': '5px'})
+                        ], style={'marginTop': '10px'}),
+                        html.Details([
+                            html.Summary("Monster library", style={'cursor': 'pointer', 'color': '#888'}),
+                            html.Div([
+                                dcc.Dropdown(id="library-type", placeholder="Any creature type",
+                                             style={'width': '50%', 'color': 'black', 'marginRight': '4px'}),
+                                dcc.Dropdown(id="library-rarity", placeholder="Any loot rarity",
+                                             style={'width': '50%', 'color': 'black'})
+                            ], style={'display': 'flex', 'marginTop': '5px'}),
+                            html.Div([
+                                dcc.Input(id="library-name", type="text", placeholder="Name", debounce=True,
+                                          style={**LIBRARY_INPUT_STYLE, 'width': '28%'}),
+                                dcc.Input(id="library-cr-min", type="text", placeholder="CR min", debounce=True,
+                                          style={**LIBRARY_INPUT_STYLE, 'width': '12%'}),
+                                dcc.Input(id="library-cr-max", type="text", placeholder="CR max", debounce=True,
+                                          style={**LIBRARY_INPUT_STYLE, 'width': '12%'}),
+                                dcc.Input(id="library-level", type="number", placeholder="Lvl", debounce=True,
+                                          style={**LIBRARY_INPUT_STYLE, 'width': '10%'}),
+                                dcc.Input(id="library-hp-min", type="number", placeholder="HP ≥", debounce=True,
+                                          style={**LIBRARY_INPUT_STYLE, 'width': '10%'}),
+                                dcc.Input(id="library-hp-max", type="number", placeholder="HP ≤", debounce=True,
+                                          style={**LIBRARY_INPUT_STYLE, 'width': '10%'}),
+                                dcc.Input(id="library-ac-min", type="number", placeholder="AC ≥", debounce=True,
+                                          style={**LIBRARY_INPUT_STYLE, 'width': '9%'}),
+                                dcc.Input(id="library-ac-max", type="number", placeholder="AC ≤", debounce=True,
+                                          style={**LIBRARY_INPUT_STYLE, 'width': '9%', 'marginRight': '0'})
+                            ], style={'display': 'flex', 'marginTop': '5px'}),
+                            html.Div(id="library-results", style={'fontSize': '12px', 'maxHeight': '250px',
+                                                                  'overflowY': 'auto', 'marginTop': '5px'})
+                        ], id="library-details", style={'marginTop': '10px'}),
+                        html.Details([
+                            html.Summary("Backend status", style={'cursor': 'pointer', 'color': '#888'}),
+                            html.Div(id="router-stats", style={'fontSize': '12px', 'maxHeight': '200px', 'overflowY': 'auto'})
+                        ], style={'marginTop': '10px'})
+                    ]
+                )
+            ]
+        )
+    ], style=GLOBAL_STYLE)
+
+app.layout = serve_layout
 
 @app.callback(
     Output("prompt-store", "data"),
@@ -317,137 +569,511 @@ def update_prompt_store(selected_prompt):
     return DEFAULT_PROMPT
 
 @app.callback(
-    Output("dice-result", "children"),
-    Input("roll-button", "n_clicks"),
-    State("dice-type", "value")
+    [Output("dice-result", "children"),
+     Output("dice-stats", "children")],
+    [Input("roll-button", "n_clicks"),
+     Input("dice-expression", "n_submit")],
+    [State("dice-type", "value"),
+     State("dice-expression", "value"),
+     State("dice-ac", "value")]
 )
-def roll_dice(n_clicks, dice_value):
-    if not n_clicks:
-        return ""
-    sides = int(dice_value[1:])
-    result = random.randint(1, sides)
-    return f"{result}"
+def roll_dice(n_clicks, n_submit, dice_value, expression_text, armor_class):
+    """Roll the typed dice expression, or the selected die, and show its exact average.
+
+    An attack such as '+6 1d8+4' (or a line pasted from a character's attacks) rolls to hit and
+    damage; with an AC set it also shows the hit chance and expected damage per attack.
+    """
+    if not n_clicks and not n_submit:
+        return "", ""
+    text = (expression_text or "").strip() or f"1{dice_value}"
+    attack = ATTACK_PATTERN.match(text)
+    try:
+        if attack is None:
+            expression = parse_dice(text)
+            total, breakdown = expression.roll()
+            distribution = expression.distribution()
+            return (f"{total}",
+                    f"{text}: {breakdown} · average {distribution.mean():.2f} "
+                    f"({distribution.min()}-{distribution.max()})")
+        bonus, damage = int(attack.group(2)), attack.group(3).replace(" ", "")
+        to_hit = random.randint(1, 20)
+        crit = to_hit == 20
+        expression = parse_dice(damage)
+        total, breakdown = expression.roll(crit=crit)
+        result = f"{to_hit + bonus} to hit{' (crit!)' if crit else ''}, {total} damage"
+        if armor_class is None:
+            return result, f"{text}: d20 {to_hit}, damage {breakdown}"
+        summary = attack_summary(bonus, expression, int(armor_class))
+        hit = to_hit == 20 or (to_hit != 1 and to_hit + bonus >= armor_class)
+        return (f"{result} · {'hit' if hit else 'miss'}",
+                f"vs AC {armor_class}: {summary['hit']:.0%} to hit, {summary['crit']:.0%} crit, "
+                f"{summary['average_damage']:.1f} average on a hit, "
+                f"{summary['expected_damage']:.2f} expected per attack")
+    except ValueError as e:
+        return "?", str(e)
+
+def render_effect(combat, effect):
+    remaining = combat.remaining(effect)
+    if effect.anchor is None:
+        timing = f"{remaining} turn(s) remaining"
+    else:
+        phase = "start" if effect.phase == PHASE_START else "end"
+        timing = (f"ends at the {phase} of {effect.anchor.name}'s turn" if remaining <= 0 else
+                  f"{remaining} of {effect.anchor.name}'s turn(s) remaining, ends at the {phase}")
+    return html.Div(
+        f"{effect.character}: {effect.name} – {timing}", 
+        style={'padding': '5px 0', 'borderBottom': '1px solid #444'}
+    )
+
+def render_effects(combat):
+    if not combat.effects:
+        return "No active effects."
+    return [render_effect(combat, effect) for effect in combat.effects.values()]
+
+def render_round(combat):
+    return html.Div(f"Round {combat.round}" if combat.round else "Initiative",
+                    style={'fontWeight': 'bold', 'paddingBottom': '5px'})
+
+def render_combatant(name, initiative, is_current):
+    return html.Div(
+        f"{'▶ ' if is_current else ''}{name} ({initiative})",
+        style={'padding': '2px 0', 'color': '#28a745' if is_current else '#FFFFFF'}
+    )
+
+def render_initiative(combat):
+    order = combat.initiative_order()
+    if not order:
+        return "Not in combat."
+    return [render_round(combat)] + [render_combatant(*entry) for entry in order]
 
 @app.callback(
-    Output("effects-store", "data"),
-    [Input("add-effect", "n_clicks"), Input("next-turn", "n_clicks")],
+    [Output("effects-display", "children"),
+     Output("initiative-display", "children"),
+     Output("effects-version", "data")],
+    [Input("add-effect", "n_clicks"),
+     Input("next-turn", "n_clicks"),
+     Input("add-combatant", "n_clicks"),
+     Input("end-combat", "n_clicks")],
     [State("effect-character", "value"),
      State("effect-name", "value"),
      State("effect-duration", "value"),
-     State("effects-store", "data")],
+     State("effect-initiative", "value"),
+     State("effect-phase", "value"),
+     State("session-id", "data"),
+     State("effects-version", "data")],
     prevent_initial_call=True
 )
-def update_effects(add_clicks, turn_clicks, character_name, effect_name, effect_duration, effects):
+def update_effects(add_clicks, turn_clicks, combatant_clicks, end_clicks, character_name, effect_name,
+                   effect_duration, initiative, phase, session_id, effects_version):
     ctx = callback_context
     if not ctx.triggered:
         raise dash.exceptions.PreventUpdate
     triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
+    session = session_store.get(session_id)
+    combat = session.combat
+    # The page shows exactly the server's effects and order, so only rows that change need sending
+    in_sync = effects_version == session.effects_version
+
     if triggered_id == "add-effect":
-        if effect_name and effect_duration:
-            effects.append({
-                "character": character_name or "Unknown",
-                "name": effect_name, 
-                "turns": int(effect_duration)
-            })
-    elif triggered_id == "next-turn":
-        updated_effects = []
-        for effect in effects:
-            new_turns = effect["turns"] - 1
-            if new_turns > 0:
-                updated_effects.append({
-                    "character": effect.get("character", "Unknown"),
-                    "name": effect["name"], 
-                    "turns": new_turns
-                })
-        effects = updated_effects
-    return effects
+        if not (effect_name and effect_duration):
+            raise dash.exceptions.PreventUpdate
+        had_effects = bool(combat.effects)
+        effect_id = combat.add_effect(effect_name, character_name or "Unknown", int(effect_duration), phase=phase)
+        session.combat_changed()
+        if in_sync and had_effects:
+            patch = Patch()
+            patch.append(render_effect(combat, combat.effects[effect_id]))
+            return patch, dash.no_update, session.effects_version
+        return render_effects(combat), render_initiative(combat), session.effects_version
 
-@app.callback(
-    Output("effects-display", "children"),
-    Input("effects-store", "data")
-)
-def update_effects_display(effects):
-    if not effects:
-        return "No active effects."
-    return [
-        html.Div(
-            f"{effect.get('character', 'Unknown')}: {effect['name']} – {effect['turns']} turn(s) remaining", 
-            style={'padding': '5px 0', 'borderBottom': '1px solid #444'}
-        )
-        for effect in effects
-    ]
+    if triggered_id == "add-combatant":
+        if not character_name or initiative is None:
+            raise dash.exceptions.PreventUpdate
+        combat.add_combatant(character_name, int(initiative))
+        session.combat_changed()
+        return render_effects(combat), render_initiative(combat), session.effects_version
+
+    if triggered_id == "end-combat":
+        combat.end_combat()
+        session.combat_changed()
+        return render_effects(combat), render_initiative(combat), session.effects_version
+
+    if triggered_id == "next-turn":
+        positions = {effect_id: index for index, effect_id in enumerate(combat.effects)}
+        previous = combat.current
+        expired, changed = combat.next_turn()
+        session.combat_changed()
+        if not in_sync or not combat.effects or not positions:
+            effects_children = render_effects(combat)
+        else:
+            effects_children = Patch()
+            for index in sorted((positions[effect.effect_id] for effect in expired), reverse=True):
+                del effects_children[index]
+            for index, effect_id in enumerate(combat.effects):
+                if effect_id in changed:
+                    effects_children[index] = render_effect(combat, combat.effects[effect_id])
+        if combat.current is None:
+            initiative_children = dash.no_update
+        elif not in_sync or previous is None:
+            initiative_children = render_initiative(combat)
+        else:
+            # Only the round header and the rows gaining and losing the turn marker change
+            order = combat.initiative_order()
+            initiative_children = Patch()
+            initiative_children[0] = render_round(combat)
+            for index in {previous, combat.current}:
+                initiative_children[index + 1] = render_combatant(*order[index])
+        return effects_children, initiative_children, session.effects_version
+    raise dash.exceptions.PreventUpdate
+
+def stream_response(stream_id, user_msg, context, selected_prompt):
+    """Consume the chat client's token stream into ACTIVE_STREAMS, then persist the finished exchange.
+
+    The clients report a failure as a final 'Error: ...' token; it is shown in the chat but not cached,
+    recorded as a turn or saved as an encounter. The stream is marked done however it ends.
+    """
+    stream = ACTIVE_STREAMS[stream_id]
+    tokens = stream["tokens"]
+    try:
+        system_prompt = SYSTEM_PROMPTS[selected_prompt]
+        last_token = ""
+        served = {}
+        for token in chat_client.stream_input(user_msg, context=context, system_prompt=system_prompt,
+                                              served=served):
+            with STREAM_LOCK:
+                tokens.append(token)
+            last_token = token
+        if last_token.startswith("Error:"):
+            return
+        response = "".join(tokens)
+
+        if cached_client is not None and selected_prompt in CACHEABLE_PROMPTS:
+            cached_client.store(user_msg, selected_prompt, context, response, served.get("model_id"))
+
+        context_builder.record_turn(user_msg, response)
+
+        if selected_prompt == ENCOUNTER_PROMPT:
+            note, data = save_generated_encounter(response)
+            with STREAM_LOCK:
+                tokens.append(f"\n[{note}]")
+            if data is not None and ENCOUNTER_SIM_FIGHTS:
+                with STREAM_LOCK:
+                    stream["pending"] = True
+                threading.Thread(target=simulate_saved_encounter, args=(stream, data), daemon=True).start()
+    except Exception as e:
+        print(f"Stream {stream_id} failed: {e}")
+        with STREAM_LOCK:
+            tokens.append(f"\nError: {e}")
+    finally:
+        with STREAM_LOCK:
+            stream["done"] = True
+            stream["finished"] = time.monotonic()
+
+def evict_streams(stream_ids=()):
+    """Drop the given streams, and finished ones no page has collected within STREAM_ORPHAN_SECONDS.
+
+    A stream's thread keeps its own reference, so dropping one that is still running is safe.
+    """
+    now = time.monotonic()
+    with STREAM_LOCK:
+        for stream_id in stream_ids:
+            ACTIVE_STREAMS.pop(stream_id, None)
+        for stream_id in [stream_id for stream_id, stream in ACTIVE_STREAMS.items() if stream["done"] and
+                          not stream["pending"] and now - stream["finished"] > STREAM_ORPHAN_SECONDS]:
+            del ACTIVE_STREAMS[stream_id]
+
+def evict_batches():
+    """Drop the batches of sessions that finished more than BATCH_KEEP_SECONDS ago; running ones are kept."""
+    now = time.monotonic()
+    for session_id, (_, batch) in list(BATCHES.items()):
+        if batch.finished_at is not None and now - batch.finished_at > BATCH_KEEP_SECONDS:
+            BATCHES.pop(session_id, None)
+
+def poll_streams(session):
+    """Copy streamed tokens into the session's pending messages.
+
+    A message stops loading when its reply is complete, but stays linked to its stream while a note
+    is still to be attached. Returns the indexes of the messages that changed and whether any are
+    still streaming.
+    """
+    changed = []
+    streaming = False
+    for index, msg in enumerate(session.chat):
+        stream_id = msg.get("stream_id")
+        if not stream_id:
+            continue
+        with STREAM_LOCK:
+            stream = ACTIVE_STREAMS.get(stream_id)
+            text = "".join(stream["tokens"]) if stream is not None else msg["message"]
+            replied = stream is None or stream["done"]
+            done = replied and (stream is None or not stream["pending"])
+            if stream is not None and done:
+                ACTIVE_STREAMS.pop(stream_id)
+        if done:
+            session.update_message(index, message=text, stream_id=None, is_loading=None)
+        elif text != msg["message"] or (replied and msg.get("is_loading")):
+            session.update_message(index, message=text, is_loading=None if replied else True)
+        else:
+            streaming = True
+            continue
+        changed.append(index)
+        streaming = streaming or not done
+    evict_streams()
+    return changed, streaming
+
+def render_chat(session):
+    """Render the latest window of a session's chat and remember where it starts."""
+    session.display_start = window_start(len(session.chat))
+    return render_window(session.chat, session.display_start)
+
+def load_earlier_style(session):
+    return LOAD_EARLIER_STYLE if session.display_start > 0 else {'display': 'none'}
 
 @app.callback(
-    Output("chat-store", "data"),
+    [Output("chat-display", "children"),
+     Output("chat-version", "data"),
+     Output("stream-interval", "disabled"),
+     Output("chat-load-earlier", "style")],
     [Input("send-button", "n_clicks"),
      Input("chat-input", "n_submit"),
-     Input("clear-transcript-button", "n_clicks")],
+     Input("clear-transcript-button", "n_clicks"),
+     Input("stream-interval", "n_intervals"),
+     Input("chat-load-earlier", "n_clicks")],
     [State("chat-input", "value"), 
-     State("chat-store", "data"),
+     State("session-id", "data"),
+     State("chat-version", "data"),
      State("prompt-store", "data")],
     prevent_initial_call=True
 )
-def update_or_clear_chat(n_send, n_submit, n_clear_transcript, user_msg, chat_history, selected_prompt):
+def update_or_clear_chat(n_send, n_submit, n_clear_transcript, n_intervals, n_load_earlier, user_msg, session_id,
+                         chat_version, selected_prompt):
     ctx = callback_context
     if not ctx.triggered:
         raise dash.exceptions.PreventUpdate
     trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+    session = session_store.get(session_id)
+    # The page shows exactly the server's history, so only the difference needs sending
+    in_sync = chat_version == session.chat_version and bool(session.chat)
     
     if trigger_id == "clear-transcript-button":
         handle_transcripts()
-        return []
+        evict_streams([msg["stream_id"] for msg in session.chat if msg.get("stream_id")])
+        session.clear_chat()
+        return render_chat(session), session.chat_version, True, load_earlier_style(session)
+
+    if trigger_id == "chat-load-earlier":
+        if not in_sync:
+            return render_chat(session), session.chat_version, dash.no_update, load_earlier_style(session)
+        patch, session.display_start = prepend_page(session.chat, session.display_start)
+        return patch, dash.no_update, dash.no_update, load_earlier_style(session)
+
+    if trigger_id == "stream-interval":
+        changed, streaming = poll_streams(session)
+        if not changed:
+            return dash.no_update, dash.no_update, not streaming, dash.no_update
+        if not in_sync:
+            return render_chat(session), session.chat_version, not streaming, load_earlier_style(session)
+        patch = Patch()
+        for index in changed:
+            if index >= session.display_start:
+                patch[index - session.display_start] = render_message(session.chat[index])
+        return patch, session.chat_version, not streaming, dash.no_update
     
     if user_msg:
-        chat_history.append({"sender": "DM", "message": user_msg})
-        chat_history.append({"sender": "DM Assist", "message": "Thinking...", "is_loading": True})
-        
-        with open("notes.txt", "r", encoding="utf-8") as notes_file:
-            notes_content = notes_file.read()
-        
-        with open("dm_assistant_transcripts.txt", "r", encoding="utf-8") as transcripts_file:
-            transcripts_content = transcripts_file.read()
-        
-        context = notes_content + "\n" + transcripts_content
-
-        if USE_OLLAMA:
-            chat_client.set_system_prompt(SYSTEM_PROMPTS[selected_prompt])
-        else:
-            chat_client.set_system_prompt(SYSTEM_PROMPTS[selected_prompt])
-            
-        response = chat_client.send_input(user_msg, context=context)
+        context, _ = context_builder.build(chat_client.current_model_id(), query=user_msg)
+
+        messages = None
+        streaming = dash.no_update
+        if cached_client is not None and selected_prompt in CACHEABLE_PROMPTS:
+            cached = cached_client.lookup(user_msg, selected_prompt, context)
+            if cached is not None:
+                context_builder.record_turn(user_msg, cached)
+                messages = [{"sender": "DM", "message": user_msg},
+                            {"sender": "DM Assist", "message": cached, "cached": True}]
 
-        if 'json' in response:
-            save_cleaned_json(response)
+        if messages is None:
+            stream_id = uuid.uuid4().hex
+            with STREAM_LOCK:
+                ACTIVE_STREAMS[stream_id] = {"tokens": [], "done": False, "pending": False}
+            threading.Thread(target=stream_response, args=(stream_id, user_msg, context, selected_prompt),
+                             daemon=True).start()
+            messages = [{"sender": "DM", "message": user_msg},
+                        {"sender": "DM Assist", "message": "", "is_loading": True, "stream_id": stream_id}]
+            streaming = False
 
-        chat_history[-1] = {"sender": "DM Assist", "message": response}
-        with open("dm_assistant_transcripts.txt", "a", encoding="utf-8") as f:
-            f.write("User: " + user_msg + "\n")
-            f.write("DM Assist: " + response + "\n")
-    return chat_history
+        session.append_messages(*messages)
+        if not in_sync:
+            return render_chat(session), session.chat_version, streaming, load_earlier_style(session)
+        patch = Patch()
+        for msg in messages:
+            patch.append(render_message(msg))
+        return patch, session.chat_version, streaming, dash.no_update
+    raise dash.exceptions.PreventUpdate
 
 @app.callback(
-    Output("chat-display", "children"),
-    Input("chat-store", "data")
+    Output("router-stats", "children"),
+    Input("router-interval", "n_intervals")
 )
-def update_chat_display(chat_history):
-    if not chat_history:
-        return "No messages yet."
-    
-    chat_elements = []
-    for msg in chat_history:
-        style = {'margin': '5px 0', 'borderBottom': '1px solid #444'}
-        if msg.get("is_loading", False):
-            message_content = html.Div([
-                html.I(className="fas fa-spinner fa-spin", style={'marginRight': '10px', 'color': '#888'}),
-                html.Span("Thinking...", style={'color': '#888', 'fontStyle': 'italic'})
-            ])
-            chat_elements.append(html.Div([
-                html.Span(f"{msg['sender']}: ", style={'marginRight': '5px'}),
-                message_content
-            ], style=style))
-        else:
-            chat_elements.append(html.Div(f"{msg['sender']}: {msg['message']}", style=style))
-    return chat_elements
+def update_router_stats(n_intervals):
+    router = getattr(chat_client, "router", None)
+    request_stats = render_request_stats()
+    if router is None:
+        # The panel polls while any browser has the assistant open, which counts as an active session
+        backend_client.mark_active()
+        stats = backend_client.stats()
+        waits = stats["wait_seconds"]
+        timings = backend_client.timing_stats()
+        return [
+            html.Div(f"Ollama queue: {stats['queued']} waiting, {stats['running']}/{stats['max_concurrent']} running, "
+                     f"{stats['completed']} completed, {stats['coalesced']} coalesced"),
+            html.Div([html.Div(f"Priority {priority} wait: avg {wait['avg']}s, max {wait['max']}s")
+                      for priority, wait in waits.items() if wait['avg'] is not None], style={'color': '#888'}),
+            html.Div("Time to first token: " + ", ".join(
+                f"{kind} {timing['avg']}s ({timing['count']})" if timing['avg'] is not None else f"{kind} -"
+                for kind, timing in timings.items()
+            ), style={'color': '#888'})
+        ] + request_stats
+    rows, decisions = router.snapshot()
+    cell_style = {'padding': '2px 6px', 'borderBottom': '1px solid #444'}
+    header = html.Tr([html.Th(col, style=cell_style) for col in ["Model", "Calls", "p50 s", "p95 s", "Errors", "Healthy"]])
+    body = [
+        html.Tr([
+            html.Td(row["model"], style=cell_style),
+            html.Td(row["calls"], style=cell_style),
+            html.Td(row["p50"] if row["p50"] is not None else "-", style=cell_style),
+            html.Td(row["p95"] if row["p95"] is not None else "-", style=cell_style),
+            html.Td(f"{row['error_rate']:.0%}", style=cell_style),
+            html.Td("yes" if row["healthy"] else "no", style=cell_style)
+        ])
+        for row in rows
+    ]
+    return [
+        html.Div(f"Next request: {chat_client.current_model_id() or 'no model available'}"),
+        html.Table([header] + body, style={'width': '100%'}),
+        html.Div([html.Div(f"{d['time']} {d['model']}: {d['reason']}") for d in reversed(decisions)],
+                 style={'marginTop': '5px', 'color': '#888'})
+    ] + request_stats
+
+def render_request_stats():
+    """Stats panel lines for the context of the last chat message, the response cache and encounter replies."""
+    lines = []
+    report = context_builder.last_report
+    if report:
+        lines.append(html.Div(f"Last context: {report['total']}/{report['budget']} tokens (notes {report['notes']}, "
+                              f"retrieved {report['retrieved']}, summary {report['summary']}, "
+                              f"recent {report['recent_turns']} from {report['turns_included']} turns)",
+                              style={'marginTop': '5px', 'color': '#888'}))
+    if cached_client is not None:
+        stats = cached_client.cache.stats()
+        lines.append(html.Div(f"Response cache: {stats['hits']} hits, {stats['misses']} misses "
+                              f"({stats['hit_rate']:.0%}), {stats['entries']} entries", style={'color': '#888'}))
+    stats = encounter_pipeline.stats()
+    if stats["clean"] + stats["repaired"] + stats["reasked"] + stats["failed"]:
+        lines.append(html.Div(f"Encounter replies: {stats['clean']} clean, {stats['repaired']} repaired, "
+                              f"{stats['reasked']} re-asked, {stats['failed']} failed "
+                              f"({stats['llm_calls_saved']} LLM calls saved)", style={'color': '#888'}))
+    return lines
+
+def send_bulk(prompt):
+    """Send one batch generation request; on Ollama it queues behind interactive chat."""
+    system_prompt = SYSTEM_PROMPTS[ENCOUNTER_PROMPT]
+    if USE_OLLAMA:
+        return backend_client.send_input(prompt, system_prompt=system_prompt, priority=PRIORITY_BULK)
+    return chat_client.send_input(prompt, system_prompt=system_prompt)
+
+@app.callback(
+    [Output("batch-store", "data"),
+     Output("batch-interval", "disabled"),
+     Output("batch-progress", "children")],
+    [Input("batch-button", "n_clicks"),
+     Input("batch-interval", "n_intervals")],
+    [State("batch-request", "value"),
+     State("batch-count", "value"),
+     State("batch-store", "data"),
+     State("session-id", "data")],
+    prevent_initial_call=True
+)
+def update_batch(n_clicks, n_intervals, request, count, batch_id, session_id):
+    ctx = callback_context
+    if not ctx.triggered:
+        raise dash.exceptions.PreventUpdate
+    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+
+    if trigger_id == "batch-button":
+        _, batch = BATCHES.get(session_id, (None, None))
+        if batch is not None and not batch.progress()["done"]:
+            raise dash.exceptions.PreventUpdate
+        if not request or not count:
+            return batch_id, True, "Enter a request and how many creatures to generate."
+        evict_batches()
+        batch_id = uuid.uuid4().hex
+        batch = EncounterBatch(request, count, send_bulk, pipeline=encounter_pipeline,
+                               max_workers=BATCH_MAX_WORKERS, library=monster_library)
+        BATCHES[session_id] = (batch_id, batch)
+        batch.start()
+
+    current_id, batch = BATCHES.get(session_id, (None, None))
+    if batch is None or current_id != batch_id:
+        return None, True, ""
+    progress = batch.progress()
+    finished = progress["saved"] + progress["failed"]
+    status = "Done" if progress["done"] else "Generating"
+    return batch_id, progress["done"], [
+        dbc.Progress(value=finished, max=progress["count"], label=f"{finished}/{progress['count']}",
+                     style={'marginBottom': '5px'}),
+        html.Div(f"{status}: {progress['saved']} saved, {progress['failed']} failed, "
+                 f"{progress['per_minute']} creatures/min over {progress['elapsed']}s"),
+        html.Div([html.Div(os.path.basename(path)) for path in progress["paths"]], style={'color': '#888'}),
+        html.Div([html.Div(error) for error in progress["errors"]], style={'color': '#dc3545'})
+    ]
+
+@app.callback(
+    [Output("library-results", "children"),
+     Output("library-type", "options"),
+     Output("library-rarity", "options")],
+    [Input("library-details", "open"),
+     Input("library-type", "value"),
+     Input("library-rarity", "value"),
+     Input("library-name", "value"),
+     Input("library-cr-min", "value"),
+     Input("library-cr-max", "value"),
+     Input("library-level", "value"),
+     Input("library-hp-min", "value"),
+     Input("library-hp-max", "value"),
+     Input("library-ac-min", "value"),
+     Input("library-ac-max", "value"),
+     Input("batch-interval", "disabled")],
+    prevent_initial_call=True
+)
+def search_monster_library(is_open, creature_type, rarity, name, cr_min, cr_max, level, hp_min, hp_max,
+                           ac_min, ac_max, batch_idle):
+    if not is_open:
+        raise dash.exceptions.PreventUpdate
+    monster_library.refresh()
+    total, rows = monster_library.search(creature_type=creature_type, name=name, cr_min=cr_min, cr_max=cr_max,
+                                         level=level, hp_min=hp_min, hp_max=hp_max, ac_min=ac_min,
+                                         ac_max=ac_max, rarity=rarity)
+    types, rarities = monster_library.facets()
+    cell_style = {'padding': '2px 6px', 'borderBottom': '1px solid #444'}
+    header = html.Tr([html.Th(col, style=cell_style) for col in ["Name", "Type", "CR", "Lvl", "HP", "AC", "Qty"]])
+    body = [
+        html.Tr([
+            html.Td(row["creature_name"], title=row["filename"], style=cell_style),
+            html.Td(row["creature_type"], style=cell_style),
+            html.Td(f"{row['challenge_rating']:g}" if row["challenge_rating"] is not None else "-", style=cell_style),
+            html.Td(row["target_player_level"] if row["target_player_level"] is not None else "-", style=cell_style),
+            html.Td(row["hit_points"] if row["hit_points"] is not None else "-", style=cell_style),
+            html.Td(row["armor_class"] if row["armor_class"] is not None else "-", style=cell_style),
+            html.Td(row["quantity"] if row["quantity"] is not None else "-", style=cell_style)
+        ])
+        for row in rows
+    ]
+    results = [
+        html.Div(f"{total} match(es)" + (f", showing {len(rows)}" if total > len(rows) else ""),
+                 style={'color': '#888'}),
+        html.Table([header] + body, style={'width': '100%'})
+    ]
+    return results, [{'label': t, 'value': t} for t in types], [{'label': r, 'value': r} for r in rarities]
 
 @app.callback(
     Output("chat-input", "value"),
@@ -457,43 +1083,70 @@ def update_chat_display(chat_history):
 def clear_input(n_clicks, n_submit):
     return ""
 
+# Debounced in the browser (assets/notepad.js) so the notes only travel once typing pauses
+app.clientside_callback(
+    ClientsideFunction(namespace="notepad", function_name="debounceSave"),
+    Output("notes-draft", "data"),
+    [Input("notepad", "value"), Input("notepad", "n_blur")],
+    State("notepad-save-delay", "data"),
+    prevent_initial_call=True
+)
+
 @app.callback(
-    Output("notepad", "value"),
-    Input("notepad-interval", "n_intervals"),
-    State("notepad", "value"),
+    Output("notepad-status", "children"),
+    Input("notes-draft", "data"),
     prevent_initial_call=True
 )
-def autosave_notepad(n_intervals, note_text):
+def save_notepad(note_text):
     if note_text is None:
-        note_text = ""
-    with open("notes.txt", "w", encoding="utf-8") as f:
-        f.write(note_text)
-    return note_text
+        raise dash.exceptions.PreventUpdate
+    if not context_builder.save_notes(note_text):
+        return dash.no_update
+    return f"Saved {time.strftime('%H:%M:%S')}"
 
 def handle_transcripts():
-    if not os.path.exists("dm_assistant_transcripts.txt"):
-        with open("dm_assistant_transcripts.txt", "w", encoding="utf-8") as f:
-            f.write("")
-    else:
-        with open("dm_assistant_transcripts.txt", "r", encoding="utf-8") as transcripts_file:
-            transcripts_content = transcripts_file.read()
-        with open("dm_assistant_transcripts.old", "a", encoding="utf-8") as old_transcripts_file:
-            old_transcripts_file.write(transcripts_content)
-    
-        with open("dm_assistant_transcripts.txt", "w", encoding="utf-8") as transcripts_file:
-            transcripts_file.write("")
-
-def save_cleaned_json(data):
-    cleaned = data.strip('```json').strip('```')
-    data = json.loads(cleaned)
-    race = data["creature_type"].lower().replace(" ", "_")
-    level = data["target_player_level"]
-    name = data["creature_name"].lower().replace(" ", "_").replace(".", "").replace(",", "")
-    filename = f"{race}_{level}_{name}.json"
-    os.makedirs("generated_characters", exist_ok=True)
-    path = os.path.join("generated_characters", filename)
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
+    session = transcript_store.rotate()
+    print(f"Transcript session {session} started.")
+    context_builder.reset()
+
+def save_generated_encounter(response):
+    """Validate an encounter reply, re-asking the model once if it cannot be repaired, and save it.
+
+    Returns (a short status note for the chat panel, the saved encounter or None).
+    """
+    def reask(message):
+        return chat_client.send_input(message, context=response, system_prompt=SYSTEM_PROMPTS[ENCOUNTER_PROMPT])
+
+    try:
+        data, errors = encounter_pipeline.process(response, reask=reask)
+        if errors:
+            return "Encounter not saved: " + "; ".join(errors), None
+        return f"Saved {save_encounter(data)}", data
+    except Exception as e:
+        return f"Encounter not saved: {e}", None
+
+def simulate_saved_encounter(stream, data):
+    """Simulate a saved encounter against the party and attach the difficulty to its finished chat stream.
+
+    The party comes from PARTY_DIR, or from the campaign store when CAMPAIGN_PATH is set. Runs on its
+    own thread once the reply is complete, so the chat never waits on the simulation.
+    """
+    note = None
+    try:
+        if campaign_store is not None:
+            party = list(campaign_store.load_party().values())
+        else:
+            party = load_party(PARTY_DIR)
+        if party:
+            note = describe(simulate_encounter(data, party, fights=ENCOUNTER_SIM_FIGHTS), data)
+    except Exception as e:
+        note = f"Difficulty not simulated: {e}"
+    finally:
+        with STREAM_LOCK:
+            if note:
+                stream["tokens"].append(f"\n[{note}]")
+            stream["pending"] = False
+            stream["finished"] = time.monotonic()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,121 @@
+import json
+import re
+import threading
+import time
+from atomic_file import write_json_atomic
+
+CATALOGUE_CACHE_PATH = "openrouter_models.json"
+CATALOGUE_TTL_SECONDS = 6 * 3600
+SIZE_PATTERN = re.compile(r'(\d+(\.\d+)?)\s*(B|billion)\s*(parameter|params|param)?', re.IGNORECASE)
+
+
+def extract_size(description):
+    """Extract model size in billions from description (e.g., '671B parameters')."""
+    match = SIZE_PATTERN.search(description or "")
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def parse_free_models(models):
+    """Reduce the OpenRouter /models payload to free models with name, id and size, largest first."""
+    free_models = []
+    for model in models:
+        pricing = model.get("pricing", {})
+        if pricing.get("prompt") != "0" or pricing.get("completion") != "0":
+            continue
+        free_models.append({
+            "name": model["name"],
+            "id": model["id"],
+            "size": extract_size(model.get("description")),
+            "free": True
+        })
+    # Largest first, models of unknown size last
+    free_models.sort(key=lambda m: (m["size"] is None, -(m["size"] or 0)))
+    return free_models
+
+
+class ModelCatalogue:
+    def __init__(self, fetch, cache_path=CATALOGUE_CACHE_PATH, ttl_seconds=CATALOGUE_TTL_SECONDS):
+        """Free model list served from a disk cache and revalidated in the background.
+
+        fetch(headers) must perform GET /models with the extra request headers and return the response.
+        The last known catalogue is available immediately; a stale one is refreshed with an
+        If-None-Match / If-Modified-Since request so an unchanged catalogue costs a 304 and no parsing.
+        """
+        self.fetch = fetch
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self.models = []
+        self.fetched_at = 0
+        self.etag = None
+        self.last_modified = None
+        self.lock = threading.Lock()
+        self.refreshing = None
+        self.loaded = threading.Event()
+        self._load_cache()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.models = cached.get("models", [])
+        self.fetched_at = cached.get("fetched_at", 0)
+        self.etag = cached.get("etag")
+        self.last_modified = cached.get("last_modified")
+        if self.models:
+            self.loaded.set()
+
+    def _save_cache(self):
+        write_json_atomic(self.cache_path, {
+            "fetched_at": self.fetched_at,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "models": self.models
+        }, indent=None)
+
+    def is_stale(self):
+        """Return True if the catalogue is older than the TTL."""
+        return time.time() - self.fetched_at > self.ttl_seconds
+
+    def refresh(self):
+        """Revalidate the catalogue against OpenRouter now, keeping the last known list on failure."""
+        headers = {}
+        if self.models and self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.models and self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        try:
+            response = self.fetch(headers)
+            if response.status_code == 304:
+                print("Model catalogue unchanged.")
+            else:
+                models = parse_free_models(response.json().get("data", []))
+                with self.lock:
+                    self.models = models
+                    self.etag = response.headers.get("ETag")
+                    self.last_modified = response.headers.get("Last-Modified")
+                print(f"Model catalogue refreshed with {len(models)} free models.")
+            self.fetched_at = time.time()
+            self._save_cache()
+        except Exception as e:
+            print(f"Failed to fetch models: {e}")
+        finally:
+            self.loaded.set()
+        return self.models
+
+    def refresh_async(self, force=False):
+        """Start a background refresh if the catalogue is stale and no refresh is already running."""
+        with self.lock:
+            if self.refreshing is not None and self.refreshing.is_alive():
+                return
+            if not force and not self.is_stale():
+                return
+            self.refreshing = threading.Thread(target=self.refresh, daemon=True)
+            self.refreshing.start()
+
+    def wait(self, timeout=None):
+        """Block until a catalogue is available (from disk or a finished fetch) or the timeout passes."""
+        return self.loaded.wait(timeout)
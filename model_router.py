@@ -0,0 +1,205 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+STATS_WINDOW = 50  # most recent calls kept per model for percentiles and error rate
+MAX_ERROR_RATE = 0.5
+FAILURE_COOLDOWN = 120  # seconds a model sits out after consecutive failures
+COOLDOWN_AFTER_FAILURES = 2
+EXPLORE_RATE = 0.05  # share of requests that try an untested model first so its latency gets measured
+MAX_CANDIDATES = 3
+ROUTING_DEADLINE = 90  # seconds across all failover attempts for one request
+DECISION_LOG_SIZE = 20
+
+
+def percentile(sorted_values, fraction):
+    """Return the value at the given fraction of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ModelStats:
+    def __init__(self, window=STATS_WINDOW):
+        """Rolling latency and error statistics for one model id."""
+        self.calls = deque(maxlen=window)  # (latency seconds, ok)
+        self.consecutive_failures = 0
+        self.last_failure = 0.0
+
+    def record(self, latency, ok):
+        self.calls.append((latency, ok))
+        if ok:
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+            self.last_failure = time.time()
+
+    def latencies(self):
+        return sorted(latency for latency, ok in self.calls if ok)
+
+    def error_rate(self):
+        if not self.calls:
+            return 0.0
+        return sum(1 for _, ok in self.calls if not ok) / len(self.calls)
+
+    def healthy(self, now=None):
+        """A model is unhealthy while cooling down after repeated failures or when most recent calls failed."""
+        now = time.time() if now is None else now
+        if self.consecutive_failures >= COOLDOWN_AFTER_FAILURES and now - self.last_failure < FAILURE_COOLDOWN:
+            return False
+        return self.error_rate() <= MAX_ERROR_RATE or now - self.last_failure >= FAILURE_COOLDOWN
+
+
+class ModelRouter:
+    def __init__(self, min_size=None, deadline=ROUTING_DEADLINE, hedge=False, max_candidates=MAX_CANDIDATES):
+        """Pick the fastest healthy free model that meets a minimum size, failing over within a deadline.
+
+        Latency is measured until a response starts arriving: the full call for send_input and the first
+        token for streams. With hedge set, non-streaming calls race the top two candidates and keep the
+        first success.
+        """
+        self.min_size = min_size
+        self.deadline = deadline
+        self.hedge = hedge
+        self.max_candidates = max_candidates
+        self.stats = {}
+        self.decisions = deque(maxlen=DECISION_LOG_SIZE)
+        self.lock = threading.Lock()
+
+    def _stats_for(self, model_id):
+        if model_id not in self.stats:
+            self.stats[model_id] = ModelStats()
+        return self.stats[model_id]
+
+    def record(self, model_id, latency, ok):
+        """Record the outcome of one call to a model."""
+        with self.lock:
+            self._stats_for(model_id).record(latency, ok)
+
+    def rank(self, models, explore=True):
+        """Order model dicts (largest first, as in the catalogue) by preference and return their ids.
+
+        Healthy models with measurements come first by p50 latency, then untested models by size,
+        then unhealthy ones as a last resort. With explore set, an untested model is occasionally
+        moved to the front so its latency gets measured.
+        """
+        eligible = [m for m in models if self.min_size is None or (m["size"] or 0) >= self.min_size]
+        now = time.time()
+        measured, untested, unhealthy = [], [], []
+        with self.lock:
+            for model in eligible:
+                stats = self.stats.get(model["id"])
+                if stats is not None and not stats.healthy(now):
+                    unhealthy.append(model["id"])
+                elif stats is None or not stats.latencies():
+                    untested.append(model["id"])
+                else:
+                    measured.append((percentile(stats.latencies(), 0.5), model["id"]))
+        measured.sort()
+        ranked = [model_id for _, model_id in measured] + untested + unhealthy
+        if explore and untested and measured and random.random() < EXPLORE_RATE:
+            ranked.remove(untested[0])
+            ranked.insert(0, untested[0])
+        return ranked
+
+    def choose(self, models):
+        """Return the candidate model ids to try for one request, best first."""
+        candidates = self.rank(models)[:self.max_candidates]
+        if candidates:
+            self.log_decision(candidates[0], f"ranked first of {len(candidates)} candidates")
+        return candidates
+
+    def log_decision(self, model_id, reason):
+        """Append an entry to the routing decision log shown in the UI."""
+        with self.lock:
+            self.decisions.append({"time": time.strftime("%H:%M:%S"), "model": model_id, "reason": reason})
+
+    def _attempt(self, call, model_id, timeout):
+        start = time.monotonic()
+        try:
+            result = call(model_id, timeout)
+        except Exception:
+            self.record(model_id, time.monotonic() - start, False)
+            raise
+        self.record(model_id, time.monotonic() - start, True)
+        return result
+
+    def _race(self, call, model_ids, timeout):
+        """Run call against several models at once and return (model_id, result) of the first success."""
+        results = queue.Queue()
+
+        def run(model_id):
+            try:
+                results.put((model_id, self._attempt(call, model_id, timeout), None))
+            except Exception as e:
+                results.put((model_id, None, e))
+
+        for model_id in model_ids:
+            threading.Thread(target=run, args=(model_id,), daemon=True).start()
+        last_error = None
+        for _ in model_ids:
+            try:
+                model_id, result, error = results.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if error is None:
+                return model_id, result
+            last_error = error
+        raise last_error or TimeoutError("hedged request timed out")
+
+    def call(self, models, call):
+        """Call call(model_id, timeout) on candidates in order until one succeeds or the deadline passes."""
+        candidates = self.choose(models)
+        if not candidates:
+            raise RuntimeError("No free models meet the routing requirements")
+        end = time.monotonic() + self.deadline
+        last_error = None
+        index = 0
+        while index < len(candidates):
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            if self.hedge and index == 0 and len(candidates) > 1:
+                batch = candidates[:2]
+            else:
+                batch = candidates[index:index + 1]
+            try:
+                if len(batch) > 1:
+                    model_id, result = self._race(call, batch, remaining)
+                    self.log_decision(model_id, f"won hedged race against {batch[1] if model_id == batch[0] else batch[0]}")
+                else:
+                    model_id, result = batch[0], self._attempt(call, batch[0], remaining)
+                return model_id, result
+            except Exception as e:
+                last_error = e
+                index += len(batch)
+                if index < len(candidates):
+                    self.log_decision(candidates[index], f"failover after error: {e}")
+        raise last_error or TimeoutError("routing deadline exceeded")
+
+    def remaining_time(self, start):
+        """Seconds left of the routing deadline for a request that started at the given monotonic time."""
+        return self.deadline - (time.monotonic() - start)
+
+    def snapshot(self):
+        """Return per-model stats rows (for display) and the recent routing decisions."""
+        rows = []
+        with self.lock:
+            for model_id, stats in self.stats.items():
+                latencies = stats.latencies()
+                p50 = percentile(latencies, 0.5)
+                p95 = percentile(latencies, 0.95)
+                rows.append({
+                    "model": model_id,
+                    "calls": len(stats.calls),
+                    "p50": round(p50, 2) if p50 is not None else None,
+                    "p95": round(p95, 2) if p95 is not None else None,
+                    "error_rate": round(stats.error_rate(), 2),
+                    "healthy": stats.healthy(),
+                })
+            decisions = list(self.decisions)
+        rows.sort(key=lambda row: (not row["healthy"], row["p50"] if row["p50"] is not None else float("inf")))
+        return rows, decisions
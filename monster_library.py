@@ -0,0 +1,251 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from encounter_json import GENERATED_DIR
+
+DEFAULT_LIBRARY_PATH = "monster_library.sqlite3"
+DEFAULT_LIMIT = 50
+REFRESH_INTERVAL = 2.0  # seconds between directory scans when searches arrive back to back
+SORT_COLUMNS = {"name": "creature_name", "cr": "challenge_rating", "level": "target_player_level",
+                "hp": "hit_points", "ac": "armor_class"}
+
+
+def parse_challenge_rating(value):
+    """Return a challenge rating such as 3, 0.5 or '1/4' as a float, or None if it is not one."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            if "/" in text:
+                numerator, denominator = text.split("/", 1)
+                return float(numerator) / float(denominator)
+            return float(text)
+        except (ValueError, ZeroDivisionError):
+            return None
+    return None
+
+
+def _int_or_none(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def monster_row(data):
+    """Extract the indexed columns and loot rarities from a generated encounter dict."""
+    if not isinstance(data, dict):
+        return None, []
+    stats = data.get("stats") if isinstance(data.get("stats"), dict) else {}
+    row = (
+        str(data.get("creature_type") or "").strip().lower(),
+        str(data.get("creature_name") or "").strip(),
+        _int_or_none(data.get("quantity")),
+        parse_challenge_rating(data.get("challenge_rating")),
+        _int_or_none(data.get("target_player_level")),
+        _int_or_none(stats.get("hit_points")),
+        _int_or_none(stats.get("armor_class")),
+    )
+    rarities = set()
+    for item in data.get("loot") or []:
+        if isinstance(item, dict) and isinstance(item.get("rarity"), str) and item["rarity"].strip():
+            rarities.add(item["rarity"].strip().lower())
+    return row, sorted(rarities)
+
+
+class MonsterLibrary:
+    def __init__(self, directory=GENERATED_DIR, path=DEFAULT_LIBRARY_PATH, refresh_interval=REFRESH_INTERVAL):
+        """SQLite index over the encounter files in generated_characters.
+
+        refresh() only re-reads files whose mtime or size changed since the last scan, so keeping
+        the index current costs one directory listing even with tens of thousands of files.
+        """
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.last_refresh = 0.0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS monsters ("
+            "filename TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "creature_type TEXT, creature_name TEXT, quantity INTEGER, challenge_rating REAL, "
+            "target_player_level INTEGER, hit_points INTEGER, armor_class INTEGER);"
+            "CREATE TABLE IF NOT EXISTS loot_rarities ("
+            "filename TEXT NOT NULL, rarity TEXT NOT NULL, PRIMARY KEY (filename, rarity)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS monsters_type_cr ON monsters (creature_type, challenge_rating);"
+            "CREATE INDEX IF NOT EXISTS monsters_level ON monsters (target_player_level);"
+            "CREATE INDEX IF NOT EXISTS monsters_hp ON monsters (hit_points);"
+            "CREATE INDEX IF NOT EXISTS monsters_ac ON monsters (armor_class);"
+            "CREATE INDEX IF NOT EXISTS loot_rarities_rarity ON loot_rarities (rarity);"
+        )
+        self.conn.commit()
+
+    def refresh(self, force=False):
+        """Bring the index in line with the directory and return (added or changed, removed) counts.
+
+        Without force, a scan is skipped if the last one finished less than refresh_interval ago.
+        """
+        with self.lock:
+            if not force and time.monotonic() - self.last_refresh < self.refresh_interval:
+                return 0, 0
+            known = {filename: (mtime_ns, size) for filename, mtime_ns, size in
+                     self.conn.execute("SELECT filename, mtime_ns, size FROM monsters")}
+            changed = []
+            seen = set()
+            if os.path.isdir(self.directory):
+                with os.scandir(self.directory) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith(".json") or not entry.is_file():
+                            continue
+                        seen.add(entry.name)
+                        stat = entry.stat()
+                        if known.get(entry.name) != (stat.st_mtime_ns, stat.st_size):
+                            changed.append((entry.name, stat.st_mtime_ns, stat.st_size))
+            removed = [(filename,) for filename in known if filename not in seen]
+
+            monsters, rarities = [], []
+            for filename, mtime_ns, size in changed:
+                try:
+                    with open(os.path.join(self.directory, filename), "r", encoding="utf-8") as f:
+                        row, file_rarities = monster_row(json.load(f))
+                except (OSError, ValueError):
+                    row, file_rarities = None, []
+                if row is None:
+                    row = ("", "", None, None, None, None, None)
+                monsters.append((filename, mtime_ns, size) + row)
+                rarities.extend((filename, rarity) for rarity in file_rarities)
+
+            with self.conn:
+                stale = removed + [(filename,) for filename, _, _ in changed]
+                self.conn.executemany("DELETE FROM monsters WHERE filename = ?", removed)
+                self.conn.executemany("DELETE FROM loot_rarities WHERE filename = ?", stale)
+                self.conn.executemany("INSERT OR REPLACE INTO monsters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", monsters)
+                self.conn.executemany("INSERT OR IGNORE INTO loot_rarities VALUES (?, ?)", rarities)
+            self.last_refresh = time.monotonic()
+        if changed or removed:
+            print(f"Monster library: indexed {len(changed)} file(s), removed {len(removed)}.")
+        return len(changed), len(removed)
+
+    def search(self, creature_type=None, name=None, cr_min=None, cr_max=None, level=None, hp_min=None,
+               hp_max=None, ac_min=None, ac_max=None, rarity=None, sort="cr", limit=DEFAULT_LIMIT):
+        """Return (total matches, up to limit rows as dicts) for the given filters; None filters are ignored."""
+        clauses, params = [], []
+        for column, op, value in (
+            ("creature_type", "=", creature_type.strip().lower() if creature_type else None),
+            ("challenge_rating", ">=", parse_challenge_rating(cr_min)),
+            ("challenge_rating", "<=", parse_challenge_rating(cr_max)),
+            ("target_player_level", "=", _int_or_none(level)),
+            ("hit_points", ">=", _int_or_none(hp_min)),
+            ("hit_points", "<=", _int_or_none(hp_max)),
+            ("armor_class", ">=", _int_or_none(ac_min)),
+            ("armor_class", "<=", _int_or_none(ac_max)),
+        ):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        if name:
+            clauses.append("creature_name LIKE ?")
+            params.append(f"%{name.strip()}%")
+        if rarity:
+            clauses.append("filename IN (SELECT filename FROM loot_rarities WHERE rarity = ?)")
+            params.append(rarity.strip().lower())
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = SORT_COLUMNS.get(sort, "challenge_rating")
+        with self.lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM monsters{where}", params).fetchone()[0]
+            cursor = self.conn.execute(
+                "SELECT filename, creature_type, creature_name, quantity, challenge_rating, target_player_level, "
+                f"hit_points, armor_class FROM monsters{where} ORDER BY {order}, creature_name LIMIT ?",
+                params + [limit]
+            )
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor]
+        return total, rows
+
+    def creature_names(self):
+        """Return the distinct creature names in the directory, rescanning it first so new files are included."""
+        self.refresh(force=True)
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT creature_name FROM monsters WHERE creature_name != ''")]
+
+    def facets(self):
+        """Return the creature types and loot rarities present, for filter dropdowns."""
+        with self.lock:
+            types = [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT creature_type FROM monsters WHERE creature_type != '' ORDER BY creature_type")]
+            rarities = [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT rarity FROM loot_rarities ORDER BY rarity")]
+        return types, rarities
+
+    def load(self, filename):
+        """Return the full encounter dict for an indexed file."""
+        with open(os.path.join(self.directory, os.path.basename(filename)), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+def run_benchmark(file_count=20000, changed=10, queries=200):
+    """Time a full index build, a no-op refresh, an incremental refresh and filtered queries over synthetic files."""
+    import random
+    import shutil
+    import tempfile
+
+    rng = random.Random(7)
+    types = ["goblin", "orc", "kobold", "skeleton", "bandit", "wolf", "ogre", "cultist"]
+    rarities = ["common", "uncommon", "rare", "very rare"]
+    crs = [0.125, 0.25, 0.5, 1, 2, 3, 5, 8]
+    tmp = tempfile.mkdtemp()
+    directory = os.path.join(tmp, "generated_characters")
+    os.makedirs(directory)
+
+    def write(index):
+        data = {
+            "creature_type": rng.choice(types), "creature_name": f"creature {index}", "quantity": rng.randint(1, 6),
+            "challenge_rating": rng.choice(crs), "target_player_level": rng.randint(1, 10),
+            "stats": {"hit_points": rng.randint(5, 120), "armor_class": rng.randint(10, 19),
+                      "attack_bonus": rng.randint(2, 8), "damage": "1d8 + 2"},
+            "loot": [{"name": "trinket", "rarity": rng.choice(rarities)}],
+        }
+        with open(os.path.join(directory, f"{data['creature_type']}_{index}.json"), "w") as f:
+            json.dump(data, f)
+
+    try:
+        for index in range(file_count):
+            write(index)
+        library = MonsterLibrary(directory, os.path.join(tmp, "library.sqlite3"))
+
+        def timed(label, fn):
+            start = time.perf_counter()
+            result = fn()
+            print(f"{label:<32} {(time.perf_counter() - start) * 1000:>9.1f} ms  {result}")
+            return result
+
+        print(f"{file_count} generated files")
+        timed("full build", lambda: library.refresh(force=True))
+        timed("no-op refresh", lambda: library.refresh(force=True))
+        time.sleep(0.01)
+        for index in rng.sample(range(file_count), changed):
+            write(index)
+        timed(f"refresh after {changed} edits", lambda: library.refresh(force=True))
+
+        def run_queries():
+            for _ in range(queries):
+                library.search(creature_type=rng.choice(types), cr_min=0.5, cr_max=5, hp_min=20,
+                               ac_max=rng.randint(12, 18), rarity=rng.choice(rarities))
+            return library.search(creature_type="orc", level=3, rarity="rare")[0]
+
+        timed(f"{queries} filtered searches", run_queries)
+        library.conn.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    run_benchmark()
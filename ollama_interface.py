@@ -1,34 +1,143 @@
+import threading
+import time
+from collections import deque
 import ollama
 
+DEFAULT_KEEP_ALIVE = "30m"  # How long Ollama keeps the model loaded after a request
+KEEP_ALIVE_PING_INTERVAL = 240  # seconds between pings that keep the model resident during a session
+SESSION_IDLE_TIMEOUT = 45 * 60  # stop pinging after this long without activity and let the model unload
+COLD_LOAD_THRESHOLD = 0.5  # seconds of load_duration above which a request counts as a cold start
+TIMING_HISTORY = 50
+
 class OllamaInterface:
-    def __init__(self, model_name: str, ai_prompt: str = ""):
-        """Initialize the OllamaInterface with a specific model name and optional AI prompt."""
+    def __init__(self, model_name: str, ai_prompt: str = "", host=None, keep_alive=DEFAULT_KEEP_ALIVE,
+                 warm_up=True):
+        """Initialize the OllamaInterface with a specific model name, optional AI prompt and optional server host.
+
+        With warm_up set, the model is loaded in the background straight away so the first question
+        does not pay the cold load.
+        """
         self.model_name = model_name
-        self.client = ollama.Client()
+        self.client = ollama.Client(host=host)
         self.ai_prompt = ai_prompt
+        self.keep_alive = keep_alive
+        self.timings = {"cold": deque(maxlen=TIMING_HISTORY), "warm": deque(maxlen=TIMING_HISTORY)}
+        self.last_activity = time.monotonic()
+        self.pinger = None
         print(f"Initialized OllamaInterface with model '{model_name}'.")
         print(f"Initialized OllamaInterface with prompt '{ai_prompt}'.")
+        if warm_up:
+            threading.Thread(target=self.warm_up, daemon=True).start()
+
+    def _record_timing(self, first_token_seconds, load_duration_ns):
+        """File a request's time to first token under cold or warm depending on how long the model took to load."""
+        load_seconds = (load_duration_ns or 0) / 1e9
+        kind = "cold" if load_seconds > COLD_LOAD_THRESHOLD else "warm"
+        self.timings[kind].append(first_token_seconds)
+        return kind
+
+    def warm_up(self, record=True):
+        """Load the model into memory with an empty generate request and return the seconds it took.
+
+        With record unset (keep-alive pings) the time is not added to the cold/warm first-token stats.
+        """
+        start = time.monotonic()
+        try:
+            response = self.client.generate(model=self.model_name, prompt="", keep_alive=self.keep_alive)
+        except Exception as e:
+            print(f"Failed to warm up '{self.model_name}': {e}")
+            return None
+        elapsed = time.monotonic() - start
+        if record:
+            kind = self._record_timing(elapsed, response.get('load_duration'))
+            print(f"Warmed up '{self.model_name}' in {elapsed:.2f}s ({kind}).")
+        return elapsed
+
+    def mark_active(self):
+        """Note session activity so keep-alive pings continue."""
+        self.last_activity = time.monotonic()
+
+    def _ping_loop(self, interval, idle_timeout):
+        while True:
+            time.sleep(interval)
+            if time.monotonic() - self.last_activity < idle_timeout:
+                self.warm_up(record=False)
+
+    def start_keep_alive_pings(self, interval=KEEP_ALIVE_PING_INTERVAL, idle_timeout=SESSION_IDLE_TIMEOUT):
+        """Ping the model periodically while the session is active so Ollama never unloads it mid-game."""
+        if self.pinger is None:
+            self.pinger = threading.Thread(target=self._ping_loop, args=(interval, idle_timeout), daemon=True)
+            self.pinger.start()
+
+    def timing_stats(self):
+        """Return count and average time to first token for cold and warm requests."""
+        return {
+            kind: {
+                "count": len(samples),
+                "avg": round(sum(samples) / len(samples), 3) if samples else None,
+            }
+            for kind, samples in self.timings.items()
+        }
 
     def set_system_prompt(self, prompt: str):
         """Update the system prompt for the interface."""
         self.ai_prompt = prompt
         print(f"Updated system prompt to: '{prompt}'")
         
-    def send_input(self, prompt: str, context: str = "") -> str:
+    def current_model_id(self) -> str:
+        """Return the id of the model requests are sent to."""
+        return self.model_name
+
+    def _build_messages(self, prompt: str, context: str = "", system_prompt=None) -> list:
+        """Build the chat message list from the system prompt, context and user prompt.
+
+        A per-request system_prompt takes precedence over the interface's default prompt.
+        """
+        messages = []
+        system_prompt = self.ai_prompt if system_prompt is None else system_prompt
+        if system_prompt:
+            messages.append({'role': 'system', 'content': system_prompt})
+        if context:
+            messages.append({'role': 'system', 'content': context})
+        messages.append({'role': 'user', 'content': prompt})
+        return messages
+
+    def send_input(self, prompt: str, context: str = "", system_prompt=None, served=None) -> str:
         """Send a prompt and optional context to the Ollama model and return the response."""
+        if served is not None:
+            served["model_id"] = self.model_name
         try:
-            messages = []
-            if self.ai_prompt:
-                messages.append({'role': 'system', 'content': self.ai_prompt})
-            if context:
-                messages.append({'role': 'system', 'content': context})
-            messages.append({'role': 'user', 'content': prompt})
-            
-            response = self.client.chat(model=self.model_name, messages=messages)
+            messages = self._build_messages(prompt, context, system_prompt)
+            self.mark_active()
+            start = time.monotonic()
+            response = self.client.chat(model=self.model_name, messages=messages, keep_alive=self.keep_alive)
+            self._record_timing(time.monotonic() - start, response.get('load_duration'))
             return response['message']['content']
         except Exception as e:
             return f"Error: {e}"
 
+    def stream_input(self, prompt: str, context: str = "", system_prompt=None, served=None):
+        """Send a prompt and optional context to the Ollama model and yield response tokens as they arrive."""
+        if served is not None:
+            served["model_id"] = self.model_name
+        try:
+            messages = self._build_messages(prompt, context, system_prompt)
+            self.mark_active()
+            start = time.monotonic()
+            first_token_seconds = None
+            for chunk in self.client.chat(model=self.model_name, messages=messages, stream=True,
+                                          keep_alive=self.keep_alive):
+                if first_token_seconds is None:
+                    first_token_seconds = time.monotonic() - start
+                if chunk.get('done'):
+                    # load_duration is only reported on the final chunk
+                    self._record_timing(first_token_seconds, chunk.get('load_duration'))
+                token = chunk['message']['content']
+                if token:
+                    yield token
+        except Exception as e:
+            yield f"Error: {e}"
+
     def run_interactive(self):
         """Start an interactive session where the user can input text and receive responses from the model."""
         print("Starting interactive session. Type 'exit' to quit.")
@@ -38,7 +147,10 @@ class OllamaInterface:
             if user_input.lower() == "exit":
                 print("Exiting interactive session.")
                 break
-            print(f"Ollama: {self.send_input(user_input, context)}")
+            print("Ollama: ", end="", flush=True)
+            for token in self.stream_input(user_input, context):
+                print(token, end="", flush=True)
+            print()
 
 # Example usage:
 # handler = OllamaInterface('your-model-name', ai_prompt='You are a helpful assistant.')
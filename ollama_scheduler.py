@@ -0,0 +1,195 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+PRIORITY_INTERACTIVE = 0  # DM chat, someone at the table is waiting
+PRIORITY_BULK = 10  # batch monster_generator_json generation
+MAX_CONCURRENT_GENERATIONS = 1  # a GPU-less box slows down for everyone when generations overlap
+WAIT_HISTORY = 100
+
+
+class GenerationJob:
+    def __init__(self, key, priority, args):
+        """One queued or running generation whose tokens can be read by any number of coalesced requesters."""
+        self.key = key
+        self.priority = priority
+        self.args = args
+        self.tokens = []
+        self.done = False
+        self.started = False
+        self.requesters = 1
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.cond = threading.Condition()
+
+    def append(self, token):
+        with self.cond:
+            self.tokens.append(token)
+            self.cond.notify_all()
+
+    def finish(self):
+        with self.cond:
+            self.done = True
+            self.cond.notify_all()
+
+    def iter_tokens(self):
+        """Yield every token of the generation from the start, blocking until new ones arrive."""
+        index = 0
+        while True:
+            with self.cond:
+                while index >= len(self.tokens) and not self.done:
+                    self.cond.wait()
+                new_tokens = self.tokens[index:]
+                finished = self.done
+            index += len(new_tokens)
+            yield from new_tokens
+            if finished and index >= len(self.tokens):
+                return
+
+
+class OllamaScheduler:
+    def __init__(self, client, max_concurrent=MAX_CONCURRENT_GENERATIONS):
+        """Priority queue in front of an OllamaInterface.
+
+        Interactive requests are served before bulk ones, identical in-flight prompts share one
+        generation, and at most max_concurrent generations run against the server at a time.
+        """
+        self.client = client
+        self.max_concurrent = max_concurrent
+        self.queue = []  # (priority, sequence, job)
+        self.sequence = itertools.count()
+        self.in_flight = {}  # key -> job, queued or running
+        self.running = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.waits = {PRIORITY_INTERACTIVE: deque(maxlen=WAIT_HISTORY), PRIORITY_BULK: deque(maxlen=WAIT_HISTORY)}
+        self.lock = threading.Condition()
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(max_concurrent)]
+        for worker in self.workers:
+            worker.start()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def submit(self, prompt: str, context: str = "", system_prompt=None, priority=PRIORITY_INTERACTIVE):
+        """Queue a generation, or join an identical one already queued or running, and return its job."""
+        key = (self.client.model_name, prompt, context, system_prompt)
+        with self.lock:
+            job = self.in_flight.get(key)
+            if job is not None:
+                job.requesters += 1
+                self.coalesced += 1
+                if priority < job.priority and not job.started:
+                    # Re-queue at the higher priority; the stale heap entry is skipped when popped
+                    job.priority = priority
+                    heapq.heappush(self.queue, (priority, next(self.sequence), job))
+                    self.lock.notify()
+                return job
+            job = GenerationJob(key, priority, (prompt, context, system_prompt))
+            self.in_flight[key] = job
+            heapq.heappush(self.queue, (priority, next(self.sequence), job))
+            self.lock.notify()
+            return job
+
+    def _next_job(self):
+        with self.lock:
+            while True:
+                while not self.queue:
+                    self.lock.wait()
+                priority, _, job = heapq.heappop(self.queue)
+                if job.started or priority != job.priority:
+                    continue
+                job.started = True
+                job.started_at = time.monotonic()
+                self.running += 1
+                self.waits.setdefault(priority, deque(maxlen=WAIT_HISTORY)).append(job.started_at - job.enqueued_at)
+                return job
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            try:
+                for token in self.client.stream_input(*job.args):
+                    job.append(token)
+            except Exception as e:
+                job.append(f"Error: {e}")
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.in_flight.pop(job.key, None)
+                job.finish()
+
+    def stream_input(self, prompt: str, context: str = "", system_prompt=None, priority=PRIORITY_INTERACTIVE,
+                     served=None):
+        """Queue a request and yield its tokens once it runs."""
+        job = self.submit(prompt, context, system_prompt, priority)
+        if served is not None:
+            served["model_id"] = job.key[0]
+        yield from job.iter_tokens()
+
+    def send_input(self, prompt: str, context: str = "", system_prompt=None, priority=PRIORITY_INTERACTIVE,
+                   served=None) -> str:
+        """Queue a request and return the full response once it has run."""
+        job = self.submit(prompt, context, system_prompt, priority)
+        if served is not None:
+            served["model_id"] = job.key[0]
+        return "".join(job.iter_tokens())
+
+    def stats(self):
+        """Return queue depth per priority, running generations, coalesced requests and wait times in seconds."""
+        with self.lock:
+            depth = {}
+            for priority, _, job in self.queue:
+                if not job.started and priority == job.priority:
+                    depth[priority] = depth.get(priority, 0) + 1
+            waits = {
+                priority: {
+                    "avg": round(sum(samples) / len(samples), 3) if samples else None,
+                    "max": round(max(samples), 3) if samples else None,
+                }
+                for priority, samples in self.waits.items()
+            }
+            return {
+                "queued": sum(depth.values()),
+                "queued_by_priority": depth,
+                "running": self.running,
+                "max_concurrent": self.max_concurrent,
+                "completed": self.completed,
+                "coalesced": self.coalesced,
+                "wait_seconds": waits,
+            }
+
+
+def run_demo(bulk_jobs=6, latency=0.2):
+    """Show interactive requests overtaking queued bulk jobs and duplicates coalescing, using a fake Ollama server."""
+    from concurrent.futures import ThreadPoolExecutor
+    from ollama_interface import OllamaInterface
+    from stub_server import StubServer, StubOllamaHandler
+
+    with StubServer(StubOllamaHandler, latency=latency) as stub:
+        scheduler = OllamaScheduler(OllamaInterface("gemma3:1b", "", host=stub.url))
+        finished = []
+
+        def request(name, prompt, priority):
+            scheduler.send_input(prompt, priority=priority)
+            finished.append(name)
+
+        with ThreadPoolExecutor(max_workers=bulk_jobs + 4) as pool:
+            for i in range(bulk_jobs):
+                pool.submit(request, f"bulk-{i}", f"orc {i}", PRIORITY_BULK)
+            time.sleep(latency / 2)
+            pool.submit(request, "chat-1", "how does grappling work", PRIORITY_INTERACTIVE)
+            pool.submit(request, "chat-1-duplicate", "how does grappling work", PRIORITY_INTERACTIVE)
+            time.sleep(latency / 4)
+            print("while running:", scheduler.stats())
+
+        print("completion order:", finished)
+        print("after:", scheduler.stats())
+        print(f"server requests: {stub.requests}, max concurrent generations on server: {stub.max_generating}")
+
+
+if __name__ == "__main__":
+    run_demo()
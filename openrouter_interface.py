@@ -1,30 +1,69 @@
 import requests
-import pandas as pd
-import re
+from requests.adapters import HTTPAdapter
+import email.utils
+import random
 import json
+import time
+from model_catalogue import ModelCatalogue, CATALOGUE_CACHE_PATH
+from model_router import ModelRouter, ROUTING_DEADLINE
 
 LOG_FILE = "openrouter.log"
+BASE_URL = "https://openrouter.ai/api/v1"
+CONNECT_TIMEOUT = 5  # seconds to establish a connection
+READ_TIMEOUT = 120  # seconds to wait between bytes of a response; free models can be slow to start
+POOL_SIZE = 10
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5  # seconds, doubled on every retry before jitter is applied
+BACKOFF_MAX = 10  # seconds, cap on the computed backoff; a server's Retry-After is always waited out in full
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses where a POST was rejected before the model ran, so sending it again cannot duplicate work
+POST_RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+FIRST_CATALOGUE_WAIT = 15  # seconds a request waits for the very first catalogue fetch when nothing is cached
+
+def retry_after_seconds(response):
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        if retry_at is None:
+            return None
+        return max(0.0, retry_at.timestamp() - time.time())
 
-def extract_size(description):
-    """Extract model size in billions from description (e.g., '671B parameters')."""
-    match = re.search(r'(\d+(\.\d+)?)\s*(B|billion)\s*(parameter|params|param)?', description, re.IGNORECASE)
-    if match:
-        return float(match.group(1))
-    return None
-    
 class OpenRouterInterface:
-    def __init__(self, api_key, system_prompt):
-        """Initialize the wrapper with an API key, system prompt, and fetch free models into a DataFrame."""
+    def __init__(self, api_key, system_prompt, base_url=BASE_URL, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_retries=MAX_RETRIES, pool_size=POOL_SIZE, catalogue_path=CATALOGUE_CACHE_PATH,
+                 min_model_size=None, hedge=False, routing_deadline=ROUTING_DEADLINE):
+        """Initialize the wrapper with an API key and system prompt; free models load in the background.
+
+        Requests are routed across free models of at least min_model_size billion parameters by
+        model_router.ModelRouter, which fails over to the next model within routing_deadline seconds.
+        """
         self.api_key = api_key
         self.system_prompt = system_prompt
-        self.base_url = "https://openrouter.ai/api/v1"
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        self.free_models = self.get_free_models()
-        if self.free_models.empty:
-            print("Warning: No free models available at initialization.")
+        # One pooled session so connections (and their TLS handshakes) are reused across requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self.headers)
+        self.catalogue = ModelCatalogue(lambda headers: self._request("GET", "/models", headers=headers),
+                                        cache_path=catalogue_path)
+        self.catalogue.refresh_async()
+        self.router = ModelRouter(min_size=min_model_size, deadline=routing_deadline, hedge=hedge)
+        if not self.free_models:
+            print("No cached model catalogue yet, fetching free models in the background.")
         
         print(f"Initialized OpenRouter Interface with prompt '{system_prompt}'.")
 
@@ -32,72 +71,215 @@ class OpenRouterInterface:
         """Update the system prompt for the interface."""
         self.system_prompt = prompt
         print(f"Updated system prompt to: '{prompt}'")
+
+    def close(self):
+        """Close pooled connections."""
+        self.session.close()
+
+    def _backoff_delay(self, attempt, response=None):
+        """Return how long to wait before retry number attempt, honouring Retry-After in full when present."""
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            return retry_after
+        # Full jitter keeps concurrent clients from retrying in lockstep
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def _request(self, method, path, retries=None, **kwargs):
+        """Send a request on the pooled session, retrying transient failures with jittered exponential backoff."""
+        max_retries = self.max_retries if retries is None else retries
+        method = method.upper()
+        idempotent = method in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if idempotent else POST_RETRY_STATUSES
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # A read timeout on a POST may mean the model already ran; only connect failures are safe to resend
+                safe = idempotent or isinstance(e, requests.exceptions.ConnectTimeout)
+                if not safe or attempt >= max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+            else:
+                if response.status_code not in retry_statuses or attempt >= max_retries:
+                    response.raise_for_status()
+                    return response
+                delay = self._backoff_delay(attempt, response)
+                response.close()
+            print(f"Retrying {method} {path} in {delay:.2f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+            attempt += 1
         
+    @property
+    def free_models(self):
+        """Last known list of free models as dicts with name, id, size and free, largest first."""
+        return self.catalogue.models
+
     def get_free_models(self):
-        """Fetch free models and return a DataFrame with name, id, size, and free status."""
-        try:
-            response = requests.get(f"{self.base_url}/models", headers=self.headers)
-            response.raise_for_status()
-            models = response.json().get("data", [])
-            model_data = []
-            for model in models:
-                prompt_price = model["pricing"]["prompt"]
-                completion_price = model["pricing"]["completion"]
-                is_free = prompt_price == "0" and completion_price == "0"
-                name = model["name"]
-                model_id = model["id"]
-                size = extract_size(model['description'])
-                model_data.append({
-                    "name": name,
-                    "id": model_id,
-                    "size": size,
-                    "free": is_free
-                })
-            models_df = pd.DataFrame(model_data)
-            free_models_df = models_df[models_df["free"]].sort_values(by="size", ascending=False, na_position='last')
-            return free_models_df
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch models: {e}")
-            return pd.DataFrame()
-
-    def send_input(self, prompt: str, context: str = "") -> str:
-        """Send a prompt and optional context to OpenRouter and return the response string."""
-        try:
-            messages = []
-            if self.system_prompt:
-                messages.append({"role": "system", "content": self.system_prompt})
+        """Fetch free models now and return them as a list of dicts with name, id, size, and free status."""
+        return self.catalogue.refresh()
+
+    def _ensure_models(self):
+        """Return the free model list, waiting briefly for the first fetch if nothing was cached."""
+        if not self.free_models:
+            self.catalogue.refresh_async(force=True)
+            self.catalogue.wait(FIRST_CATALOGUE_WAIT)
+        else:
+            self.catalogue.refresh_async()
+        return self.free_models
+
+    def current_model_id(self):
+        """Return the id of the model the router currently prefers, or None if no free model is available."""
+        ranked = self.router.rank(self.free_models, explore=False)
+        return ranked[0] if ranked else None
+
+    def _attempt_timeout(self, remaining):
+        """Per-attempt (connect, read) timeout capped by the time left before the routing deadline."""
+        connect_timeout, read_timeout = self.timeout
+        return (min(connect_timeout, remaining), min(read_timeout, remaining))
+
+    def _build_messages(self, prompt: str, context: str = "", system_prompt=None) -> list:
+        """Build the chat message list from the system prompt, context and user prompt.
+
+        A per-request system_prompt takes precedence over the interface's default prompt.
+        """
+        messages = []
+        system_prompt = self.system_prompt if system_prompt is None else system_prompt
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        if context:
+            messages.append({"role": "system", "content": context})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def _log_exchange(self, model_id, prompt, context, output):
+        """Append a model/input/output record to the log file."""
+        with open(LOG_FILE, "a") as log_file:
+            log_file.write(f"Model: {model_id}\n")
+            log_file.write(f"Input: {prompt}\n")
             if context:
-                messages.append({"role": "system", "content": context})
-            messages.append({"role": "user", "content": prompt})
+                log_file.write(f"Context: {context}\n")
+            log_file.write(f"Output: {output}\n")
+            log_file.write("-" * 40 + "\n")
+
+    def _complete(self, model_id, messages, timeout):
+        """Return the full completion from one model; failover is left to the router, so no retries here."""
+        response = self._request(
+            "POST", "/chat/completions",
+            retries=0,
+            timeout=timeout,
+            json={
+                "model": model_id,
+                "messages": messages
+            }
+        )
+        content = json.loads(response.content)
+        if "error" in content:
+            raise RuntimeError(content["error"].get("message", content["error"]))
+        return content['choices'][0]['message']['content']
+
+    def _stream_tokens(self, model_id, messages, timeout):
+        """Yield tokens from one model's SSE stream, raising on HTTP or in-stream errors."""
+        with self._request(
+            "POST", "/chat/completions",
+            retries=0,
+            timeout=timeout,
+            json={
+                "model": model_id,
+                "messages": messages,
+                "stream": True
+            },
+            stream=True
+        ) as response:
+            # text/event-stream responses often omit the charset, which requests would read as latin-1
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                # SSE comments (e.g. ": OPENROUTER PROCESSING") and blank keep-alives carry no data
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"].get("message", chunk["error"]))
+                choices = chunk.get("choices") or [{}]
+                token = choices[0].get("delta", {}).get("content")
+                if token:
+                    yield token
+
+    def send_input(self, prompt: str, context: str = "", system_prompt=None, served=None) -> str:
+        """Send a prompt and optional context to OpenRouter and return the response string.
 
-            if self.free_models.empty:
+        If served is a dict, the id of the model that answered is stored in it under "model_id".
+        """
+        try:
+            messages = self._build_messages(prompt, context, system_prompt)
+
+            if not self._ensure_models():
                 return "Error: No free models available"
-            
-            model_id = self.free_models.iloc[0]['id']
-            
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json={
-                    "model": model_id,
-                    "messages": messages
-                }
+
+            model_id, output = self.router.call(
+                self.free_models,
+                lambda model_id, remaining: self._complete(model_id, messages, self._attempt_timeout(remaining))
             )
-            response.raise_for_status()
-            
-            with open(LOG_FILE, "a") as log_file:
-                log_file.write(f"Model: {model_id}\n")
-                log_file.write(f"Input: {prompt}\n")
-                if context:
-                    log_file.write(f"Context: {context}\n")
-                log_file.write(f"Output: {response.json()['choices'][0]['message']['content']}\n")
-                log_file.write("-" * 40 + "\n")
-            
-            content = json.loads(response.content)
-            return content['choices'][0]['message']['content']
+            if served is not None:
+                served["model_id"] = model_id
+            self._log_exchange(model_id, prompt, context, output)
+            return output
         except Exception as e:
             return f"Error: {e}"
 
+    def stream_input(self, prompt: str, context: str = "", system_prompt=None, served=None):
+        """Send a prompt and optional context to OpenRouter and yield response tokens from the SSE stream.
+
+        Fails over to the next routed model if a model errors before its first token arrives. If served
+        is a dict, the id of the model that is answering is stored in it under "model_id".
+        """
+        try:
+            messages = self._build_messages(prompt, context, system_prompt)
+
+            if not self._ensure_models():
+                yield "Error: No free models available"
+                return
+
+            candidates = self.router.choose(self.free_models)
+            if not candidates:
+                yield "Error: No free models meet the routing requirements"
+                return
+
+            start = time.monotonic()
+            last_error = None
+            for model_id in candidates:
+                remaining = self.router.remaining_time(start)
+                if remaining <= 0:
+                    break
+                attempt_start = time.monotonic()
+                tokens = self._stream_tokens(model_id, messages, self._attempt_timeout(remaining))
+                try:
+                    first_token = next(tokens, None)
+                    if first_token is None:
+                        raise RuntimeError("stream ended without any content")
+                except Exception as e:
+                    self.router.record(model_id, time.monotonic() - attempt_start, False)
+                    self.router.log_decision(model_id, f"failed before first token: {e}")
+                    last_error = e
+                    continue
+                self.router.record(model_id, time.monotonic() - attempt_start, True)
+                if served is not None:
+                    served["model_id"] = model_id
+                output = [first_token]
+                yield first_token
+                for token in tokens:
+                    output.append(token)
+                    yield token
+                self._log_exchange(model_id, prompt, context, "".join(output))
+                return
+            yield f"Error: {last_error or 'routing deadline exceeded'}"
+        except Exception as e:
+            yield f"Error: {e}"
+
 
 # Interactive session
 if __name__ == "__main__":
@@ -105,15 +287,15 @@ if __name__ == "__main__":
     system_prompt = "You think you are a pirate. Answer all question like a Pirate." # Add System Prompt as required
     wrapper = OpenRouterInterface(api_key, system_prompt)
 
-    if wrapper.free_models.empty:
+    if not wrapper._ensure_models():
         print("No free models available. Exiting.")
         exit(1)
 
     print("Welcome to the OpenRouter interactive session!")
     print("Available free models:")
-    for index, row in wrapper.free_models.iterrows():
-        size_str = f"{row['size']}B" if pd.notna(row['size']) else "Unknown size"
-        print(f"- {row['name']} ({size_str})")
+    for model in wrapper.free_models:
+        size_str = f"{model['size']}B" if model['size'] is not None else "Unknown size"
+        print(f"- {model['name']} ({size_str})")
     print("\nType your prompt and press Enter to get a response.")
     print("To provide context, use 'context||prompt'. Otherwise, just type the prompt.")
     print("Type 'exit' to quit.")
@@ -126,17 +308,20 @@ if __name__ == "__main__":
             break
         elif user_input.lower() == 'list models':
             print("Current free models:")
-            for index, row in wrapper.free_models.iterrows():
-                size_str = f"{row['size']}B" if pd.notna(row['size']) else "Unknown size"
-                print(f"- {row['name']} ({size_str})")
+            for model in wrapper.free_models:
+                size_str = f"{model['size']}B" if model['size'] is not None else "Unknown size"
+                print(f"- {model['name']} ({size_str})")
         else:
             parts = user_input.split("||", 1)
             if len(parts) == 2:
                 context, prompt = parts
             else:
                 context, prompt = None, user_input
-            response = wrapper.send_input(prompt, context)
-            if response:
-                print(f"Assistant: {response}")
-            else:
+            print("Assistant: ", end="", flush=True)
+            received = False
+            for token in wrapper.stream_input(prompt, context):
+                received = True
+                print(token, end="", flush=True)
+            print()
+            if not received:
                 print("An error occurred or no models are available. Please try again.")
\ No newline at end of file
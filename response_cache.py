@@ -0,0 +1,121 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = "response_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def normalize_prompt(prompt):
+    """Normalize a user prompt so trivially different phrasings of the same question share a cache entry."""
+    text = " ".join(prompt.lower().split())
+    return re.sub(r"[\s?!.]+$", "", text)
+
+
+def make_key(prompt, prompt_key, model_id, context=None):
+    """Build the cache key from the normalized prompt, SYSTEM_PROMPTS key, model id and optional context."""
+    parts = [normalize_prompt(prompt), prompt_key or "", model_id or ""]
+    if context is not None:
+        parts.append(hashlib.sha256(context.encode("utf-8")).hexdigest())
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        """SQLite-backed response cache with TTL expiry and least-recently-used eviction."""
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.conn.commit()
+
+    def get(self, key):
+        """Return the cached response for a key, or None if missing or expired."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        """Store a response, evicting expired entries and then the least recently used beyond max_entries."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            self.conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self.conn.commit()
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and the current entry count."""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+class CachedChatClient:
+    def __init__(self, client, cache, include_context=False):
+        """Opt-in response cache for an OllamaInterface or OpenRouterInterface.
+
+        Callers look a question up before sending it and store the answer once it has streamed in full.
+        When include_context is set, a hash of the context is part of the key so answers are only reused
+        while the notes and history they were based on are unchanged.
+        """
+        self.client = client
+        self.cache = cache
+        self.include_context = include_context
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _key(self, prompt, prompt_key, context, model_id):
+        return make_key(prompt, prompt_key, model_id, context if self.include_context else None)
+
+    def lookup(self, prompt, prompt_key, context=""):
+        """Return an answer cached for the model that would answer the prompt now, or None on a miss."""
+        return self.cache.get(self._key(prompt, prompt_key, context, self.client.current_model_id()))
+
+    def store(self, prompt, prompt_key, context, response, model_id):
+        """Cache a response under the model that produced it, unless it is an error."""
+        if response and not response.startswith("Error:"):
+            self.cache.put(self._key(prompt, prompt_key, context, model_id), response)
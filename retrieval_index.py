@@ -0,0 +1,216 @@
+import gzip
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in is it its me my of on or so "
+    "that the their them then there they this to was we what when where which who will with you your "
+    "user dm assist".split()
+)
+CHUNK_MAX_CHARS = 600
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords removed."""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def chunk_text(text, max_chars=CHUNK_MAX_CHARS):
+    """Split text into chunks on blank lines and transcript turns, packing lines up to max_chars."""
+    chunks = []
+    current = []
+    current_len = 0
+    for line in text.splitlines():
+        boundary = not line.strip() or line.startswith("User: ")
+        if current and (boundary or current_len + len(line) > max_chars):
+            chunks.append("\n".join(current))
+            current, current_len = [], 0
+        if line.strip():
+            current.append(line)
+            current_len += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class BM25Index:
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        """In-memory inverted index scored with Okapi BM25, supporting incremental adds and removals."""
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {chunk_id: term frequency}
+        self.chunks = {}  # chunk_id -> (source, text, length)
+        self.total_length = 0
+        self.next_id = 0
+
+    def add(self, source, text):
+        """Index a chunk of text and return its id."""
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        chunk_id = self.next_id
+        self.next_id += 1
+        for term, freq in terms.items():
+            self.postings[term][chunk_id] = freq
+        self.chunks[chunk_id] = (source, text, length)
+        self.total_length += length
+        return chunk_id
+
+    def remove(self, chunk_id):
+        """Drop a chunk from the index."""
+        source, text, length = self.chunks.pop(chunk_id)
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= length
+
+    def search(self, query, k=5):
+        """Return up to k (score, source, text) tuples ranked by BM25 relevance to the query."""
+        n_chunks = len(self.chunks)
+        if not n_chunks:
+            return []
+        avg_length = self.total_length / n_chunks or 1
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_chunks - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, freq in postings.items():
+                length = self.chunks[chunk_id][2]
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[chunk_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self.chunks[chunk_id][0], self.chunks[chunk_id][1]) for chunk_id, score in best]
+
+
+class RetrievalIndex:
+    def __init__(self, sources, append_only=(), segments=None):
+        """Keep a BM25 index over a set of text files, indexing only newly appended text where possible.
+
+        Files listed in append_only (such as transcripts) are indexed incrementally from the last read
+        offset; other files (such as the notepad) are re-chunked whenever their mtime or size changes.
+        If segments (a transcript_store.TranscriptStore) is given, its session segments are indexed too:
+        plain ones incrementally and gzipped ones in full.
+        """
+        self.index = BM25Index()
+        self.sources = list(sources)
+        self.append_only = set(append_only)
+        self.segments = segments
+        self.state = {}  # path -> {"signature": ..., "offset": int, "chunk_ids": [...]}
+        self.lock = threading.Lock()
+
+    def _drop_source(self, path):
+        state = self.state.pop(path, None)
+        if state:
+            for chunk_id in state["chunk_ids"]:
+                self.index.remove(chunk_id)
+
+    def _refresh_source(self, path, append_only=False):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._drop_source(path)
+            return
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        state = self.state.get(path)
+        if state and state["signature"] == signature:
+            return
+        appendable = (
+            append_only and state is not None
+            and state["signature"][0] == stat.st_ino and stat.st_size >= state["offset"]
+        )
+        if not appendable:
+            self._drop_source(path)
+            state = {"signature": None, "offset": 0, "chunk_ids": []}
+            self.state[path] = state
+        with (gzip.open if path.endswith(".gz") else open)(path, "rb") as f:
+            f.seek(state["offset"])
+            data = f.read()
+        if append_only:
+            # Leave a trailing partial line for the next refresh so a turn being written is not split
+            end = data.rfind(b"\n") + 1
+            data = data[:end]
+        state["offset"] += len(data)
+        for chunk in chunk_text(data.decode("utf-8", errors="replace")):
+            state["chunk_ids"].append(self.index.add(path, chunk))
+        state["signature"] = signature
+
+    def _refresh_all(self):
+        segment_paths = self.segments.segment_paths() if self.segments is not None else []
+        # Plain segments are only ever appended to; gzipped ones are written once and read in full
+        appended = self.append_only.union(path for path in segment_paths if not path.endswith(".gz"))
+        paths = self.sources + segment_paths
+        for path in set(self.state) - set(paths):
+            # e.g. a segment that was replaced by its gzipped copy
+            self._drop_source(path)
+        for path in paths:
+            self._refresh_source(path, path in appended)
+
+    def refresh(self):
+        """Bring the index up to date with the files on disk."""
+        with self.lock:
+            self._refresh_all()
+
+    def search(self, query, k=5):
+        """Refresh the index and return the top-k (score, source, text) chunks for a query."""
+        with self.lock:
+            self._refresh_all()
+            return self.index.search(query, k)
+
+    def __len__(self):
+        return len(self.index.chunks)
+
+
+def run_benchmark(turn_counts=(1000, 10000, 50000), queries=20):
+    """Print index build time, incremental append time and query latency as the history grows."""
+    import random
+    import tempfile
+    import time
+
+    words = ("orc goblin dragon grapple stealth ruins elven cave ambush spell slot initiative saving throw "
+             "advantage shield longbow tavern merchant bandit treasure potion healing trap darkvision").split()
+    rng = random.Random(7)
+
+    def fake_turn():
+        question = " ".join(rng.choices(words, k=8))
+        answer = " ".join(rng.choices(words, k=60))
+        return f"User: {question}\nDM Assist: {answer}\n"
+
+    print(f"{'turns':>8} {'chunks':>8} {'build s':>9} {'append ms':>10} {'query ms':>9}")
+    for turns in turn_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "transcripts.old")
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(fake_turn() for _ in range(turns))
+            index = RetrievalIndex([path], append_only=[path])
+
+            start = time.perf_counter()
+            index.refresh()
+            build_time = time.perf_counter() - start
+
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(fake_turn())
+            start = time.perf_counter()
+            index.refresh()
+            append_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(queries):
+                index.search(" ".join(rng.choices(words, k=5)), k=4)
+            query_time = (time.perf_counter() - start) / queries
+
+            print(f"{turns:>8} {len(index):>8} {build_time:>9.2f} {append_time * 1000:>10.2f} {query_time * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from combat_engine import CombatEngine
+
+MAX_SESSIONS = 200
+SESSION_TTL_SECONDS = 24 * 3600
+
+
+class Session:
+    def __init__(self, session_id):
+        """Chat history and combat state for one browser session, with versions bumped on every change."""
+        self.session_id = session_id
+        self.chat = []
+        self.display_start = 0  # index of the oldest chat message the page has rendered
+        self.combat = CombatEngine()
+        self.chat_version = 0
+        self.effects_version = 0
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+
+    def append_messages(self, *messages):
+        """Append chat messages and return the index of the first one."""
+        with self.lock:
+            start = len(self.chat)
+            self.chat.extend(messages)
+            self.chat_version += 1
+            return start
+
+    def update_message(self, index, **fields):
+        """Update fields of a chat message in place, removing those set to None."""
+        with self.lock:
+            msg = self.chat[index]
+            for key, value in fields.items():
+                if value is None:
+                    msg.pop(key, None)
+                else:
+                    msg[key] = value
+            self.chat_version += 1
+            return msg
+
+    def clear_chat(self):
+        with self.lock:
+            self.chat = []
+            self.display_start = 0
+            self.chat_version += 1
+
+    def combat_changed(self):
+        """Record that the initiative order or effects changed."""
+        with self.lock:
+            self.effects_version += 1
+
+
+class SessionStore:
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS):
+        """Server-side per-session state keyed by the session id each page load is given.
+
+        The browser only holds its session id and version numbers; callbacks read and change the state
+        here and send the page just the difference. Sessions idle for longer than ttl_seconds are
+        dropped, and the least recently used beyond max_sessions are evicted.
+        """
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        """Return the session for an id, creating it if it is new or has expired."""
+        now = time.monotonic()
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None or now - session.last_access > self.ttl_seconds:
+                session = Session(session_id)
+                self.sessions[session_id] = session
+            session.last_access = now
+            self.sessions.move_to_end(session_id)
+            while self.sessions:
+                oldest_id, oldest = next(iter(self.sessions.items()))
+                if len(self.sessions) <= self.max_sessions and now - oldest.last_access <= self.ttl_seconds:
+                    break
+                del self.sessions[oldest_id]
+            return session
+
+    def __len__(self):
+        return len(self.sessions)
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_MODELS = [
+    {"id": "stub/large:free", "name": "Stub Large", "description": "A 70B parameter stub model",
+     "pricing": {"prompt": "0", "completion": "0"}},
+    {"id": "stub/small:free", "name": "Stub Small", "description": "A 7B parameter stub model",
+     "pricing": {"prompt": "0", "completion": "0"}},
+    {"id": "stub/paid", "name": "Stub Paid", "description": "A 400B parameter stub model",
+     "pricing": {"prompt": "0.000001", "completion": "0.000002"}},
+]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Needed for keep-alive, otherwise every response closes the connection
+    disable_nagle_algorithm = True  # Headers and body are separate writes; Nagle would stall kept-alive sockets
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _injected_failure(self):
+        """Return True (after responding) if the server was configured to fail this request."""
+        stub = self.server.stub
+        with stub.lock:
+            stub.requests += 1
+            stub.connections.add(self.client_address)
+            if stub.failures_remaining > 0:
+                stub.failures_remaining -= 1
+                fail = True
+            else:
+                fail = False
+        if fail:
+            self._send_json(stub.failure_status, {"error": {"message": "injected failure"}},
+                            {"Retry-After": str(stub.retry_after)})
+        return fail
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunks(self):
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class StubOpenRouterHandler(StubHandler):
+    def do_GET(self):
+        if self._injected_failure():
+            return
+        if self.path.endswith("/models"):
+            etag = '"' + hashlib.sha256(json.dumps(STUB_MODELS).encode("utf-8")).hexdigest()[:16] + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._send_json(200, {"data": STUB_MODELS}, {"ETag": etag})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self._injected_failure():
+            return
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        stub = self.server.stub
+        if payload.get("model") in stub.failing_models:
+            self._send_json(503, {"error": {"message": f"{payload.get('model')} is unavailable"}})
+            return
+        prompt = payload["messages"][-1]["content"]
+        system = next((m["content"] for m in payload["messages"] if m["role"] == "system"), "")
+        reply = stub.reply_for(payload.get("model"), system, prompt)
+        time.sleep(stub.latency)
+        if not payload.get("stream"):
+            self._send_json(200, {"model": payload.get("model"),
+                                  "choices": [{"message": {"role": "assistant", "content": reply}}]})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [": OPENROUTER PROCESSING"]
+        for word in reply.split(" "):
+            chunk = {"choices": [{"delta": {"content": word + " "}}]}
+            events.append("data: " + json.dumps(chunk))
+        events.append("data: [DONE]")
+        for event in events:
+            self._write_chunk((event + "\n\n").encode("utf-8"))
+            time.sleep(stub.token_latency)
+        self._end_chunks()
+
+
+class StubOllamaHandler(StubHandler):
+    def _load_model(self, model, keep_alive):
+        """Simulate loading the model if it is not resident and return the load time in nanoseconds."""
+        stub = self.server.stub
+        now = time.monotonic()
+        with stub.lock:
+            cold = stub.loaded_until.get(model, 0) < now
+        if cold:
+            time.sleep(stub.load_latency)
+        if keep_alive is None:
+            keep_alive = stub.default_keep_alive
+        with stub.lock:
+            stub.loaded_until[model] = time.monotonic() + float(str(keep_alive).rstrip("s"))
+        return int(stub.load_latency * 1e9) if cold else 0
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self._injected_failure():
+            return
+        stub = self.server.stub
+        model = payload.get("model", "")
+        if self.path == "/api/generate" and not payload.get("prompt"):
+            # An empty generate request only loads (or with keep_alive 0 unloads) the model
+            load_duration = self._load_model(model, payload.get("keep_alive"))
+            self._send_json(200, {"model": model, "created_at": "", "response": "", "done": True,
+                                  "load_duration": load_duration})
+            return
+        if self.path != "/api/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+        with stub.lock:
+            stub.generating += 1
+            stub.max_generating = max(stub.max_generating, stub.generating)
+        try:
+            load_duration = self._load_model(model, payload.get("keep_alive"))
+            prompt = payload["messages"][-1]["content"]
+            system = next((m["content"] for m in payload["messages"] if m["role"] == "system"), "")
+            reply = stub.reply_for(model, system, prompt)
+            time.sleep(stub.latency)
+            final = {"model": model, "created_at": "", "done": True, "done_reason": "stop",
+                     "load_duration": load_duration}
+            if payload.get("stream", True) is False:
+                self._send_json(200, {**final, "message": {"role": "assistant", "content": reply}})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for word in reply.split(" "):
+                part = {"model": model, "created_at": "", "done": False,
+                        "message": {"role": "assistant", "content": word + " "}}
+                self._write_chunk((json.dumps(part) + "\n").encode("utf-8"))
+                time.sleep(stub.token_latency)
+            final["message"] = {"role": "assistant", "content": ""}
+            self._write_chunk((json.dumps(final) + "\n").encode("utf-8"))
+            self._end_chunks()
+        finally:
+            with stub.lock:
+                stub.generating -= 1
+
+
+class StubServer:
+    def __init__(self, handler=StubOpenRouterHandler, latency=0.0, token_latency=0.0, load_latency=0.0):
+        """Run a stub backend on a free localhost port in a background thread.
+
+        With the default handler it speaks enough of the OpenRouter API (/models and /chat/completions,
+        including SSE streaming) for OpenRouterInterface to run against it without network access.
+        StubOllamaHandler instead fakes an Ollama server (/api/chat and model loading via /api/generate),
+        where a model that is not resident costs load_latency seconds to load.
+        """
+        self.latency = latency
+        self.token_latency = token_latency
+        self.load_latency = load_latency
+        self.default_keep_alive = 300
+        self.loaded_until = {}
+        self.generating = 0
+        self.max_generating = 0
+        self.failures_remaining = 0
+        self.failure_status = 503
+        self.retry_after = 0
+        self.failing_models = set()
+        self.requests = 0
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reply_for(self, model, system_prompt, prompt):
+        """Return the canned reply for a prompt, echoing the system prompt so tests can check it."""
+        return f"Stub answer from {model} as '{system_prompt}' to: {prompt}"
+
+    def fail_next(self, count, status=503, retry_after=0):
+        """Make the next count requests fail with the given status and Retry-After header."""
+        with self.lock:
+            self.failures_remaining = count
+            self.failure_status = status
+            self.retry_after = retry_after
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def run_pool_benchmark(requests_count=200):
+    """Print per-request latency of OpenRouter-style calls with fresh connections versus a pooled session."""
+    import os
+    import statistics
+    import tempfile
+    import requests
+    from openrouter_interface import OpenRouterInterface
+
+    with StubServer() as stub, tempfile.TemporaryDirectory() as tmp:
+        base_url = f"{stub.url}/api/v1"
+        client = OpenRouterInterface("stub-key", "You are a stub.", base_url=base_url,
+                                     catalogue_path=os.path.join(tmp, "models.json"))
+        client.catalogue.wait(5)
+        body = {"model": "stub/large:free", "messages": [{"role": "user", "content": "ping"}]}
+
+        def measure(send):
+            timings = []
+            for _ in range(requests_count):
+                start = time.perf_counter()
+                send()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+        stub.connections.clear()
+        fresh = measure(lambda: requests.post(f"{base_url}/chat/completions", json=body, headers=client.headers))
+        fresh_connections = len(stub.connections)
+        stub.connections.clear()
+        pooled = measure(lambda: client._request("POST", "/chat/completions", json=body))
+        pooled_connections = len(stub.connections)
+
+        stub.fail_next(2, status=429, retry_after=0)
+        start = time.perf_counter()
+        client._request("GET", "/models")
+        retry_time = (time.perf_counter() - start) * 1000
+
+    print(f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'connections':>12}")
+    print(f"{'fresh':<8} {fresh[0]:>8.2f} {fresh[1]:>8.2f} {fresh_connections:>12}")
+    print(f"{'pooled':<8} {pooled[0]:>8.2f} {pooled[1]:>8.2f} {pooled_connections:>12}")
+    print(f"GET /models after two 429s with Retry-After: 0 recovered in {retry_time:.2f} ms")
+
+
+if __name__ == "__main__":
+    run_pool_benchmark()
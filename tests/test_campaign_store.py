@@ -0,0 +1,53 @@
+import json
+import pytest
+from campaign_store import CampaignStore, CampaignRepository, encode_sheet, decode_sheet
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "campaign.sqlite3")
+
+
+def test_sheets_round_trip_exactly():
+    sheet = {"name": "Alda", "hp_current": None, "xp": 1.5, "inspiration": True, "skill_arcana_prof": "yes",
+             "custom": [1, 2], "image_path": "/characters/images/a.png"}
+    assert decode_sheet(*encode_sheet(sheet)) == sheet
+
+
+def test_party_is_only_the_characters_flagged_as_such(path):
+    store = CampaignStore(path)
+    store.save("Alda", {"name": "Alda"}, join_party=True)
+    store.save("Innkeeper", {"name": "Innkeeper"})
+    assert list(store.load_party()) == ["Alda"]
+    assert list(store.load()) == ["Alda", "Innkeeper"]
+    store.save("Alda", {"name": "Alda", "hp_current": 3})  # saving again keeps the flag
+    store.set_party(["Innkeeper"])
+    assert list(store.load_party()) == ["Innkeeper"]
+
+
+def test_failed_update_changes_nothing(path):
+    store = CampaignStore(path)
+    store.save("Alda", {"name": "Alda", "hp_current": 10})
+    with pytest.raises(KeyError):
+        store.update_many({"Alda": {"hp_current": 0}, "Nobody": {"hp_current": 1}})
+    assert store.get("Alda")["hp_current"] == 10
+
+
+def test_sheet_edits_reach_other_connections(path, tmp_path):
+    directory = tmp_path / "characters"
+    directory.mkdir()
+    (directory / "Alda.json").write_text(json.dumps({"name": "Alda", "hp_current": 10, "hp_max": 10}))
+    sheet_store = CampaignStore(path)
+    sheet_store.import_json(str(directory), join_party=True)
+    repository = CampaignRepository(sheet_store)
+    assert repository.summary("Alda")["label"] == "Alda · HP 10/10"
+
+    dm_store = CampaignStore(path)
+    repository.save("Alda", dict(repository.get("Alda"), hp_current=4))
+    repository.save("Borin", {"name": "Borin"})
+    assert {name: sheet.get("hp_current") for name, sheet in dm_store.load_party().items()} == {"Alda": 4,
+                                                                                                "Borin": None}
+    # and updates written after a fight show up in the sheet's selector and on load
+    dm_store.update_many({"Alda": {"hp_current": 0}})
+    assert repository.summary("Alda")["hp_current"] == 0
+    assert repository.get("Alda")["hp_current"] == 0
@@ -0,0 +1,40 @@
+import pytest
+import main_character_sheet as sheet
+from character_repository import CharacterRepository
+
+
+@pytest.fixture
+def repository(tmp_path, monkeypatch):
+    repository = CharacterRepository(str(tmp_path))
+    monkeypatch.setattr(sheet, "character_repository", repository)
+    for name, race in [("Alda", "Elf"), ("Borin", "Dwarf")]:
+        repository.save(name, {"name": name, "race": race, "hp_current": 10, "hp_max": 10})
+    return repository
+
+
+def save(name, source, fields):
+    return sheet.save_character(1, name, {"token": "t", "source": source, "revision": 3, "fields": fields})
+
+
+def test_renaming_onto_an_existing_character_is_refused(repository):
+    message, _, saved = save("Borin", "Alda", {"name": "Borin", "hp_current": 4})
+    assert "already exists" in message
+    assert saved is sheet.dash.no_update
+    assert repository.get("Borin") == {"name": "Borin", "race": "Dwarf", "hp_current": 10, "hp_max": 10}
+    assert repository.get("Alda")["hp_current"] == 10
+
+
+def test_renaming_to_a_new_name_starts_from_the_loaded_sheet(repository):
+    _, _, saved = save("Cora", "Alda", {"name": "Cora", "hp_current": 4})
+    assert saved == {"token": "t", "revision": 3, "name": "Cora"}
+    assert repository.get("Cora") == {"name": "Cora", "race": "Elf", "hp_current": 4, "hp_max": 10}
+    # later saves come from the renamed sheet
+    save("Cora", "Cora", {"hp_current": 2})
+    assert repository.get("Cora")["hp_current"] == 2
+
+
+def test_changes_merge_into_the_loaded_character(repository):
+    save("Alda", "Alda", {"hp_current": 3})
+    assert repository.get("Alda") == {"name": "Alda", "race": "Elf", "hp_current": 3, "hp_max": 10}
+    message, _, saved = save("Alda", "Alda", {})
+    assert message.startswith("No changes") and saved is sheet.dash.no_update
@@ -0,0 +1,51 @@
+from combat_engine import CombatEngine, PHASE_START
+
+
+def engine_with(*names):
+    engine = CombatEngine()
+    for initiative, name in enumerate(reversed(names)):
+        engine.add_combatant(name, initiative)
+    return engine
+
+
+def test_removing_the_last_creature_on_its_turn_starts_the_next_round():
+    engine = engine_with("Alda", "Borin", "Goblin")
+    for _ in range(3):
+        engine.next_turn()
+    assert (engine.active().name, engine.round) == ("Goblin", 1)
+    engine.remove_combatant("Goblin")
+    assert (engine.active().name, engine.round) == ("Alda", 2)
+    engine.next_turn()
+    assert (engine.active().name, engine.round) == ("Borin", 2)
+
+
+def test_removing_a_creature_keeps_the_turn_with_the_active_one():
+    engine = engine_with("Alda", "Borin", "Goblin")
+    engine.next_turn()
+    engine.next_turn()
+    engine.remove_combatant("Alda")
+    assert (engine.active().name, engine.round) == ("Borin", 1)
+    engine.remove_combatant("Borin")  # the turn passes to the next creature in the same round
+    assert (engine.active().name, engine.round) == ("Goblin", 1)
+    engine.remove_combatant("Goblin")
+    assert engine.active() is None
+
+
+def test_removing_the_active_creature_ends_its_turn_and_starts_the_next():
+    engine = engine_with("Alda", "Borin", "Goblin")
+    engine.next_turn()
+    engine.next_turn()
+    guard = engine.add_effect("Guard", "Borin", 0)  # ends at the end of this turn
+    dodge = engine.add_effect("Dodge", "Goblin", 1, phase=PHASE_START)  # ends as the Goblin's next turn starts
+    bless = engine.add_effect("Bless", "Alda", 3, anchor="Nobody")  # ticks down every turn
+    # Re-adding a name (e.g. a new initiative roll) takes it out of the order first
+    engine.add_combatant("Borin", -1)
+    assert engine.active().name == "Goblin"
+    assert guard not in engine.effects and dodge not in engine.effects
+    assert engine.remaining(engine.effects[bless]) == 2
+    engine.next_turn()
+    assert engine.active().name == "Borin"
+    expired, _ = engine.remove_combatant("Borin")
+    assert [effect.name for effect in expired] == ["Bless"]
+    assert (engine.active().name, engine.round) == ("Alda", 2)
+    assert engine.active().turns_taken == 2
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from dice import parse
+
+
+@pytest.mark.parametrize("text", ["1d6r1!", "1d6!", "2d6r2", "4d6r2!kh3", "2d20kl1+5", "3d8dl1-2"])
+def test_rolls_follow_the_exact_distribution(text):
+    expression = parse(text)
+    distribution = expression.distribution()
+    rolls = expression.roll_many(200000, np.random.default_rng(7))
+    standard_error = distribution.std() / len(rolls) ** 0.5
+    assert abs(rolls.mean() - distribution.mean()) < 5 * standard_error
+    assert rolls.min() >= distribution.min()
+    # every rolled total is an outcome the distribution gives a chance to
+    outcomes = distribution.as_dict()
+    assert all(int(total) in outcomes for total in np.unique(rolls))
+
+
+def test_reroll_applies_to_the_first_die_only():
+    # a 1 is rerolled once (1/36 left), a 6 explodes into plain d6s averaging 4.2
+    assert parse("1d6r1!").distribution().mean() == pytest.approx((1 + 98 + 7 * 10.2) / 36)
+
+
+@pytest.mark.parametrize("text", ["200d1000kh100", "200d1000", "100d200!", "40d6!kh20"])
+def test_expressions_too_large_to_compute_are_rejected(text):
+    with pytest.raises(ValueError):
+        parse(text)
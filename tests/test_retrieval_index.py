@@ -0,0 +1,16 @@
+from retrieval_index import RetrievalIndex
+from transcript_store import TranscriptStore
+
+
+def test_last_line_of_notes_is_indexed(tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("The innkeeper is a doppelganger\nThe bridge to Phandalin is out")
+    store = TranscriptStore(str(tmp_path / "transcripts"), legacy_paths=())
+    index = RetrievalIndex([str(notes)], segments=store)
+    assert [text for _, _, text in index.search("Phandalin bridge")] == [notes.read_text()]
+    store.append("User: where is the dragon\nDM Assist: in the cave\n")
+    store.append("User: half a tu")
+    assert [text for _, _, text in index.search("dragon cave", k=1)] == [
+        "User: where is the dragon\nDM Assist: in the cave"]
+    assert not index.search("tu")
+    store.close()
@@ -0,0 +1,243 @@
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from atomic_file import write_json_atomic
+
+DEFAULT_TRANSCRIPT_DIR = "transcripts"
+INDEX_FILE = "index.json"
+SEGMENT_PATTERN = re.compile(r"^session-(\d{6})\.txt(\.gz)?$")
+LEGACY_TRANSCRIPTS = ("dm_assistant_transcripts.old", "dm_assistant_transcripts.txt")
+
+
+def segment_name(session, compressed=False):
+    return f"session-{session:06d}.txt" + (".gz" if compressed else "")
+
+
+def count_turns(path):
+    """Count the turns in a segment file by its 'User: ' lines."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return sum(1 for line in f if line.startswith("User: "))
+
+
+class TranscriptStore:
+    def __init__(self, directory=DEFAULT_TRANSCRIPT_DIR, compress_closed=False, legacy_paths=LEGACY_TRANSCRIPTS):
+        """Append-only transcript store with one segment file per chat session.
+
+        rotate() closes the current session and starts a new segment without copying anything. The
+        small index.json records each session's segment, start and end time and turn count, and is
+        rebuilt from the segment files if it is missing or behind after a crash. With compress_closed
+        set, closed segments are gzipped in the background. Existing dm_assistant_transcripts files
+        are moved in as closed sessions the first time the store opens.
+        """
+        self.directory = directory
+        self.compress_closed = compress_closed
+        self.lock = threading.RLock()
+        self.compress_lock = threading.Lock()
+        self.handle = None
+        os.makedirs(directory, exist_ok=True)
+        self.sessions = self._load_index()
+        self._recover()
+        self._import_legacy(legacy_paths)
+        if not self.sessions or self.sessions[-1]["closed"] is not None:
+            self._open_session()
+        self._save_index()
+        if compress_closed:
+            self._compress_pending()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_index(self):
+        try:
+            with open(self._path(INDEX_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)["sessions"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def _save_index(self):
+        write_json_atomic(self._path(INDEX_FILE), {"sessions": self.sessions})
+
+    def _recover(self):
+        """Reconcile the index with the segment files left on disk, e.g. after a crash mid-rotation or compression."""
+        files = {}
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                os.remove(self._path(name))  # an unfinished compression; the plain segment is still there
+                continue
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                files.setdefault(int(match.group(1)), set()).add(name)
+        by_session = {entry["session"]: entry for entry in self.sessions}
+        for session, names in sorted(files.items()):
+            plain, compressed = segment_name(session), segment_name(session, True)
+            if plain in names and compressed in names:
+                # The gzip was moved into place but the plain file not yet removed
+                os.remove(self._path(plain))
+                names.discard(plain)
+            name = compressed if compressed in names else plain
+            entry = by_session.get(session)
+            if entry is None:
+                stat = os.stat(self._path(name))
+                entry = {"session": session, "file": name, "started": stat.st_mtime, "closed": stat.st_mtime,
+                         "turns": count_turns(self._path(name))}
+                by_session[session] = entry
+            entry["file"] = name
+        self.sessions = [by_session[session] for session in sorted(by_session) if session in files]
+        if self.sessions and self.sessions[-1]["closed"] is None:
+            # Turn counts of the open session are only saved on rotation, so recount them
+            self.sessions[-1]["turns"] = count_turns(self._path(self.sessions[-1]["file"]))
+        for entry in self.sessions[:-1]:
+            if entry["closed"] is None:
+                entry["closed"] = entry["started"]
+
+    def _import_legacy(self, paths):
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            if os.path.getsize(path) == 0:
+                os.remove(path)
+                continue
+            session = self._next_session()
+            name = segment_name(session)
+            stat = os.stat(path)
+            os.replace(path, self._path(name))
+            self.sessions.append({"session": session, "file": name, "started": stat.st_mtime,
+                                  "closed": stat.st_mtime, "turns": count_turns(self._path(name))})
+            print(f"Moved {path} into the transcript store as session {session}.")
+
+    def _next_session(self):
+        return self.sessions[-1]["session"] + 1 if self.sessions else 1
+
+    def _open_session(self):
+        session = self._next_session()
+        self.sessions.append({"session": session, "file": segment_name(session), "started": time.time(),
+                              "closed": None, "turns": 0})
+
+    @property
+    def active(self):
+        """Index entry of the session turns are currently appended to."""
+        return self.sessions[-1]
+
+    @property
+    def active_path(self):
+        return self._path(self.active["file"])
+
+    def append(self, text):
+        """Append a formatted turn to the active segment, keeping the file open between turns."""
+        with self.lock:
+            if self.handle is None:
+                self.handle = open(self.active_path, "a", encoding="utf-8")
+            self.handle.write(text)
+            self.handle.flush()
+            self.active["turns"] += 1
+
+    def rotate(self):
+        """Close the active session and start a new one; a session with no turns is kept open instead.
+
+        Only the file handle is closed and the index rewritten, so the cost does not depend on
+        transcript size. Turns are never copied, so a crash at any point loses nothing.
+        """
+        with self.lock:
+            if self.active["turns"] == 0:
+                return self.active["session"]
+            if self.handle is not None:
+                os.fsync(self.handle.fileno())
+                self.handle.close()
+                self.handle = None
+            self.active["closed"] = time.time()
+            self._open_session()
+            self._save_index()
+            session = self.active["session"]
+        if self.compress_closed:
+            threading.Thread(target=self._compress_pending, daemon=True).start()
+        return session
+
+    def _compress_pending(self):
+        """Gzip every closed plain-text segment: write to a temp file, move it into place, then update the index."""
+        with self.compress_lock:
+            with self.lock:
+                pending = [entry for entry in self.sessions[:-1] if not entry["file"].endswith(".gz")]
+            for entry in pending:
+                plain = self._path(entry["file"])
+                compressed = plain + ".gz"
+                with open(plain, "rb") as src, gzip.open(compressed + ".tmp", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(compressed + ".tmp", compressed)
+                with self.lock:
+                    entry["file"] = os.path.basename(compressed)
+                    self._save_index()
+                os.remove(plain)
+
+    def segment_paths(self):
+        """Return the paths of all segments, oldest first."""
+        with self.lock:
+            return [self._path(entry["file"]) for entry in self.sessions]
+
+    def list_sessions(self):
+        """Return a copy of the index entries, oldest first."""
+        with self.lock:
+            return [dict(entry) for entry in self.sessions]
+
+    def read_session(self, session):
+        """Return the transcript text of one session, or None if there is no such session."""
+        with self.lock:
+            entry = next((entry for entry in self.sessions if entry["session"] == session), None)
+            if entry is None:
+                return None
+            path = self._path(entry["file"])
+            if entry is self.active and self.handle is not None:
+                self.handle.flush()
+        if not os.path.exists(path):
+            return ""
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            return f.read()
+
+    def close(self):
+        """Flush and close the active segment."""
+        with self.lock:
+            if self.handle is not None:
+                self.handle.close()
+                self.handle = None
+            self._save_index()
+
+
+def run_benchmark(sizes_mb=(1, 20, 100)):
+    """Compare the old read-append-truncate rotation with a segment rotation for growing transcripts."""
+    import tempfile
+
+    turn = "User: what is in the goblin cave\nDM Assist: " + "A damp tunnel winds downward. " * 10 + "\n"
+    print(f"{'transcript MB':>13} {'copy rotation ms':>17} {'segment rotation ms':>20}")
+    for size_mb in sizes_mb:
+        text = turn * (size_mb * 1024 * 1024 // len(turn))
+        with tempfile.TemporaryDirectory() as tmp:
+            current, old = os.path.join(tmp, "current.txt"), os.path.join(tmp, "current.old")
+            with open(current, "w", encoding="utf-8") as f:
+                f.write(text)
+            start = time.perf_counter()
+            with open(current, "r", encoding="utf-8") as f:
+                content = f.read()
+            with open(old, "a", encoding="utf-8") as f:
+                f.write(content)
+            with open(current, "w", encoding="utf-8") as f:
+                f.write("")
+            copy_ms = (time.perf_counter() - start) * 1000
+
+            store = TranscriptStore(os.path.join(tmp, "transcripts"), legacy_paths=())
+            with open(store.active_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            store.active["turns"] = text.count("User: ")
+            start = time.perf_counter()
+            store.rotate()
+            segment_ms = (time.perf_counter() - start) * 1000
+            store.close()
+        print(f"{size_mb:>13} {copy_ms:>17.1f} {segment_ms:>20.1f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()